@@ -18,12 +18,22 @@ setup(
     # declare your packages
     packages=find_packages(where="src", exclude=("test",)),
     package_dir={"": "src"},
+    # stress and tone marks are read at runtime
+    package_data={"learn_to_pronounce": ["data/*.txt"]},
     # declare your scripts
     entry_points="""\
      [console_scripts]
      learn_to_pronounce = learn_to_pronounce.learn_to_pronounce:main
      demo_fst = learn_to_pronounce.fst.demo_fst:main
      demo_pronounce = learn_to_pronounce.demo_pronounce:main
+     benchmark_addon = learn_to_pronounce.addon.benchmark:main
+     decompress_addon = learn_to_pronounce.addon.compression:main
+     serve_pronounce = learn_to_pronounce.serve_pronounce:main
+     load_pronounce = learn_to_pronounce.load_pronounce:main
+     benchmark_spelling = learn_to_pronounce.serving.spelling:main
+     addon_delta = learn_to_pronounce.addon.delta:main
+     verify_addon = learn_to_pronounce.addon.manifest:main
+     score_confidence = learn_to_pronounce.fst.confidence:main
     """
 )
 
@@ -10,7 +10,31 @@ Expected fields are obtained from ``balacoon_frontend``.
     :template: class.rst
 
     AddonManager
+    PackedLexicon
+
+Addon sections can be compressed for distribution, see
+:mod:`learn_to_pronounce.addon.compression`. ``benchmark_addon`` script
+compares codecs in terms of compressed size and decoding time,
+``decompress_addon`` script restores plain addon on serving nodes.
+Saved addons carry integrity manifest, which allows to verify only
+sections that are loaded, see :mod:`learn_to_pronounce.addon.manifest`
+and ``verify_addon`` script. Manifest is stored as an extra ``section_manifest``
+key after all other sections; ``PronunciationManager`` doesn't look it up,
+so addon is loaded as usual. Routine updates can be distributed as deltas
+between addon versions, see :mod:`learn_to_pronounce.addon.delta` and ``addon_delta`` script.
 
 """
 
-from learn_to_pronounce.addon.addon_manager import AddonManager
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    "AddonManager": "learn_to_pronounce.addon.addon_manager",
+    "PackedLexicon": "learn_to_pronounce.addon.packed_lexicon",
+}
+
+
+def __getattr__(name: str):
+    # addon manager imports balacoon_frontend and msgpack, load it on first access
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -6,13 +6,18 @@ manager that saves artifacts into addon
 
 import os
 import shutil
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List
 
 import msgpack
-import pywrapfst as fst
 from balacoon_frontend import PronunciationDictionary
 from balacoon_frontend import PronunciationManager as pm
 
+from learn_to_pronounce.addon.compression import Codec, compress_addon_dict, decompress_addon_dict
+from learn_to_pronounce.addon.delta import create_delta
+from learn_to_pronounce.addon.manifest import write_addon
+from learn_to_pronounce.addon.packed_lexicon import PACKED_LEXICON_FIELD, pack_lexicon
+from learn_to_pronounce.resources.provider import get_lexicon_entries
+
 
 class AddonManager(object):
     """
@@ -70,22 +75,77 @@ class AddonManager(object):
         with open(self._path, "wb") as fp:
             msgpack.dump([addon_dict], fp)
 
-    def save(self, path: str):
+    def save(self, path: str, codec: str = None, uncompressed: Iterable[str] = (), manifest: bool = True):
         """
-        Copies addon to the specified path
+        Copies addon to the specified path. Optionally compresses addon sections,
+        which reduces size of addon to distribute. Compressed addon should be
+        decompressed with :func:`learn_to_pronounce.addon.compression.decompress_addon`
+        before it is loaded with ``PronunciationManager``.
+        By default, integrity manifest with digests of sections is added, so sections
+        can be verified lazily with :class:`learn_to_pronounce.addon.manifest.AddonVerifier`.
+        Manifest is stored under an extra ``section_manifest`` key, which goes after all
+        other sections and is ignored by ``PronunciationManager``. Addon is re-encoded
+        in this case, use ``manifest=False`` to get an exact copy of the addon from work dir.
 
         Parameters
         ----------
         path: str
             path to copy addon to
+        codec: str
+            name of the codec to compress sections with (gzip, zstd, lz4).
+            If not specified, addon is copied as is.
+        uncompressed: Iterable[str]
+            sections to keep uncompressed, for ex. ones that are accessed on start-up.
+            Addon identifier and locale are always kept uncompressed.
+        manifest: bool
+            whether to add integrity manifest. Digests are computed while addon is written.
+        """
+        if not codec and not manifest:
+            shutil.copy(self._path, path)
+            return
+        addon_dict = self._load_addon_dict()
+        if codec:
+            keep = set(uncompressed) | {pm.AddonFields.ID_KEY, pm.AddonFields.LOCALE}
+            addon_dict = compress_addon_dict(addon_dict, Codec(codec), uncompressed=keep)
+        if manifest:
+            write_addon(addon_dict, path)
+        else:
+            with open(path, "wb") as fp:
+                msgpack.dump([addon_dict], fp)
+
+    def save_delta(self, base_path: str, delta_path: str, target_path: str = None):
         """
-        shutil.copy(self._path, path)
+        Stores delta between previous version of the addon and the new one.
+        Nodes that have the previous version can get the new one applying delta with
+        :func:`learn_to_pronounce.addon.delta.apply_delta` (``addon_delta apply``).
+
+        Parameters
+        ----------
+        base_path: str
+            path to previous version of the addon, uncompressed
+        delta_path: str
+            path to store delta to
+        target_path: str
+            new version of the addon as stored with :func:`.save`. Addon in work dir by default
+        """
+        with open(base_path, "rb") as fp:
+            base = fp.read()
+        with open(self._path if target_path is None else target_path, "rb") as fp:
+            target = fp.read()
+        with open(delta_path, "wb") as fp:
+            fp.write(create_delta(base, target))
 
     def add_lexicon(
-        self, pd: PronunciationDictionary, graphemes: List[str], phonemes: List[str]
+        self,
+        pd: PronunciationDictionary,
+        graphemes: List[str],
+        phonemes: List[str],
+        packed: bool = False,
     ):
         """
-        Adds lexicon into addon. Also adds corresponding graphemes and phonemes
+        Adds lexicon into addon. Also adds corresponding graphemes and phonemes.
+        Optionally adds lexicon packed in a flat format that can be queried
+        from memory-mapped addon, see :class:`learn_to_pronounce.addon.packed_lexicon.PackedLexicon`
 
         Parameters
         ----------
@@ -95,11 +155,18 @@ class AddonManager(object):
             list of valid graphemes (letters)
         phonemes: List[str]
             list of valid phonemes
+        packed: bool
+            whether to additionally store packed lexicon
         """
         addon_dict = self._load_addon_dict()
         addon_dict[pm.AddonFields.LEXICON] = pd.serialize()
         addon_dict[pm.AddonFields.GRAPHEMES] = graphemes
         addon_dict[pm.AddonFields.PHONEMES] = phonemes
+        if packed:
+            addon_dict[PACKED_LEXICON_FIELD] = pack_lexicon(get_lexicon_entries(pd), phonemes)
+        else:
+            # drop packed lexicon from previous run, so it doesn't diverge from regular one
+            addon_dict.pop(PACKED_LEXICON_FIELD, None)
         self._save_addon_dict(addon_dict)
 
     def _add_fst(self, key: str, fst_path: str):
@@ -113,6 +180,8 @@ class AddonManager(object):
         fst_path: str
             path to FST model to load and add to addon
         """
+        import pywrapfst as fst
+
         addon_dict = self._load_addon_dict()
         loaded_fst = fst.Fst.read(fst_path)
         addon_dict[key] = loaded_fst.write_to_string()
@@ -132,6 +201,27 @@ class AddonManager(object):
             fst_path,
         )
 
+    @staticmethod
+    def extract_pronunciation_fst(addon_path: str, fst_path: str):
+        """
+        Stores pronunciation FST of an addon to a separate file, so it can be loaded
+        with ``FSTPronunciationGenerator``, for ex. to compare with a newly trained model.
+
+        Parameters
+        ----------
+        addon_path: str
+            path to addon, possibly with compressed sections
+        fst_path: str
+            path to store FST model to
+        """
+        key = pm.AddonFields.FST_PRONUNCIATION_GENERATOR
+        with open(addon_path, "rb") as fp:
+            addon_dict = decompress_addon_dict(msgpack.load(fp)[0], sections=[key])
+        if key not in addon_dict:
+            raise RuntimeError("There is no pronunciation FST in [{}]".format(addon_path))
+        with open(fst_path, "wb") as fp:
+            fp.write(addon_dict[key])
+
     def add_spelling_fst(self, fst_path: str):
         """
         Adds spelling FST into addon
@@ -0,0 +1,93 @@
+"""
+Copyright 2022 Balacoon
+
+Benchmarks addon compression: size of the compressed addon vs time
+to get it ready for ``PronunciationManager``
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import msgpack
+from balacoon_frontend import PronunciationManager
+
+from learn_to_pronounce.addon.compression import (
+    Codec,
+    available_codecs,
+    compress_addon_dict,
+    decompress_addon_dict,
+)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(
+        "Compares codecs for addon compression: size vs decompression and loading time."
+    )
+    ap.add_argument("--addon", required=True, help="Path to plain (uncompressed) pronunciation addon")
+    ap.add_argument(
+        "--codecs",
+        nargs="+",
+        default=available_codecs(),
+        help="Codecs to benchmark, by default all available",
+    )
+    ap.add_argument(
+        "--uncompressed",
+        nargs="*",
+        default=[],
+        help="Sections to keep uncompressed",
+    )
+    ap.add_argument("--repeat", type=int, default=3, help="How many times to repeat time measurements")
+    args = ap.parse_args()
+    return args
+
+
+def _time_load(path: str, locale: str, repeat: int) -> float:
+    """
+    Measures best time of loading addon with PronunciationManager
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        PronunciationManager(path, locale)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+
+    with open(args.addon, "rb") as fp:
+        addon_dict = msgpack.load(fp)[0]
+    pm = PronunciationManager
+    locale = addon_dict[pm.AddonFields.LOCALE]
+    keep = set(args.uncompressed) | {pm.AddonFields.ID_KEY, pm.AddonFields.LOCALE}
+
+    plain_size = os.path.getsize(args.addon)
+    plain_load = _time_load(args.addon, locale, args.repeat)
+    logging.info(
+        "{:>6} | {:>12} | {:>6} | {:>12} | {:>12}".format("codec", "size, bytes", "ratio", "decode, s", "total, s")
+    )
+    logging.info("{:>6} | {:>12} | {:>6.2f} | {:>12.4f} | {:>12.4f}".format("none", plain_size, 1.0, 0.0, plain_load))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        plain_path = os.path.join(temp_dir, "plain.addon")
+        for codec_name in args.codecs:
+            codec = Codec(codec_name)
+            compressed = msgpack.packb([compress_addon_dict(addon_dict, codec, uncompressed=keep)])
+            decode = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                plain_dict = decompress_addon_dict(msgpack.unpackb(compressed)[0])
+                with open(plain_path, "wb") as fp:
+                    msgpack.dump([plain_dict], fp)
+                decode = min(decode, time.perf_counter() - start)
+            load = _time_load(plain_path, locale, args.repeat)
+            logging.info(
+                "{:>6} | {:>12} | {:>6.2f} | {:>12.4f} | {:>12.4f}".format(
+                    codec_name, len(compressed), plain_size / float(len(compressed)), decode, decode + load
+                )
+            )
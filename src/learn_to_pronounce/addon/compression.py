@@ -0,0 +1,205 @@
+"""
+Copyright 2022 Balacoon
+
+Per-section compression of addons for distribution
+"""
+
+import argparse
+import gzip
+import importlib
+import logging
+from typing import Any, Dict, Iterable, List
+
+import msgpack
+
+from learn_to_pronounce.addon.manifest import MANIFEST_FIELD
+
+COMPRESSION_FIELD = "section_compression"  #: addon key that maps compressed sections to their codec
+
+
+class Codec:
+    """
+    Compression codec applied to a single addon section.
+    ``gzip`` is always available since it comes from standard library,
+    ``zstd`` and ``lz4`` require ``zstandard`` and ``lz4`` packages correspondingly.
+    """
+
+    def __init__(self, name: str, level: int = None):
+        """
+        constructor of codec
+
+        Parameters
+        ----------
+        name: str
+            name of the codec: gzip, zstd or lz4
+        level: int
+            compression level, codec-specific default is used if not specified
+        """
+        if name not in CODECS:
+            raise ValueError("Unknown codec [{}], supported: {}".format(name, ", ".join(CODECS)))
+        module_name, default_level = CODECS[name]
+        try:
+            self._module = importlib.import_module(module_name)
+        except ImportError:
+            raise RuntimeError("Codec [{}] requires [{}] package which is not installed".format(name, module_name))
+        self.name = name
+        self.level = default_level if level is None else level
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compresses a blob of data
+        """
+        if self.name == "gzip":
+            # mtime is fixed, so same input always gives same output
+            return gzip.compress(data, compresslevel=self.level, mtime=0)
+        if self.name == "zstd":
+            return self._module.ZstdCompressor(level=self.level).compress(data)
+        return self._module.compress(data, compression_level=self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        """
+        Decompresses a blob of data, compressed with :func:`.compress`
+        """
+        if self.name == "gzip":
+            return gzip.decompress(data)
+        if self.name == "zstd":
+            return self._module.ZstdDecompressor().decompress(data)
+        return self._module.decompress(data)
+
+
+#: supported codecs: name -> (python module, default compression level)
+CODECS = {
+    "gzip": ("gzip", 6),
+    "zstd": ("zstandard", 10),
+    "lz4": ("lz4.frame", 9),
+}
+
+
+def available_codecs() -> List[str]:
+    """
+    Lists codecs that can be used in current environment
+
+    Returns
+    -------
+    codecs: List[str]
+        names of codecs which python packages are installed
+    """
+    codecs = []
+    for name, (module_name, _) in CODECS.items():
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            continue
+        codecs.append(name)
+    return codecs
+
+
+def compress_addon_dict(
+    addon_dict: Dict[str, Any], codec: Codec, uncompressed: Iterable[str] = ()
+) -> Dict[str, Any]:
+    """
+    Compresses sections of an addon. Each section is packed with msgpack
+    and compressed separately, so consumer can decompress only sections it needs.
+
+    Parameters
+    ----------
+    addon_dict: Dict[str, Any]
+        plain addon loaded as dictionary
+    codec: Codec
+        codec to compress sections with
+    uncompressed: Iterable[str]
+        sections that should be kept as is. Makes sense for small sections,
+        "hot" sections that are accessed on start-up and addon identification fields.
+
+    Returns
+    -------
+    compressed_dict: Dict[str, Any]
+        addon dictionary with compressed sections and ``COMPRESSION_FIELD`` describing them
+    """
+    if COMPRESSION_FIELD in addon_dict:
+        raise RuntimeError("Addon is already compressed")
+    keep = set(uncompressed)
+    compressed_dict = {}
+    compression = {}
+    for key, value in addon_dict.items():
+        if key in keep:
+            compressed_dict[key] = value
+            continue
+        compressed_dict[key] = codec.compress(msgpack.packb(value))
+        compression[key] = codec.name
+    compressed_dict[COMPRESSION_FIELD] = compression
+    return compressed_dict
+
+
+def decompress_addon_dict(addon_dict: Dict[str, Any], sections: Iterable[str] = None) -> Dict[str, Any]:
+    """
+    Restores plain addon from a compressed one.
+
+    Parameters
+    ----------
+    addon_dict: Dict[str, Any]
+        addon dictionary, possibly compressed with :func:`compress_addon_dict`.
+        Plain addons are returned as is.
+    sections: Iterable[str]
+        if specified, only those sections are decompressed, other sections are skipped.
+
+    Returns
+    -------
+    plain_dict: Dict[str, Any]
+        addon dictionary that can be consumed by ``balacoon_frontend``
+    """
+    compression = addon_dict.get(COMPRESSION_FIELD)
+    if compression is None:
+        return addon_dict
+    if sections is not None:
+        sections = set(sections)
+    codecs = {}
+    plain_dict = {}
+    for key, value in addon_dict.items():
+        if key == COMPRESSION_FIELD or key == MANIFEST_FIELD:
+            # manifest describes compressed sections, it is not valid for decompressed addon
+            continue
+        if sections is not None and key not in sections:
+            continue
+        if key in compression:
+            codec_name = compression[key]
+            if codec_name not in codecs:
+                codecs[codec_name] = Codec(codec_name)
+            value = msgpack.unpackb(codecs[codec_name].decompress(value))
+        plain_dict[key] = value
+    return plain_dict
+
+
+def decompress_addon(path: str, out_path: str):
+    """
+    Decompresses addon file, so it can be loaded with ``PronunciationManager``.
+    Intended to be executed once on serving node after addon is pulled.
+
+    Parameters
+    ----------
+    path: str
+        path to compressed addon
+    out_path: str
+        path to store plain addon to
+    """
+    with open(path, "rb") as fp:
+        addon_dict = msgpack.load(fp)[0]
+    with open(out_path, "wb") as fp:
+        msgpack.dump([decompress_addon_dict(addon_dict)], fp)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(
+        "Decompresses addon sections, so addon can be loaded with balacoon_frontend.PronunciationManager."
+    )
+    ap.add_argument("--addon", required=True, help="Path to addon saved with compressed sections")
+    ap.add_argument("--out", required=True, help="Path to store plain addon to")
+    args = ap.parse_args()
+    return args
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    decompress_addon(args.addon, args.out)
+    logging.info("Stored decompressed [{}] to [{}]".format(args.addon, args.out))
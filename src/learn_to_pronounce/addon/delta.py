@@ -0,0 +1,259 @@
+"""
+Copyright 2022 Balacoon
+
+Delta updates of addons. Delta between two addons contains only
+sections that changed. List and dictionary sections are diffed entry by entry.
+Binary sections (for ex. serialized lexicon) are split into content-defined chunks,
+which are diffed the same way as lists: insertion or removal of a word changes only
+chunks around it, the rest are taken from the base addon.
+Full replacement is used whenever it is smaller than the diff.
+Applying delta to the base addon reproduces target addon byte by byte,
+which is verified with sha256.
+"""
+
+import argparse
+import difflib
+import gzip
+import hashlib
+import logging
+from typing import Any, Dict, List, Tuple
+
+import msgpack
+
+DELTA_FORMAT = "learn_to_pronounce_addon_delta"
+DELTA_VERSION = 1
+
+# boundary of a chunk is placed where the rolling hash of preceding bytes has top bits unset,
+# which gives chunks of 256 bytes on average, independently of their position in the section
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "little") for i in range(256)]
+_HASH_MASK = (1 << 64) - 1
+_BOUNDARY_MASK = 0xFF << 56
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+def _diff_list(old: List[Any], new: List[Any]) -> List[Tuple[int, int, List[Any]]]:
+    """
+    Helper function that computes entry-level diff of lists.
+    Entries are compared by their serialized representation.
+
+    Returns
+    -------
+    ops: List[Tuple[int, int, List[Any]]]
+        replacements of ``old[start:end]`` with new entries, ordered by start
+    """
+    old_keys = [msgpack.packb(x) for x in old]
+    new_keys = [msgpack.packb(x) for x in new]
+    matcher = difflib.SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    return [(i1, i2, new[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+
+
+def _apply_list(old: List[Any], ops: List[Tuple[int, int, List[Any]]]) -> List[Any]:
+    result = []
+    pos = 0
+    for start, end, entries in ops:
+        result.extend(old[pos:start])
+        result.extend(entries)
+        pos = end
+    result.extend(old[pos:])
+    return result
+
+
+def _split_bytes(data: bytes) -> List[bytes]:
+    """
+    Helper function that splits binary section into content-defined chunks.
+    Uses gear hash, so boundaries depend only on the last 64 bytes before them.
+    """
+    chunks = []
+    start = 0
+    value = 0
+    for end, byte in enumerate(data, start=1):
+        value = ((value << 1) + _GEAR[byte]) & _HASH_MASK
+        if not value & _BOUNDARY_MASK:
+            chunks.append(data[start:end])
+            start = end
+    if start < len(data):
+        chunks.append(data[start:])
+    return chunks
+
+
+def _diff_bytes(old: bytes, new: bytes) -> List[Tuple[int, int, List[bytes]]]:
+    """
+    Helper function that computes chunk-level diff of binary sections.
+    New chunks of each replacement are merged, since boundaries are recomputed when applied.
+    """
+    ops = _diff_list(_split_bytes(old), _split_bytes(new))
+    return [(start, end, [b"".join(chunks)]) for start, end, chunks in ops]
+
+
+def _apply_bytes(old: bytes, ops: List[Tuple[int, int, List[bytes]]]) -> bytes:
+    return b"".join(_apply_list(_split_bytes(old), ops))
+
+
+def _diff_dict(old: Dict[Any, Any], new: Dict[Any, Any]) -> Dict[str, Any]:
+    """
+    Helper function that computes entry-level diff of dictionaries.
+    Order of keys is stored only if it can't be derived from the base.
+    """
+    changes = {
+        "removed": [x for x in old if x not in new],
+        "set": {k: v for k, v in new.items() if k not in old or msgpack.packb(old[k]) != msgpack.packb(v)},
+        "order": None,
+    }
+    derived_order = [x for x in old if x in new] + [x for x in new if x not in old]
+    if derived_order != list(new):
+        changes["order"] = list(new)
+    return changes
+
+
+def _apply_dict(old: Dict[Any, Any], changes: Dict[str, Any]) -> Dict[Any, Any]:
+    removed = set(changes["removed"])
+    result = {k: v for k, v in old.items() if k not in removed}
+    result.update(changes["set"])
+    if changes["order"] is not None:
+        result = {k: result[k] for k in changes["order"]}
+    return result
+
+
+def _diff_section(old: Any, new: Any) -> List[Any]:
+    """
+    Helper function that picks the smallest representation of section change
+    """
+    replace = ["replace", new]
+    if isinstance(old, list) and isinstance(new, list):
+        candidate = ["list", _diff_list(old, new)]
+    elif isinstance(old, dict) and isinstance(new, dict):
+        candidate = ["dict", _diff_dict(old, new)]
+    elif isinstance(old, bytes) and isinstance(new, bytes):
+        candidate = ["bytes", _diff_bytes(old, new)]
+    else:
+        return replace
+    return candidate if len(msgpack.packb(candidate)) < len(msgpack.packb(replace)) else replace
+
+
+def create_delta(base: bytes, target: bytes) -> bytes:
+    """
+    Computes delta between two serialized addons
+
+    Parameters
+    ----------
+    base: bytes
+        serialized addon that is already distributed
+    target: bytes
+        serialized new version of the addon
+
+    Returns
+    -------
+    delta: bytes
+        gzip-compressed delta, which can be applied with :func:`apply_delta`
+    """
+    base_dict = msgpack.unpackb(base, strict_map_key=False)[0]
+    target_dict = msgpack.unpackb(target, strict_map_key=False)[0]
+    sections = {}
+    for key, value in target_dict.items():
+        if key in base_dict and msgpack.packb(base_dict[key]) == msgpack.packb(value):
+            continue
+        sections[key] = _diff_section(base_dict[key], value) if key in base_dict else ["replace", value]
+    delta = {
+        "format": DELTA_FORMAT,
+        "version": DELTA_VERSION,
+        "base_sha256": _sha256(base),
+        "target_sha256": _sha256(target),
+        "order": list(target_dict),
+        "sections": sections,
+    }
+    return gzip.compress(msgpack.packb(delta), mtime=0)
+
+
+def describe_delta(delta: bytes) -> Dict[str, str]:
+    """
+    Returns how each changed section is updated by the delta: "replace", "list", "dict" or "bytes"
+    """
+    delta_dict = msgpack.unpackb(gzip.decompress(delta), strict_map_key=False)
+    return {key: change[0] for key, change in delta_dict["sections"].items()}
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """
+    Applies delta to the base addon
+
+    Parameters
+    ----------
+    base: bytes
+        serialized addon that delta was computed against
+    delta: bytes
+        delta created by :func:`create_delta`
+
+    Returns
+    -------
+    target: bytes
+        serialized target addon, identical to the one delta was computed for
+    """
+    delta_dict = msgpack.unpackb(gzip.decompress(delta), strict_map_key=False)
+    if delta_dict.get("format") != DELTA_FORMAT or delta_dict.get("version") != DELTA_VERSION:
+        raise RuntimeError(
+            "Unsupported addon delta: {} v{}".format(delta_dict.get("format"), delta_dict.get("version"))
+        )
+    if _sha256(base) != delta_dict["base_sha256"]:
+        raise RuntimeError("Addon delta is computed against another base addon")
+    base_dict = msgpack.unpackb(base, strict_map_key=False)[0]
+    target_dict = {}
+    for key in delta_dict["order"]:
+        change = delta_dict["sections"].get(key)
+        if change is None:
+            target_dict[key] = base_dict[key]
+        elif change[0] == "replace":
+            target_dict[key] = change[1]
+        elif change[0] == "list":
+            target_dict[key] = _apply_list(base_dict[key], change[1])
+        elif change[0] == "dict":
+            target_dict[key] = _apply_dict(base_dict[key], change[1])
+        elif change[0] == "bytes":
+            target_dict[key] = _apply_bytes(base_dict[key], change[1])
+        else:
+            raise RuntimeError("Unknown change [{}] of section [{}]".format(change[0], key))
+    target = msgpack.packb([target_dict])
+    if _sha256(target) != delta_dict["target_sha256"]:
+        raise RuntimeError("Addon obtained by applying delta doesn't match target addon")
+    return target
+
+
+def parse_args():
+    ap = argparse.ArgumentParser("Creates or applies delta between two versions of the addon.")
+    subparsers = ap.add_subparsers(dest="command", required=True)
+    diff = subparsers.add_parser("diff", help="Create delta that turns base addon into target one")
+    diff.add_argument("--base", required=True, help="Addon that is already distributed")
+    diff.add_argument("--target", required=True, help="New version of the addon")
+    diff.add_argument("--out", required=True, help="Path to store delta to")
+    apply = subparsers.add_parser("apply", help="Apply delta to base addon")
+    apply.add_argument("--base", required=True, help="Addon that delta was computed against")
+    apply.add_argument("--delta", required=True, help="Delta created with \"diff\" command")
+    apply.add_argument("--out", required=True, help="Path to store updated addon to")
+    args = ap.parse_args()
+    return args
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    base = _read(args.base)
+    if args.command == "diff":
+        target = _read(args.target)
+        delta = create_delta(base, target)
+        with open(args.out, "wb") as fp:
+            fp.write(delta)
+        for key, change in describe_delta(delta).items():
+            logging.info("Section [{}]: {}".format(key, change))
+        logging.info("Delta is {} bytes, target addon is {} bytes".format(len(delta), len(target)))
+    else:
+        target = apply_delta(base, _read(args.delta))
+        with open(args.out, "wb") as fp:
+            fp.write(target)
+        logging.info("Updated addon matches target, stored to [{}]".format(args.out))
@@ -0,0 +1,135 @@
+"""
+Copyright 2022 Balacoon
+
+Locates sections inside of addon file without decoding it.
+Addon is a msgpack-encoded list with a single map inside. Walking msgpack
+headers allows to find byte ranges of the sections, so they can be accessed
+directly from memory-mapped file.
+"""
+
+import mmap
+import struct
+from typing import Dict, Tuple
+
+# msgpack type byte -> size of length field
+_BIN_AND_STR = {
+    0xC4: 1, 0xC5: 2, 0xC6: 4,  # bin 8/16/32
+    0xD9: 1, 0xDA: 2, 0xDB: 4,  # str 8/16/32
+}
+_EXT = {0xC7: 1, 0xC8: 2, 0xC9: 4}  # ext 8/16/32, length is followed by type
+_FIXED_SIZE = {
+    0xC0: 0, 0xC2: 0, 0xC3: 0,  # nil, false, true
+    0xCA: 4, 0xCB: 8,  # float 32/64
+    0xCC: 1, 0xCD: 2, 0xCE: 4, 0xCF: 8,  # uint 8/16/32/64
+    0xD0: 1, 0xD1: 2, 0xD2: 4, 0xD3: 8,  # int 8/16/32/64
+    0xD4: 2, 0xD5: 3, 0xD6: 5, 0xD7: 9, 0xD8: 17,  # fixext 1/2/4/8/16 (type + data)
+}
+_LENGTH_FORMAT = {1: ">B", 2: ">H", 4: ">I"}
+
+
+def _read_length(buf, pos: int, size: int) -> int:
+    return struct.unpack_from(_LENGTH_FORMAT[size], buf, pos)[0]
+
+
+def _read_container_header(buf, pos: int) -> Tuple[str, int, int]:
+    """
+    Reads header of msgpack array or map
+
+    Returns
+    -------
+    kind: str
+        "array" or "map"
+    count: int
+        number of elements in container
+    pos: int
+        position of the first element
+    """
+    first = buf[pos]
+    if 0x90 <= first <= 0x9F:
+        return "array", first & 0x0F, pos + 1
+    if 0x80 <= first <= 0x8F:
+        return "map", first & 0x0F, pos + 1
+    if first in (0xDC, 0xDE):
+        return "array" if first == 0xDC else "map", _read_length(buf, pos + 1, 2), pos + 3
+    if first in (0xDD, 0xDF):
+        return "array" if first == 0xDD else "map", _read_length(buf, pos + 1, 4), pos + 5
+    raise ValueError("Expected msgpack array or map at position {}".format(pos))
+
+
+def get_payload_range(buf, pos: int) -> Tuple[int, int]:
+    """
+    Returns byte range of payload for msgpack bin or str object starting at given position
+    """
+    first = buf[pos]
+    if 0xA0 <= first <= 0xBF:
+        return pos + 1, pos + 1 + (first & 0x1F)
+    if first not in _BIN_AND_STR:
+        raise ValueError("Expected msgpack bin or str at position {}".format(pos))
+    size = _BIN_AND_STR[first]
+    start = pos + 1 + size
+    return start, start + _read_length(buf, pos + 1, size)
+
+
+def skip_object(buf, pos: int) -> int:
+    """
+    Skips msgpack object starting at given position without decoding it
+
+    Returns
+    -------
+    pos: int
+        position right after the object
+    """
+    first = buf[pos]
+    if first <= 0x7F or first >= 0xE0:
+        return pos + 1
+    if 0xA0 <= first <= 0xBF or first in _BIN_AND_STR:
+        return get_payload_range(buf, pos)[1]
+    if first in _FIXED_SIZE:
+        return pos + 1 + _FIXED_SIZE[first]
+    if first in _EXT:
+        size = _EXT[first]
+        return pos + 1 + size + 1 + _read_length(buf, pos + 1, size)
+    kind, count, pos = _read_container_header(buf, pos)
+    if kind == "map":
+        count *= 2
+    for _ in range(count):
+        pos = skip_object(buf, pos)
+    return pos
+
+
+def get_section_ranges(buf) -> Dict[str, Tuple[int, int]]:
+    """
+    Finds byte ranges of encoded section values in the addon.
+
+    Parameters
+    ----------
+    buf:
+        content of addon file, for ex. ``mmap.mmap`` or bytes
+
+    Returns
+    -------
+    ranges: Dict[str, Tuple[int, int]]
+        mapping from section name to (start, end) of msgpack-encoded section value
+    """
+    kind, count, pos = _read_container_header(buf, 0)
+    if kind != "array" or count != 1:
+        raise ValueError("Addon is expected to be a list with a single map")
+    kind, count, pos = _read_container_header(buf, pos)
+    if kind != "map":
+        raise ValueError("Addon is expected to be a list with a single map")
+    ranges = {}
+    for _ in range(count):
+        key_start, key_end = get_payload_range(buf, pos)
+        key = bytes(buf[key_start:key_end]).decode("utf-8")
+        value_end = skip_object(buf, key_end)
+        ranges[key] = (key_end, value_end)
+        pos = value_end
+    return ranges
+
+
+def map_addon(path: str) -> mmap.mmap:
+    """
+    Memory-maps addon file for reading. Pages are shared between all the processes mapping same file.
+    """
+    with open(path, "rb") as fp:
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
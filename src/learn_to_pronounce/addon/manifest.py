@@ -0,0 +1,204 @@
+"""
+Copyright 2022 Balacoon
+
+Integrity manifest of addon sections. When addon is written with :func:`write_addon`,
+sha256 of every section is computed in a pool of threads while sections are
+written to disk. Digests together with byte ranges of sections are stored in the last
+section of the addon, which can be located from the end of the file.
+:class:`AddonVerifier` uses it to check only the sections that are actually loaded.
+"""
+
+import argparse
+import hashlib
+import logging
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List
+
+import msgpack
+
+from learn_to_pronounce.addon.layout import map_addon
+from learn_to_pronounce.telemetry import get_telemetry
+
+MANIFEST_FIELD = "section_manifest"  #: addon key with digests of other sections, always the last one
+MANIFEST_ALGORITHM = "sha256"
+HASH_CHUNK_SIZE = 1 << 20  #: sections are hashed by chunks, so threads don't hold big copies
+_TRAILER = struct.Struct("<I")  # size of encoded manifest, last bytes of the addon
+
+
+def _digest(buf, start: int, end: int) -> str:
+    """
+    Helper function that computes sha256 of buffer range by chunks.
+    hashlib releases GIL for big chunks, so threads hash in parallel.
+    """
+    digest = hashlib.sha256()
+    view = memoryview(buf)
+    for pos in range(start, end, HASH_CHUNK_SIZE):
+        digest.update(view[pos:min(pos + HASH_CHUNK_SIZE, end)])
+    return digest.hexdigest()
+
+
+def _bin_header(size: int) -> bytes:
+    """
+    Helper function that returns header of msgpack bin object of given size
+    """
+    if size < 1 << 8:
+        return struct.pack(">BB", 0xC4, size)
+    if size < 1 << 16:
+        return struct.pack(">BH", 0xC5, size)
+    return struct.pack(">BI", 0xC6, size)
+
+
+def write_addon(addon_dict: Dict[str, Any], path: str, num_workers: int = 4):
+    """
+    Writes addon with integrity manifest. Layout is the same as ``msgpack.dump([addon_dict])``
+    with manifest added as the last section, so addon can be read as usual.
+
+    Parameters
+    ----------
+    addon_dict: Dict[str, Any]
+        addon to write. Existing manifest is ignored and computed anew
+    path: str
+        path to write addon to
+    num_workers: int
+        number of threads computing digests
+    """
+    packer = msgpack.Packer()
+    sections = [(k, v) for k, v in addon_dict.items() if k != MANIFEST_FIELD]
+    digests = {}
+    progress = get_telemetry().progress("addon_write", total=len(sections), unit="sections")
+    with progress, ThreadPoolExecutor(max_workers=num_workers) as pool, open(path, "wb") as fp:
+        fp.write(packer.pack_array_header(1))
+        fp.write(packer.pack_map_header(len(sections) + 1))
+        for key, value in sections:
+            fp.write(packer.pack(key))
+            encoded = packer.pack(value)
+            start = fp.tell()
+            digests[key] = (start, start + len(encoded), pool.submit(_digest, encoded, 0, len(encoded)))
+            fp.write(encoded)
+            progress.update(1, len(encoded))
+        manifest = {
+            "algorithm": MANIFEST_ALGORITHM,
+            "sections": {key: [start, end, future.result()] for key, (start, end, future) in digests.items()},
+        }
+        encoded_manifest = packer.pack(manifest)
+        fp.write(packer.pack(MANIFEST_FIELD))
+        fp.write(packer.pack(encoded_manifest + _TRAILER.pack(len(encoded_manifest))))
+
+
+class AddonVerifier:
+    """
+    Verifies addon sections against integrity manifest written by :func:`write_addon`.
+    Addon is memory-mapped, only manifest and requested sections are read.
+    """
+
+    def __init__(self, path: str):
+        """
+        constructor of addon verifier
+
+        Parameters
+        ----------
+        path: str
+            path to addon with integrity manifest
+        """
+        self._path = path
+        self._buf = map_addon(path)
+        self._sections = self._read_manifest()["sections"]
+        self._verified = set()
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        """
+        Helper function that reads manifest from the end of the addon
+        """
+        buf = self._buf
+        if len(buf) < _TRAILER.size:
+            raise RuntimeError("[{}] is too small to be an addon".format(self._path))
+        size = _TRAILER.unpack_from(buf, len(buf) - _TRAILER.size)[0]
+        end = len(buf) - _TRAILER.size
+        start = end - size
+        missing = RuntimeError("There is no integrity manifest in [{}]".format(self._path))
+        if start < 0:
+            raise missing
+        # manifest is a bin value of the last key, check that it is preceded by the key
+        header = msgpack.packb(MANIFEST_FIELD) + _bin_header(size + _TRAILER.size)
+        if start < len(header) or buf[start - len(header):start] != header:
+            raise missing
+        manifest = msgpack.unpackb(buf[start:end])
+        if manifest.get("algorithm") != MANIFEST_ALGORITHM:
+            raise RuntimeError("Unsupported manifest algorithm [{}]".format(manifest.get("algorithm")))
+        return manifest
+
+    def get_sections(self) -> List[str]:
+        """
+        Returns names of sections covered by manifest
+        """
+        return list(self._sections)
+
+    def verify_section(self, name: str):
+        """
+        Verifies section, raises ``RuntimeError`` if it is corrupted.
+        Each section is verified only once.
+        """
+        if name in self._verified:
+            return
+        if name not in self._sections:
+            raise KeyError("There is no [{}] in manifest of [{}]".format(name, self._path))
+        start, end, digest = self._sections[name]
+        if end > len(self._buf) or _digest(self._buf, start, end) != digest:
+            raise RuntimeError("Section [{}] of [{}] is corrupted".format(name, self._path))
+        self._verified.add(name)
+
+    def verify(self, sections: Iterable[str] = None, num_workers: int = 4) -> Dict[str, bool]:
+        """
+        Verifies several sections concurrently
+
+        Parameters
+        ----------
+        sections: Iterable[str]
+            sections to verify, all by default
+        num_workers: int
+            number of threads computing digests
+
+        Returns
+        -------
+        result: Dict[str, bool]
+            whether each section is intact
+        """
+        sections = self.get_sections() if sections is None else list(sections)
+
+        def is_intact(name: str) -> bool:
+            try:
+                self.verify_section(name)
+            except RuntimeError:
+                return False
+            return True
+
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            return dict(zip(sections, pool.map(is_intact, sections)))
+
+    def load_section(self, name: str) -> Any:
+        """
+        Verifies section and decodes it
+        """
+        self.verify_section(name)
+        start, end, _ = self._sections[name]
+        return msgpack.unpackb(self._buf[start:end])
+
+
+def parse_args():
+    ap = argparse.ArgumentParser("Verifies addon sections against integrity manifest.")
+    ap.add_argument("--addon", required=True, help="Path to addon saved with integrity manifest")
+    ap.add_argument("--sections", nargs="*", help="Sections to verify, all by default")
+    ap.add_argument("--num-workers", type=int, default=4, help="Number of threads computing digests")
+    args = ap.parse_args()
+    return args
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    result = AddonVerifier(args.addon).verify(args.sections, num_workers=args.num_workers)
+    for name, intact in result.items():
+        logging.info("{}: {}".format(name, "ok" if intact else "CORRUPTED"))
+    if not all(result.values()):
+        raise SystemExit(1)
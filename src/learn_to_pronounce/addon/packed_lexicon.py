@@ -0,0 +1,276 @@
+"""
+Copyright 2022 Balacoon
+
+Flat binary packing of the lexicon that can be queried
+directly from memory-mapped addon, without deserialization.
+
+Layout (little-endian, sections are padded to multiples of 8 bytes within the blob):
+
+- header: magic, counts, lengths and offsets of sections
+- symbols: phoneme symbols as utf-8, separated by newline. Index of symbol is its id
+- word offsets: ``n_words + 1`` uint32 offsets into word pool
+- word pool: utf-8 encoded words, sorted bytewise
+- word pronunciations: ``n_words + 1`` uint32 indices into pronunciation offsets
+- pronunciation offsets: ``n_prons + 1`` uint32 offsets into phoneme pool
+- phoneme pool: uint16 phoneme ids
+
+In the addon, blob follows msgpack bin header at an arbitrary file offset, so arrays are not
+aligned in memory-mapped file. They are never cast to typed views, values are read
+with ``struct.unpack_from``, which has no alignment requirements.
+"""
+
+import array
+import struct
+import sys
+from typing import Iterable, List, Tuple
+
+from learn_to_pronounce.addon.layout import get_payload_range, get_section_ranges, map_addon
+from learn_to_pronounce.addon.manifest import AddonVerifier
+
+PACKED_LEXICON_FIELD = "packed_lexicon"  #: addon key under which packed lexicon is stored
+MAGIC = b"LTPLEX01"
+_HEADER = struct.Struct("<8s6I6Q")
+_ALIGNMENT = 8
+
+
+def _to_little_endian(values: array.array) -> bytes:
+    if sys.byteorder != "little":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _pad(blob: bytearray):
+    blob.extend(b"\x00" * (-len(blob) % _ALIGNMENT))
+
+
+def pack_lexicon(entries: Iterable[Tuple[str, List[str]]], phonemes: List[str]) -> bytes:
+    """
+    Packs lexicon into flat binary blob
+
+    Parameters
+    ----------
+    entries: Iterable[Tuple[str, List[str]]]
+        words with their pronunciations. Each pronunciation is
+        a string of phonemes separated by space.
+    phonemes: List[str]
+        phoneme symbols. Symbols found in pronunciations but missing
+        from the list are appended to the symbol table.
+
+    Returns
+    -------
+    blob: bytes
+        packed lexicon, which can be read with :class:`PackedLexicon`
+    """
+    symbols = list(phonemes)
+    symbol_ids = {x: i for i, x in enumerate(symbols)}
+    encoded = sorted((word.encode("utf-8"), prons) for word, prons in entries)
+
+    word_offsets = array.array("I", [0])
+    word_pool = bytearray()
+    word_prons = array.array("I", [0])
+    pron_offsets = array.array("I", [0])
+    pool = array.array("H")
+    for word, prons in encoded:
+        word_pool.extend(word)
+        word_offsets.append(len(word_pool))
+        for pron in prons:
+            for phoneme in pron.split():
+                if phoneme not in symbol_ids:
+                    symbol_ids[phoneme] = len(symbols)
+                    symbols.append(phoneme)
+                pool.append(symbol_ids[phoneme])
+            pron_offsets.append(len(pool))
+        word_prons.append(len(pron_offsets) - 1)
+
+    symbols_blob = "\n".join(symbols).encode("utf-8")
+    sections = [
+        symbols_blob,
+        _to_little_endian(word_offsets),
+        bytes(word_pool),
+        _to_little_endian(word_prons),
+        _to_little_endian(pron_offsets),
+        _to_little_endian(pool),
+    ]
+    blob = bytearray(_HEADER.size)
+    _pad(blob)
+    offsets = []
+    for section in sections:
+        offsets.append(len(blob))
+        blob.extend(section)
+        _pad(blob)
+    _HEADER.pack_into(
+        blob,
+        0,
+        MAGIC,
+        len(encoded),
+        len(pron_offsets) - 1,
+        len(symbols),
+        len(pool),
+        len(word_pool),
+        len(symbols_blob),
+        *offsets
+    )
+    return bytes(blob)
+
+
+class PackedLexicon:
+    """
+    Read-only view on a packed lexicon. Words are looked up with binary search
+    directly in the underlying buffer, nothing is decoded in advance.
+    When created from addon with :func:`from_addon`, buffer is a memory-mapped file,
+    so all the processes serving same addon share lexicon pages via page cache.
+    """
+
+    def __init__(self, buf):
+        """
+        constructor of packed lexicon
+
+        Parameters
+        ----------
+        buf:
+            object supporting buffer protocol with the blob created by :func:`pack_lexicon`
+        """
+        self._buf = memoryview(buf)
+        (
+            magic,
+            self._n_words,
+            self._n_prons,
+            n_symbols,
+            _,
+            _,
+            symbols_len,
+            symbols_off,
+            self._word_offsets_off,
+            self._word_pool_off,
+            self._word_prons_off,
+            self._pron_offsets_off,
+            self._pool_off,
+        ) = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            raise ValueError("Buffer doesn't contain packed lexicon")
+        symbols_blob = bytes(self._buf[symbols_off:symbols_off + symbols_len])
+        self._symbols = symbols_blob.decode("utf-8").split("\n") if n_symbols else []
+
+    @classmethod
+    def from_addon(cls, path: str, verify: bool = False) -> "PackedLexicon":
+        """
+        Memory-maps addon and creates packed lexicon on top of corresponding section.
+        Section should be stored uncompressed.
+
+        Parameters
+        ----------
+        path: str
+            path to addon with packed lexicon
+        verify: bool
+            whether to check packed lexicon against integrity manifest of the addon,
+            see :class:`learn_to_pronounce.addon.manifest.AddonVerifier`. Other sections are not read.
+
+        Returns
+        -------
+        lexicon: PackedLexicon
+            lexicon, which reads from memory-mapped addon
+        """
+        if verify:
+            AddonVerifier(path).verify_section(PACKED_LEXICON_FIELD)
+        buf = map_addon(path)
+        ranges = get_section_ranges(buf)
+        if PACKED_LEXICON_FIELD not in ranges:
+            raise KeyError("There is no [{}] in [{}]".format(PACKED_LEXICON_FIELD, path))
+        start, end = get_payload_range(buf, ranges[PACKED_LEXICON_FIELD][0])
+        return cls(memoryview(buf)[start:end])
+
+    def _uint32(self, section_off: int, index: int) -> int:
+        return struct.unpack_from("<I", self._buf, section_off + 4 * index)[0]
+
+    def _word(self, index: int) -> bytes:
+        start = self._uint32(self._word_offsets_off, index)
+        end = self._uint32(self._word_offsets_off, index + 1)
+        return bytes(self._buf[self._word_pool_off + start:self._word_pool_off + end])
+
+    def _find(self, word: str) -> int:
+        """
+        Binary search of the word, returns its index or -1
+        """
+        key = word.encode("utf-8")
+        lo, hi = 0, self._n_words
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n_words and self._word(lo) == key:
+            return lo
+        return -1
+
+    def _get_phoneme_ids(self, index: int) -> List[Tuple[int, ...]]:
+        """
+        Reads pronunciations of the word with given index
+        """
+        prons = []
+        for pron in range(self._uint32(self._word_prons_off, index), self._uint32(self._word_prons_off, index + 1)):
+            start = self._uint32(self._pron_offsets_off, pron)
+            end = self._uint32(self._pron_offsets_off, pron + 1)
+            prons.append(struct.unpack_from("<{}H".format(end - start), self._buf, self._pool_off + 2 * start))
+        return prons
+
+    def get_phoneme_ids(self, word: str) -> List[Tuple[int, ...]]:
+        """
+        Looks up pronunciations of the word as sequences of phoneme ids
+
+        Parameters
+        ----------
+        word: str
+            word to look up
+
+        Returns
+        -------
+        pronunciations: List[Tuple[int, ...]]
+            pronunciation variants of the word, empty list if word is not in lexicon
+        """
+        index = self._find(word)
+        if index < 0:
+            return []
+        return self._get_phoneme_ids(index)
+
+    def get_pronunciations(self, word: str) -> List[str]:
+        """
+        Looks up pronunciations of the word
+
+        Parameters
+        ----------
+        word: str
+            word to look up
+
+        Returns
+        -------
+        pronunciations: List[str]
+            pronunciation variants as phonemes separated by space, empty list if word is not in lexicon
+        """
+        return [" ".join(self._symbols[x] for x in ids) for ids in self.get_phoneme_ids(word)]
+
+    def __contains__(self, word: str) -> bool:
+        return self._find(word) >= 0
+
+    def __len__(self) -> int:
+        return self._n_words
+
+    def get_symbols(self) -> List[str]:
+        """
+        Returns phoneme symbols, index of the symbol in the list is its id
+        """
+        return list(self._symbols)
+
+    def iterate(self) -> Iterable[Tuple[str, List[str]]]:
+        """
+        Iterates over all the entries of lexicon in sorted order
+
+        Returns
+        -------
+        entries: Iterable[Tuple[str, List[str]]]
+            words with their pronunciations, same as passed to :func:`pack_lexicon`
+        """
+        for index in range(self._n_words):
+            prons = [" ".join(self._symbols[x] for x in ids) for ids in self._get_phoneme_ids(index)]
+            yield self._word(index).decode("utf-8"), prons
@@ -6,9 +6,13 @@ Interactive pronunciation generation with created addon
 
 import logging
 import argparse
+import os
 
 from balacoon_frontend import PronunciationManager
 
+from learn_to_pronounce.serving.cache import PronunciationCache
+from learn_to_pronounce.serving.service import pronunciation_to_string
+
 
 def parse_args():
     ap = argparse.ArgumentParser("Returns pronunciation given addon.")
@@ -25,6 +29,13 @@ def parse_args():
         default="",
         help="If addon has multiple pronunciation fields sections, disambiguate one to use, by providing locale",
     )
+    ap.add_argument(
+        "--cache-size", type=int, default=1000, help="Number of generated pronunciations to cache, 0 disables cache"
+    )
+    ap.add_argument(
+        "--cache-path",
+        help="If specified, cached pronunciations are restored from this file on start and stored on exit",
+    )
     args = ap.parse_args()
     return args
 
@@ -34,12 +45,21 @@ def main():
     args = parse_args()
 
     pm = PronunciationManager(args.addon, args.locale)
-    while True:
-        word_str = input("Enter word: ")
-        if not word_str:
-            logging.info("No pronunciation for empty string")
-            continue
-        if args.spelling:
-            logging.info(pm.get_spelling(word_str))
-        else:
-            logging.info(pm.get_pronunciation(word_str))
+    cache = PronunciationCache(capacity=args.cache_size, locale=args.locale)
+    if args.cache_path and os.path.isfile(args.cache_path):
+        cache.load(args.cache_path)
+    if args.spelling:
+        kind, generate = "spelling", lambda x: pronunciation_to_string(pm.get_spelling(x))
+    else:
+        kind, generate = "pronunciation", lambda x: pronunciation_to_string(pm.get_pronunciation(x))
+    try:
+        while True:
+            word_str = input("Enter word: ")
+            if not word_str:
+                logging.info("No pronunciation for empty string")
+                continue
+            logging.info(cache.get(word_str, generate, kind=kind))
+    except (EOFError, KeyboardInterrupt):
+        cache.log_stats()
+        if args.cache_path:
+            cache.save(args.cache_path)
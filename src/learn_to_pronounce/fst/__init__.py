@@ -15,8 +15,29 @@ In the future it should generalized to work with any pronunciation generation me
 
     FSTTrainer
     FSTEvaluator
+    OOVTable
+    TrainingSession
+    ErrorAnalyzer
+
+``score_confidence`` script scores confidence of generated pronunciations
+(cost of the best hypothesis and margin to the second best) for large word lists,
+see :mod:`learn_to_pronounce.fst.confidence`.
 
 """
 
-from learn_to_pronounce.fst.fst_trainer import FSTTrainer
-from learn_to_pronounce.fst.fst_evaluator import FSTEvaluator
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    "FSTTrainer": "learn_to_pronounce.fst.fst_trainer",
+    "FSTEvaluator": "learn_to_pronounce.fst.fst_evaluator",
+    "OOVTable": "learn_to_pronounce.fst.oov_table",
+    "TrainingSession": "learn_to_pronounce.fst.training_session",
+    "ErrorAnalyzer": "learn_to_pronounce.fst.error_analysis",
+}
+
+
+def __getattr__(name: str):
+    # trainer and evaluator import balacoon_frontend, evaluator also edlib and tqdm
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,95 @@
+"""
+Copyright 2022 Balacoon
+
+Command line arguments of FST training. Kept separately from the trainer,
+so argument parsing doesn't require heavy dependencies.
+"""
+
+import argparse
+
+from learn_to_pronounce.resources.normalization import TrainingDataNormalizer
+
+
+def add_fst_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds special arguments specific to FST training into argument parsing
+
+    Parameters
+    ----------
+    parser: argparse.ArgumentParser
+        argument parser from recipe to add special arguments to
+    """
+    arg_group = parser.add_argument_group("fst")
+    arg_group.add_argument(
+        "--fst-order",
+        default=8,
+        type=int,
+        help="Maximum N-gram order to be used in FST",
+    )
+    arg_group.add_argument(
+        "--fst-spelling-order",
+        default=3,
+        type=int,
+        help="Maximum N-gram order to be used in spelling FST",
+    )
+    arg_group.add_argument(
+        "--fst-incremental",
+        action="store_true",
+        help="Reuse alignments from the previous run in work dir and align only new or changed entries. "
+        "N-gram model is re-estimated on the complete training data",
+    )
+    arg_group.add_argument(
+        "--fst-incremental-max-change",
+        default=0.2,
+        type=float,
+        help="Fraction of new or changed training entries above which incremental training "
+        "falls back to training from scratch",
+    )
+    arg_group.add_argument(
+        "--fst-eval-chunk-size",
+        default=1000,
+        type=int,
+        help="Number of test words evaluated between checkpoints. Interrupted evaluation "
+        "resumes from work_dir/evaluation_checkpoint.json",
+    )
+    arg_group.add_argument(
+        "--fst-stress-classes",
+        help="File with stress and tone marks (as data/stress_and_tone.txt) to split error analysis of "
+        "evaluation by. If not specified, marks shipped with the package are used. "
+        "Confusion matrices are stored to work_dir/error_analysis",
+    )
+    arg_group.add_argument(
+        "--fst-unicode-normalization",
+        choices=["NFC", "NFD", "NFKC", "NFKD"],
+        help="Unicode normalization of words in pronunciation training data. Words are kept as is by default",
+    )
+    arg_group.add_argument(
+        "--fst-casefold",
+        action="store_true",
+        help="Case-fold words in pronunciation training data, so case variants of a word are merged",
+    )
+    arg_group.add_argument(
+        "--fst-max-variants",
+        type=int,
+        help="Maximum number of pronunciation variants per word in pronunciation training data. "
+        "Identical (word, pronunciation) pairs are always removed",
+    )
+    arg_group.add_argument(
+        "--max-memory",
+        type=int,
+        help="Memory budget in megabytes for preparation of pronunciation training data. If specified, "
+        "lexicon is streamed into training data with sorting spilled to disk, instead of being loaded "
+        "into memory. Doesn't bound memory of phonetisaurus itself and of --fst-incremental",
+    )
+
+
+def create_normalizer(args: argparse.Namespace) -> TrainingDataNormalizer:
+    """
+    Creates normalizer of pronunciation training data from arguments added by :func:`add_fst_arguments`.
+    Shared by all the stages that train pronunciation FST, so they train on the same data.
+    """
+    return TrainingDataNormalizer(
+        unicode_form=args.fst_unicode_normalization,
+        casefold=args.fst_casefold,
+        max_variants=args.fst_max_variants,
+    )
@@ -0,0 +1,287 @@
+"""
+Copyright 2022 Balacoon
+
+Scores confidence of FST-based pronunciation generation. For each word two best
+hypotheses are decoded from ``pronunciation.fst``, cost of the best path and margin
+to the second best are reported. Small margin means that model hesitates
+between pronunciations, such words are the first candidates for lexicon curation.
+Words are scored in a pool of processes, results are streamed to disk in sorted runs
+which are merged in the end, so vocabularies of millions of words fit into memory.
+"""
+
+import argparse
+import heapq
+import logging
+import math
+import multiprocessing
+import os
+import tempfile
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+from learn_to_pronounce.fst.parallel import chunks
+
+#: input/output labels of phonetisaurus models that don't correspond to graphemes/phonemes
+SKIP_SYMBOLS = {"<eps>", "_", "<s>", "</s>"}
+CLUSTER_SEPARATOR = "|"  #: separates graphemes or phonemes merged into a single label by phonetisaurus
+COLUMNS = ["word", "cost", "margin", "pronunciation", "second_pronunciation"]
+
+Score = Tuple[str, float, float, str, str]  #: word, best cost, margin, best and second-best pronunciation
+
+_scorer = None  # scorer created in a worker process
+
+
+class ConfidenceScorer:
+    """
+    Decodes two best pronunciations of a word with phonetisaurus FST via pywrapfst.
+    Word is converted into an acceptor that contains arcs both for single
+    graphemes and for grapheme clusters known to the model, same as phonetisaurus decoder does.
+    """
+
+    def __init__(self, fst_path: str):
+        """
+        constructor of confidence scorer
+
+        Parameters
+        ----------
+        fst_path: str
+            path to pronunciation FST trained by phonetisaurus
+        """
+        import pywrapfst as fst
+
+        self._fst = fst
+        self._model = fst.Fst.read(fst_path)
+        self._model.arcsort(sort_type="ilabel")
+        self._weight_type = self._model.weight_type()
+        self._clusters = {}  # tuple of graphemes -> input label
+        for label, symbol in self._model.input_symbols():
+            if symbol in SKIP_SYMBOLS:
+                continue
+            self._clusters[tuple(symbol.split(CLUSTER_SEPARATOR))] = label
+        self._max_cluster = max((len(x) for x in self._clusters), default=1)
+        output_symbols = self._model.output_symbols()
+        self._phonemes = {label: symbol for label, symbol in output_symbols}
+
+    def _word_acceptor(self, word: str):
+        """
+        Helper function that builds acceptor of the word. Returns None if word contains unknown graphemes.
+        """
+        fst = self._fst
+        one = fst.Weight.one(self._weight_type)
+        acceptor = fst.VectorFst(arc_type=self._model.arc_type())
+        states = [acceptor.add_state() for _ in range(len(word) + 1)]
+        acceptor.set_start(states[0])
+        acceptor.set_final(states[-1], one)
+        for start in range(len(word)):
+            for size in range(1, min(self._max_cluster, len(word) - start) + 1):
+                label = self._clusters.get(tuple(word[start:start + size]))
+                if label is not None:
+                    acceptor.add_arc(states[start], fst.Arc(label, label, one, states[start + size]))
+                elif size == 1:
+                    return None
+        acceptor.arcsort(sort_type="olabel")
+        return acceptor
+
+    def _path_to_string(self, labels: List[int]) -> str:
+        phonemes = []
+        for label in labels:
+            for phoneme in self._phonemes.get(label, "").split(CLUSTER_SEPARATOR):
+                if phoneme and phoneme not in SKIP_SYMBOLS:
+                    phonemes.append(phoneme)
+        return " ".join(phonemes)
+
+    def score(self, word: str) -> Optional[Score]:
+        """
+        Scores a single word
+
+        Parameters
+        ----------
+        word: str
+            word to score
+
+        Returns
+        -------
+        score: Optional[Score]
+            word, cost of the best path, margin to the second best path (inf if there is a single
+            hypothesis), best and second best pronunciations. None if word can't be decoded.
+        """
+        fst = self._fst
+        acceptor = self._word_acceptor(word)
+        if acceptor is None:
+            return None
+        lattice = fst.compose(acceptor, self._model)
+        lattice.project("output")
+        lattice.rmepsilon()
+        paths = fst.shortestpath(lattice, nshortest=2, unique=True)
+        if paths.start() == -1:
+            return None
+        hypotheses = []
+        for arc in paths.arcs(paths.start()):
+            labels, cost, state = [arc.olabel], float(str(arc.weight)), arc.nextstate
+            while paths.num_arcs(state):
+                next_arc = next(iter(paths.arcs(state)))
+                labels.append(next_arc.olabel)
+                cost += float(str(next_arc.weight))
+                state = next_arc.nextstate
+            cost += float(str(paths.final(state)))
+            hypotheses.append((cost, self._path_to_string(labels)))
+        if not hypotheses:
+            return None
+        hypotheses.sort()
+        best_cost, best = hypotheses[0]
+        second_cost, second = hypotheses[1] if len(hypotheses) > 1 else (math.inf, "")
+        return word, best_cost, second_cost - best_cost, best, second
+
+
+def _init_worker(fst_path: str):
+    global _scorer
+    _scorer = ConfidenceScorer(fst_path)
+
+
+def _score_chunk(words: List[str]) -> List[Optional[Score]]:
+    return [_scorer.score(x) for x in words]
+
+
+def score_parallel(
+    fst_path: str, words: Iterable[str], num_workers: int = 1, chunk_size: int = 1000
+) -> Iterator[Optional[Score]]:
+    """
+    Scores words in a pool of processes, each process loads FST once.
+    Results are returned in the order of input words.
+
+    Parameters
+    ----------
+    fst_path: str
+        path to pronunciation FST
+    words: Iterable[str]
+        words to score, consumed lazily
+    num_workers: int
+        number of worker processes. If 1, words are scored in current process
+    chunk_size: int
+        number of words sent to worker at once
+
+    Returns
+    -------
+    scores: Iterator[Optional[Score]]
+        results of :func:`ConfidenceScorer.score` for each word
+    """
+    if num_workers <= 1:
+        _init_worker(fst_path)
+        for chunk in chunks(words, chunk_size):
+            yield from _score_chunk(chunk)
+        return
+    with multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(fst_path,)) as pool:
+        for chunk_result in pool.imap(_score_chunk, chunks(words, chunk_size)):
+            yield from chunk_result
+
+
+def _sort_key(score: Score) -> Tuple[float, float, str]:
+    # least confident first: smallest margin, then highest cost
+    return score[2], -score[1], score[0]
+
+
+def _format(score: Score) -> str:
+    return "{}\t{:.4f}\t{:.4f}\t{}\t{}\n".format(*score)
+
+
+def _parse(line: str) -> Score:
+    word, cost, margin, best, second = line.rstrip("\n").split("\t")
+    return word, float(cost), float(margin), best, second
+
+
+def _read_run(fp: IO[str]) -> Iterator[Score]:
+    for line in fp:
+        yield _parse(line)
+
+
+def write_sorted(scores: Iterable[Score], out_path: str, run_size: int = 1000000) -> int:
+    """
+    Writes scores sorted from the least confident to the most confident.
+    Scores are sorted in runs of limited size stored to temporary files,
+    which are merged into the output.
+
+    Parameters
+    ----------
+    scores: Iterable[Score]
+        scores to write
+    out_path: str
+        path to tab-separated output file, columns are :data:`COLUMNS`
+    run_size: int
+        maximum number of scores kept in memory
+
+    Returns
+    -------
+    count: int
+        number of written scores
+    """
+    count = 0
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(out_path))) as temp_dir:
+        run_paths = []
+        run = []
+
+        def flush():
+            run.sort(key=_sort_key)
+            path = os.path.join(temp_dir, "run_{}".format(len(run_paths)))
+            with open(path, "w", encoding="utf-8") as fp:
+                fp.writelines(_format(x) for x in run)
+            run_paths.append(path)
+            run.clear()
+
+        for word, cost, margin, best, second in scores:
+            # rounded as in output, so runs and their merge use the same order
+            run.append((word, round(cost, 4), round(margin, 4), best, second))
+            count += 1
+            if len(run) >= run_size:
+                flush()
+        if run or not run_paths:
+            flush()
+        files = [open(x, "r", encoding="utf-8") for x in run_paths]
+        try:
+            with open(out_path, "w", encoding="utf-8") as fp:
+                fp.write("\t".join(COLUMNS) + "\n")
+                for score in heapq.merge(*[_read_run(x) for x in files], key=_sort_key):
+                    fp.write(_format(score))
+        finally:
+            for x in files:
+                x.close()
+    return count
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(
+        "Scores confidence of FST-based pronunciation generation for a list of words. "
+        "Output is sorted from the least confident word."
+    )
+    ap.add_argument("--fst", required=True, help="Path to pronunciation FST (work_dir/pronunciation.fst)")
+    ap.add_argument("--words", required=True, help="File with words to score, one per line")
+    ap.add_argument("--out", required=True, help="Path to tab-separated file to store scores to")
+    ap.add_argument("--num-workers", type=int, default=os.cpu_count(), help="Number of processes to decode with")
+    ap.add_argument("--run-size", type=int, default=1000000, help="Number of scores sorted in memory at once")
+    args = ap.parse_args()
+    return args
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+
+    skipped = 0
+
+    def read_words() -> Iterator[str]:
+        with open(args.words, "r", encoding="utf-8") as fp:
+            for line in fp:
+                word = line.strip()
+                if word:
+                    yield word
+
+    def valid(scores: Iterable[Optional[Score]]) -> Iterator[Score]:
+        nonlocal skipped
+        for score in scores:
+            if score is None:
+                skipped += 1
+            else:
+                yield score
+
+    count = write_sorted(
+        valid(score_parallel(args.fst, read_words(), num_workers=args.num_workers)), args.out, run_size=args.run_size
+    )
+    logging.info("Scored {} words, {} words can't be decoded. Stored to [{}]".format(count, skipped, args.out))
@@ -0,0 +1,120 @@
+"""
+Copyright 2022 Balacoon
+
+K-fold cross-validation of FST-based pronunciation generation
+"""
+
+import json
+import logging
+import os
+import random
+import statistics
+from typing import Any, Dict, List, Tuple
+
+from learn_to_pronounce.fst.experiment import TrainEvalJob, run_jobs
+from learn_to_pronounce.fst.fst_trainer import dump_training_entries
+from learn_to_pronounce.resources.normalization import TrainingDataNormalizer
+from learn_to_pronounce.resources.provider import AbstractProvider, get_lexicon_entries
+
+METRICS = ["wer", "per", "wer_stressless", "per_stressless", "train_time", "eval_time"]
+
+
+def split_folds(
+    entries: List[Tuple[str, List[str]]], folds: int, seed: int = 42
+) -> List[List[Tuple[str, List[str]]]]:
+    """
+    Splits lexicon entries into folds by word. Split depends only on seed and set of words.
+
+    Parameters
+    ----------
+    entries: List[Tuple[str, List[str]]]
+        words with their pronunciations
+    folds: int
+        number of folds
+    seed: int
+        seed for shuffling of words
+
+    Returns
+    -------
+    folds: List[List[Tuple[str, List[str]]]]
+        entries split into folds of (almost) equal size
+    """
+    entries = sorted(entries, key=lambda x: x[0])
+    random.Random(seed).shuffle(entries)
+    return [entries[i::folds] for i in range(folds)]
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """
+    Computes mean and standard deviation of metrics across folds
+    """
+    summary = {}
+    for metric in METRICS:
+        values = [x[metric] for x in results]
+        summary[metric] = {
+            "mean": statistics.mean(values),
+            "stddev": statistics.stdev(values) if len(values) > 1 else 0.0,
+        }
+    return summary
+
+
+def cross_validate(
+    provider: AbstractProvider,
+    work_dir: str,
+    ngram_order: int,
+    folds: int,
+    num_workers: int,
+    seed: int = 42,
+    normalizer: TrainingDataNormalizer = None,
+) -> Dict[str, Any]:
+    """
+    Splits training words into K folds, trains K models each on K-1 folds
+    and evaluates on the remaining one. Models are trained concurrently.
+
+    Parameters
+    ----------
+    provider: AbstractProvider
+        resources provider to get lexicon from
+    work_dir: str
+        directory to put artifacts to, each fold gets its own sub-directory
+    ngram_order: int
+        maximum N-gram order of the FST
+    folds: int
+        number of folds
+    num_workers: int
+        maximum number of models trained at the same time
+    seed: int
+        seed for splitting words into folds
+    normalizer: TrainingDataNormalizer
+        normalizer of training data of folds, same as the one pronunciation FST is trained with.
+        Test folds are kept as is
+
+    Returns
+    -------
+    report: Dict[str, Any]
+        per-fold results and their summary, also stored to ``cross_validation.json``
+    """
+    if folds < 2:
+        raise ValueError("Cross-validation requires at least 2 folds, got {}".format(folds))
+    cv_dir = os.path.join(work_dir, "cross_validation")
+    os.makedirs(cv_dir, exist_ok=True)
+    entries = get_lexicon_entries(provider.get_lexicon(words=provider.get_train_words()))
+    split = split_folds(entries, folds, seed=seed)
+    logging.info("Running {}-fold cross-validation on {} words".format(folds, len(entries)))
+
+    jobs = []
+    for i, test_entries in enumerate(split):
+        fold_dir = os.path.join(cv_dir, "fold_{}".format(i))
+        os.makedirs(fold_dir, exist_ok=True)
+        train_data_path = os.path.join(fold_dir, "pronunciation_training_data")
+        train_entries = (x for j, fold in enumerate(split) if j != i for x in fold)
+        dump_training_entries(train_entries, train_data_path, normalizer=normalizer)
+        jobs.append(TrainEvalJob("fold_{}".format(i), fold_dir, train_data_path, test_entries, ngram_order))
+    results = run_jobs(jobs, num_workers)
+
+    report = {"folds": folds, "seed": seed, "words": len(entries), "results": results, "summary": summarize(results)}
+    with open(os.path.join(cv_dir, "cross_validation.json"), "w", encoding="utf-8") as fp:
+        json.dump(report, fp, indent=2)
+    for metric, values in report["summary"].items():
+        logging.info("{}: {:.2f} +- {:.2f}".format(metric, values["mean"], values["stddev"]))
+    return report
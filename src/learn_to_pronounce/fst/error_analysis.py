@@ -0,0 +1,358 @@
+"""
+Copyright 2022 Balacoon
+
+Error analysis of pronunciation generation. Hypotheses are aligned with references via edlib,
+alignments are buffered as run-length encoded operations and converted into
+substitution/insertion/deletion confusion matrices in bulk with numpy.
+Matrices are computed over phonemes without stress and tone marks and split by stress (or tone) class
+of the reference phoneme (hypothesis phoneme for insertions), see ``data/stress_and_tone.txt``.
+Stress and tone errors on the correct phoneme are accounted separately.
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import edlib
+import numpy as np
+
+from learn_to_pronounce.resources.interned import STRESS_MARKS, TONE_MARKS, PhonemeTable
+
+NO_STRESS = "<no_stress>"
+EPSILON = "<eps>"  #: stands for missing phoneme in insertions and deletions
+MATCH, SUBSTITUTION, INSERTION, DELETION = range(4)
+ERROR_TYPES = {SUBSTITUTION: "substitution", INSERTION: "insertion", DELETION: "deletion"}
+# edlib aligns hypothesis (query) to reference (target): "I" is an extra hypothesis phoneme
+_CIGAR_OPS = {"=": MATCH, "X": SUBSTITUTION, "I": INSERTION, "D": DELETION}
+_CIGAR_RE = re.compile(r"(\d+)([=XID])")
+
+
+def read_stress_classes(path: str = None) -> List[str]:
+    """
+    Reads stress and tone marks, one per line (``<mark>\\t<id>``, as ``data/stress_and_tone.txt``).
+    Without path, marks shipped with the package are used, same ones :class:`PhonemeTable` strips.
+
+    Returns
+    -------
+    classes: List[str]
+        stress classes, the first one is :data:`NO_STRESS`
+    """
+    if path is None:
+        return [NO_STRESS] + list(STRESS_MARKS) + list(TONE_MARKS)
+    with open(path, "r", encoding="utf-8") as fp:
+        marks = [x.split("\t")[0] for x in fp if x.strip()]
+    return [NO_STRESS] + [x for x in marks if x != NO_STRESS]
+
+
+def get_stress_class(symbol: str, classes: List[str]) -> int:
+    """
+    Returns index of stress class of the phoneme. Stress marks prefix phonemes,
+    tone marks (starting with "_") are suffixes. Longest matching mark wins.
+    """
+    best, best_length = 0, 0
+    for i, mark in enumerate(classes):
+        if i == 0 or len(mark) <= best_length:
+            continue
+        if symbol.endswith(mark) if mark.startswith("_") else symbol.startswith(mark):
+            best, best_length = i, len(mark)
+    return best
+
+
+def align_closest(reference_ids: List[Sequence[int]], hypothesis_ids: Sequence[int]) -> Tuple[int, int, Optional[str]]:
+    """
+    Aligns hypothesis with references until the exact match and picks the closest one.
+    A single edlib call per reference gives both the edit distance and the alignment path.
+
+    Returns
+    -------
+    index: int
+        index of the closest reference
+    distance: int
+        edit distance between the hypothesis and the closest reference
+    cigar: Optional[str]
+        extended CIGAR of the alignment, None if one of pronunciations is empty
+    """
+    best = None
+    for i, reference in enumerate(reference_ids):
+        result = edlib.align(hypothesis_ids, reference, task="path")
+        if best is None or result["editDistance"] < best[1]:
+            best = (i, result["editDistance"], result["cigar"])
+        if not result["editDistance"]:
+            break
+    return best
+
+
+class ErrorAnalyzer:
+    """
+    Accumulates confusion matrices of generated pronunciations.
+    Counts are stored in array ``[class, reference, hypothesis]``, where phonemes are stressless ids
+    of the phoneme table shifted by one, index 0 stands for :data:`EPSILON`.
+    """
+
+    def __init__(self, table: PhonemeTable, classes: List[str] = None, batch_size: int = 10000):
+        """
+        constructor of error analyzer
+
+        Parameters
+        ----------
+        table: PhonemeTable
+            table that compared phoneme ids are interned with
+        classes: List[str]
+            stress classes returned by :func:`read_stress_classes`
+        batch_size: int
+            number of compared pronunciations buffered before accumulating them into matrices
+        """
+        self._table = table
+        self._classes = read_stress_classes() if classes is None else classes
+        self._batch_size = batch_size
+        self._counts = np.zeros((len(self._classes), 1, 1), dtype=np.int64)
+        self._stress = np.zeros((len(self._classes), len(self._classes)), dtype=np.int64)
+        self._reset_buffers()
+
+    def _reset_buffers(self):
+        self._refs = []
+        self._hyps = []
+        self._ops = []
+        self._lengths = []
+        self._pairs = 0
+
+    @property
+    def table(self) -> PhonemeTable:
+        """
+        Table that compared phoneme ids are interned with
+        """
+        return self._table
+
+    def extend_table(self, table: PhonemeTable):
+        """
+        Switches to a table that extends the current one, for ex. its copy that gets symbols
+        of generated pronunciations. Symbols of the current table should keep their ids.
+        """
+        symbols = self._table.get_symbols()
+        if table.get_symbols()[:len(symbols)] != symbols:
+            raise ValueError("Phoneme table doesn't extend the table of error analyzer")
+        self._flush()
+        self._table = table
+
+    def add(
+        self,
+        reference_ids: List[Sequence[int]],
+        hypothesis_ids: Sequence[int],
+        alignment: Optional[Tuple[int, int, Optional[str]]] = None,
+    ):
+        """
+        Aligns hypothesis with the closest reference and buffers the alignment
+
+        Parameters
+        ----------
+        reference_ids: List[Sequence[int]]
+            correct pronunciations of the word
+        hypothesis_ids: Sequence[int]
+            generated pronunciation
+        alignment: Optional[Tuple[int, int, Optional[str]]]
+            alignment returned by :func:`align_closest` for the same pronunciations,
+            if it is already computed, for ex. by comparator that tracks WER
+        """
+        index, distance, cigar = align_closest(reference_ids, hypothesis_ids) if alignment is None else alignment
+        reference = reference_ids[index]
+        self._refs.append(reference)
+        self._hyps.append(hypothesis_ids)
+        if not distance:
+            self._ops.append(MATCH)
+            self._lengths.append(len(reference))
+        elif cigar is None:
+            # edlib doesn't return path for empty sequences
+            self._ops.append(DELETION if len(reference) else INSERTION)
+            self._lengths.append(distance)
+        else:
+            for count, op in _CIGAR_RE.findall(cigar):
+                self._ops.append(_CIGAR_OPS[op])
+                self._lengths.append(int(count))
+        self._pairs += 1
+        if self._pairs >= self._batch_size:
+            self._flush()
+
+    def _flush(self):
+        """
+        Helper function that converts buffered alignments into counts
+        """
+        if not self._pairs:
+            return
+        table = self._table
+        size = len(table) + 1
+        if self._counts.shape[1] < size:
+            # phonemes were added to the table since the previous batch
+            pad = size - self._counts.shape[1]
+            self._counts = np.pad(self._counts, ((0, 0), (0, pad), (0, pad)))
+        # per-phoneme lookups: stressless id and stress class
+        symbols = table.get_symbols()
+        # sentinel id is used at positions that don't consume a phoneme, for ex. hypothesis in deletions
+        sentinel = len(symbols)
+        base = np.frombuffer(table.strip_stress(range(len(symbols))), dtype=np.uint16).astype(np.int64) + 1
+        base = np.append(base, 0)
+        stress = np.array([get_stress_class(x, self._classes) for x in symbols] + [0], dtype=np.int64)
+
+        refs = np.concatenate([np.asarray(x, dtype=np.int64) for x in self._refs] + [[sentinel]])
+        hyps = np.concatenate([np.asarray(x, dtype=np.int64) for x in self._hyps] + [[sentinel]])
+        ops = np.repeat(np.array(self._ops, dtype=np.int8), np.array(self._lengths, dtype=np.int64))
+        # alignments consume complete pronunciations, so running counts index concatenated pools
+        takes_ref = ops != INSERTION
+        takes_hyp = ops != DELETION
+        ref_ids = np.where(takes_ref, refs[np.cumsum(takes_ref) - 1], sentinel)
+        hyp_ids = np.where(takes_hyp, hyps[np.cumsum(takes_hyp) - 1], sentinel)
+        ref_base = base[ref_ids]
+        hyp_base = base[hyp_ids]
+        ref_class = stress[ref_ids]
+        hyp_class = stress[hyp_ids]
+        error_class = np.where(takes_ref, ref_class, hyp_class)
+
+        errors = ops != MATCH
+        flat = (error_class[errors] * size + ref_base[errors]) * size + hyp_base[errors]
+        num_classes = len(self._classes)
+        counts = np.bincount(flat, minlength=num_classes * size * size).reshape(num_classes, size, size)
+        self._counts[:, :size, :size] += counts
+        # stress confusions: reference and hypothesis phoneme are the same up to stress
+        aligned = (ops == MATCH) | ((ops == SUBSTITUTION) & (ref_base == hyp_base))
+        flat = ref_class[aligned] * num_classes + hyp_class[aligned]
+        self._stress += np.bincount(flat, minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+        self._reset_buffers()
+
+    def _get_symbols(self) -> List[str]:
+        """
+        Helper function that returns symbols of matrix indices
+        """
+        return [EPSILON] + self._table.get_symbols()
+
+    def get_confusions(self) -> np.ndarray:
+        """
+        Returns counts of errors with shape ``[class, reference, hypothesis]``.
+        Diagonal contains substitutions that differ in stress only.
+        """
+        self._flush()
+        return self._counts.copy()
+
+    def get_stress_confusions(self) -> np.ndarray:
+        """
+        Returns counts of stress classes ``[reference, hypothesis]`` for phonemes
+        that are generated correctly up to stress
+        """
+        self._flush()
+        return self._stress.copy()
+
+    def get_top_confusions(self, top_n: int = 50) -> List[Dict[str, Any]]:
+        """
+        Returns most frequent errors
+
+        Parameters
+        ----------
+        top_n: int
+            number of errors to return
+
+        Returns
+        -------
+        errors: List[Dict[str, Any]]
+            errors with "type", "stress", "reference", "hypothesis" and "count", most frequent first
+        """
+        counts = self.get_confusions()
+        symbols = self._get_symbols()
+        flat = counts.ravel()
+        top = np.argsort(-flat, kind="stable")[:top_n]
+        result = []
+        for index in top:
+            if not flat[index]:
+                break
+            stress, ref, hyp = np.unravel_index(index, counts.shape)
+            error_type = INSERTION if not ref else DELETION if not hyp else SUBSTITUTION
+            result.append(
+                {
+                    "type": ERROR_TYPES[error_type],
+                    "stress": self._classes[stress],
+                    "reference": symbols[ref],
+                    "hypothesis": symbols[hyp],
+                    "count": int(flat[index]),
+                }
+            )
+        return result
+
+    def get_summary(self) -> Dict[str, int]:
+        """
+        Returns total number of substitutions, insertions and deletions
+        """
+        counts = self.get_confusions().sum(axis=0)
+        return {
+            "substitution": int(counts[1:, 1:].sum()),
+            "insertion": int(counts[0, 1:].sum()),
+            "deletion": int(counts[1:, 0].sum()),
+        }
+
+    def state_dict(self) -> Dict[str, List[Tuple]]:
+        """
+        Returns accumulated counts, so analysis can be resumed with :func:`.load_state_dict`.
+        Phonemes are stored as symbols, since ids of phonemes added on the fly may differ between runs.
+        """
+        counts = self.get_confusions()
+        stress_counts = self.get_stress_confusions()
+        symbols = self._get_symbols()
+        classes = self._classes
+        return {
+            "confusions": [
+                (classes[c], symbols[r], symbols[h], int(counts[c, r, h])) for c, r, h in zip(*np.nonzero(counts))
+            ],
+            "stress": [
+                (classes[r], classes[h], int(stress_counts[r, h])) for r, h in zip(*np.nonzero(stress_counts))
+            ],
+        }
+
+    def load_state_dict(self, state: Dict[str, List[Tuple]]):
+        """
+        Restores counts returned by :func:`.state_dict`
+        """
+        self._flush()
+        classes = {x: i for i, x in enumerate(self._classes)}
+        indices = []
+        for stress, ref, hyp, count in state["confusions"]:
+            ref_index = 0 if ref == EPSILON else self._table.add(ref) + 1
+            hyp_index = 0 if hyp == EPSILON else self._table.add(hyp) + 1
+            indices.append((classes[stress], ref_index, hyp_index, count))
+        size = len(self._table) + 1
+        self._counts = np.zeros((len(self._classes), size, size), dtype=np.int64)
+        for stress, ref, hyp, count in indices:
+            self._counts[stress, ref, hyp] = count
+        self._stress[:] = 0
+        for ref, hyp, count in state["stress"]:
+            self._stress[classes[ref], classes[hyp]] = count
+
+    def save(self, out_dir: str, top_n: int = 50):
+        """
+        Stores matrices to ``confusions.npz`` and most frequent errors to ``top_confusions.json``
+
+        Parameters
+        ----------
+        out_dir: str
+            directory to store analysis to
+        top_n: int
+            number of most frequent errors to store
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        np.savez_compressed(
+            os.path.join(out_dir, "confusions.npz"),
+            confusions=self.get_confusions(),
+            stress=self.get_stress_confusions(),
+            symbols=np.array(self._get_symbols()),
+            classes=np.array(self._classes),
+        )
+        with open(os.path.join(out_dir, "top_confusions.json"), "w", encoding="utf-8") as fp:
+            json.dump({"summary": self.get_summary(), "top": self.get_top_confusions(top_n)}, fp, indent=2)
+
+    def log_top_confusions(self, top_n: int = 10):
+        """
+        Prints most frequent errors to console
+        """
+        for error in self.get_top_confusions(top_n):
+            logging.info(
+                "{} [{}] -> [{}] ({}): {}".format(
+                    error["type"], error["reference"], error["hypothesis"], error["stress"], error["count"]
+                )
+            )
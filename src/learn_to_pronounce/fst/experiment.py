@@ -0,0 +1,150 @@
+"""
+Copyright 2022 Balacoon
+
+Runs independent FST training + evaluation jobs in a pool of processes.
+Used for cross-validation and data-size scaling experiments.
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+from learn_to_pronounce.fst.fst_evaluator import FSTEvaluator
+from learn_to_pronounce.fst.fst_trainer import PRONUNCIATION_PHONETISAURUS_ARGS
+from learn_to_pronounce.fst.training_session import TrainingSession
+from learn_to_pronounce.resources.interned import InternedLexicon
+from learn_to_pronounce.resources.streaming import get_peak_memory
+from learn_to_pronounce.telemetry import forward_from_workers, get_telemetry
+
+
+class TrainEvalJob:
+    """
+    Description of a single experiment: FST is trained on prepared training data
+    and evaluated on given test entries. Contains only plain python objects,
+    so it can be sent to worker process.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        work_dir: str,
+        train_data_path: str,
+        test_entries: List[Tuple[str, List[str]]],
+        ngram_order: int,
+    ):
+        """
+        constructor of the job
+
+        Parameters
+        ----------
+        name: str
+            name of the experiment, used in reports
+        work_dir: str
+            directory to put FST training artifacts to
+        train_data_path: str
+            training data, as stored by :func:`learn_to_pronounce.fst.fst_trainer.dump_training_entries`
+        test_entries: List[Tuple[str, List[str]]]
+            words with reference pronunciations to evaluate on
+        ngram_order: int
+            maximum N-gram order of the FST
+        """
+        self.name = name
+        self.work_dir = work_dir
+        self.train_data_path = train_data_path
+        self.test_entries = test_entries
+        self.ngram_order = ngram_order
+
+
+def _peak_memory_mb(baseline: float = 0.0) -> float:
+    """
+    Peak resident memory of current process and its finished children in megabytes.
+    Phonetisaurus tools are executed as child processes, so they are accounted too.
+
+    Parameters
+    ----------
+    baseline: float
+        peak memory of current process when job started. Forked worker inherits
+        memory of the parent, it is subtracted, so only growth during the job is reported.
+    """
+    peak_memory = get_peak_memory()
+    if not peak_memory:
+        return 0.0
+    return max(peak_memory["self"] - baseline, peak_memory["children"])
+
+
+def run_train_eval(job: TrainEvalJob) -> Dict[str, Any]:
+    """
+    Trains and evaluates FST for a single job
+
+    Parameters
+    ----------
+    job: TrainEvalJob
+        experiment to run
+
+    Returns
+    -------
+    result: Dict[str, Any]
+        metrics returned by :func:`learn_to_pronounce.fst.fst_evaluator.FSTEvaluator.evaluate`,
+        time spent in training (also per phase) and evaluation, peak memory and size of trained FST.
+        Peak memory is the largest of memory growth of the worker during the job and peak memory of phonetisaurus tools
+    """
+    os.makedirs(job.work_dir, exist_ok=True)
+    baseline_memory = get_peak_memory().get("self", 0.0)
+    start = time.perf_counter()
+    session = TrainingSession()
+    trainer = session.create_trainer(
+        job.train_data_path,
+        dir_prefix=job.work_dir,
+        model_prefix="pronunciation",
+        ngram_order=job.ngram_order,
+        **PRONUNCIATION_PHONETISAURUS_ARGS
+    )
+    # concurrent jobs report the same stages, they are told apart by name of the job
+    with get_telemetry().scope(job.name):
+        trainer.TrainG2PModel()
+    train_time = time.perf_counter() - start
+    fst_path = os.path.join(job.work_dir, "pronunciation.fst")
+
+    start = time.perf_counter()
+    test_lexicon = InternedLexicon()
+    for word, pronunciations in job.test_entries:
+        for pronunciation in pronunciations:
+            test_lexicon.add(word, pronunciation)
+    with get_telemetry().scope(job.name):
+        metrics = FSTEvaluator(fst_path).evaluate(test_lexicon)
+    eval_time = time.perf_counter() - start
+
+    result = {"name": job.name, "train_time": train_time, "eval_time": eval_time}
+    result["train_phases"] = session.get_summary()["pronunciation"]
+    result.update(metrics)
+    result["test_words"] = len(job.test_entries)
+    result["fst_size"] = os.path.getsize(fst_path)
+    result["peak_memory_mb"] = _peak_memory_mb(baseline_memory)
+    logging.info("Finished [{}]: WER,% {:.2f}; PER,% {:.2f}".format(job.name, result["wer"], result["per"]))
+    return result
+
+
+def run_jobs(jobs: List[TrainEvalJob], num_workers: int) -> List[Dict[str, Any]]:
+    """
+    Runs jobs concurrently. Each job is executed in a fresh process, so peak memory is measured
+    per job. Memory inherited from the parent process is not accounted.
+
+    Parameters
+    ----------
+    jobs: List[TrainEvalJob]
+        experiments to run
+    num_workers: int
+        CPU budget: maximum number of jobs running at the same time
+
+    Returns
+    -------
+    results: List[Dict[str, Any]]
+        results of :func:`run_train_eval` in the order of jobs
+    """
+    num_workers = max(1, min(num_workers, len(jobs)))
+    # workers send telemetry to the parent, so files of sinks have a single writer
+    with forward_from_workers() as (initializer, initargs):
+        with multiprocessing.Pool(num_workers, initializer=initializer, initargs=initargs, maxtasksperchild=1) as pool:
+            return pool.map(run_train_eval, jobs, chunksize=1)
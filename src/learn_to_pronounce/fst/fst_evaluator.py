@@ -4,13 +4,20 @@ Copyright 2022 Balacoon
 Evaluates trained FST model on withhold lexicon
 """
 
-import tqdm
+import hashlib
+import json
 import logging
-from typing import List, Tuple
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
-import edlib
+import tqdm
 from balacoon_frontend import FSTPronunciationGenerator, Pronunciation, PronunciationDictionary, Word
 
+from learn_to_pronounce.fst.error_analysis import ErrorAnalyzer, align_closest
+from learn_to_pronounce.resources.interned import InternedLexicon, PhonemeTable
+from learn_to_pronounce.resources.provider import get_lexicon_entries
+from learn_to_pronounce.telemetry import get_telemetry
+
 
 class PronunciationComparator:
     """
@@ -19,7 +26,7 @@ class PronunciationComparator:
     all the pronunciations for the given word, selects a pair which is most similar.
     """
 
-    def __init__(self, with_stress=True):
+    def __init__(self, with_stress=True, table: PhonemeTable = None):
         """
         constructor of pronunciation comporator
 
@@ -27,8 +34,12 @@ class PronunciationComparator:
         ----------
         with_stress: str
             flag whether to take into account stress when pronunciations are compared
+        table: PhonemeTable
+            table that phoneme ids passed to :func:`.compare_ids` are interned with.
+            New one is created if not provided
         """
         self._with_stress = with_stress
+        self._table = PhonemeTable() if table is None else table
         self._reset()
 
     def _reset(self):
@@ -55,31 +66,67 @@ class PronunciationComparator:
         hypothesis_pronunciation: Pronunciation
             hypothesis of pronunciation by PronunciationGenerator
         """
+        encode = self._table.encode
+        self.compare_ids(
+            [encode(x.to_string(delimiter=" ")) for x in reference_pronunciations],
+            encode(hypothesis_pronunciation.to_string(delimiter=" ")),
+        )
+
+    def compare_ids(
+        self,
+        reference_ids: List[Sequence[int]],
+        hypothesis_ids: Sequence[int],
+    ) -> Tuple[int, int, Optional[str]]:
+        """
+        Compares pronunciations given as phoneme ids from the comparator's phoneme table, updates metrics.
+        Stress and tone marks are removed via the table if comparator ignores stress.
+
+        Parameters
+        ----------
+        reference_ids: List[Sequence[int]]
+            list of correct pronunciations for given word
+        hypothesis_ids: Sequence[int]
+            hypothesis of pronunciation by PronunciationGenerator
+
+        Returns
+        -------
+        alignment: Tuple[int, int, Optional[str]]
+            alignment with the closest reference, see :func:`learn_to_pronounce.fst.error_analysis.align_closest`.
+            Can be passed to :func:`learn_to_pronounce.fst.error_analysis.ErrorAnalyzer.add` if comparator
+            takes stress into account.
+        """
+        if not self._with_stress:
+            reference_ids = [self._table.strip_stress(x) for x in reference_ids]
+            hypothesis_ids = self._table.strip_stress(hypothesis_ids)
+        alignment = align_closest(reference_ids, hypothesis_ids)
+        index, distance, _ = alignment
         self._total_words += 1
-        self._total_phonemes += reference_pronunciations[0].size()
-        min_distance = float("inf")
-        min_distance_index = -1
-        for i, reference_pronunciation in enumerate(reference_pronunciations):
-            reference_phonemes = reference_pronunciation.to_string(
-                with_stress=self._with_stress
-            ).split()
-            hypothesis_phonemes = hypothesis_pronunciation.to_string(
-                with_stress=self._with_stress
-            ).split()
-            distance = edlib.align(hypothesis_phonemes, reference_phonemes)[
-                "editDistance"
-            ]
-            if distance < min_distance:
-                min_distance = distance
-                min_distance_index = i
-            if not distance:
-                # correct pronunciation. shortcut to exit function
-                self._correct_words += 1
-                self._total_phonemes += len(reference_phonemes)
-                return
-
-        self._incorrect_phonemes += min_distance
-        self._total_phonemes += reference_pronunciations[min_distance_index].size()
+        self._total_phonemes += len(reference_ids[0]) + len(reference_ids[index])
+        if distance:
+            self._incorrect_phonemes += distance
+        else:
+            self._correct_words += 1
+        return alignment
+
+    def state_dict(self) -> Dict[str, int]:
+        """
+        Returns accumulated counters, so comparison can be resumed with :func:`.load_state_dict`
+        """
+        return {
+            "total_words": self._total_words,
+            "correct_words": self._correct_words,
+            "total_phonemes": self._total_phonemes,
+            "incorrect_phonemes": self._incorrect_phonemes,
+        }
+
+    def load_state_dict(self, state: Dict[str, int]):
+        """
+        Restores counters returned by :func:`.state_dict`
+        """
+        self._total_words = state["total_words"]
+        self._correct_words = state["correct_words"]
+        self._total_phonemes = state["total_phonemes"]
+        self._incorrect_phonemes = state["incorrect_phonemes"]
 
     def get_metrics(self) -> Tuple[float, float]:
         """
@@ -114,32 +161,164 @@ class FSTEvaluator:
         fst_path: str
             path to FST model to evaluate
         """
+        self._fst_path = fst_path
         self._fst = FSTPronunciationGenerator(fst_path)
 
-    def evaluate(self, lexicon: PronunciationDictionary):
+    def _get_fingerprint(self, lexicon: InternedLexicon) -> str:
         """
-        Runs evaluation
+        Helper function that identifies evaluation: FST model and test lexicon.
+        Checkpoint is resumed only if fingerprint matches.
+        """
+        digest = hashlib.sha256()
+        with open(self._fst_path, "rb") as fp:
+            for block in iter(lambda: fp.read(1 << 20), b""):
+                digest.update(block)
+        for word, pronunciations in lexicon.iterate():
+            digest.update("{}\t{}\n".format(word, "\t".join(pronunciations)).encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _save_checkpoint(path: str, fingerprint: str, processed: int, accumulators: Dict[str, Any]):
+        """
+        Helper function that stores checkpoint. File is replaced atomically,
+        so interruption while saving keeps previous checkpoint intact.
+        """
+        state = {"fingerprint": fingerprint, "processed": processed}
+        state.update({name: x.state_dict() for name, x in accumulators.items()})
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(state, fp)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _load_checkpoint(path: str, fingerprint: str, accumulators: Dict[str, Any]) -> int:
+        """
+        Helper function that restores accumulators from checkpoint of the same evaluation
+
+        Returns
+        -------
+        processed: int
+            number of words evaluated before, 0 if there is no checkpoint to resume from
+        """
+        if not os.path.isfile(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as fp:
+            checkpoint = json.load(fp)
+        if checkpoint["fingerprint"] != fingerprint:
+            logging.info("Ignoring checkpoint [{}] of another evaluation".format(path))
+            return 0
+        for name, accumulator in accumulators.items():
+            if name in checkpoint:
+                accumulator.load_state_dict(checkpoint[name])
+        logging.info("Resuming evaluation from [{}]: {} words done".format(path, checkpoint["processed"]))
+        return checkpoint["processed"]
+
+    @staticmethod
+    def _intern(lexicon: PronunciationDictionary) -> InternedLexicon:
+        """
+        Helper function that converts pronunciation dictionary into interned lexicon
+        """
+        interned = InternedLexicon()
+        for word, pronunciations in get_lexicon_entries(lexicon):
+            for pronunciation in pronunciations:
+                interned.add(word, pronunciation)
+        return interned
+
+    def _evaluate_words(
+        self, words: List[str], lexicon: InternedLexicon, table: PhonemeTable, accumulators: Dict[str, Any]
+    ):
+        """
+        Helper function that generates pronunciations of the words and compares them with references
+        """
+        comparator = accumulators["comparator"]
+        comparator_wo_stress = accumulators["comparator_stressless"]
+        analyzer = accumulators.get("error_analysis")
+        for word in words:
+            hyp_word = Word(word)
+            self._fst.phoneticize(hyp_word)
+            ref_ids = lexicon.get_pronunciations(word)
+            # hypothesis is converted to ids once and shared by both comparators
+            hyp_ids = table.encode(hyp_word.get_pronunciation().to_string(delimiter=" "))
+            # alignment with stress is reused by error analysis, stressless comparison aligns other sequences
+            alignment = comparator.compare_ids(ref_ids, hyp_ids)
+            comparator_wo_stress.compare_ids(ref_ids, hyp_ids)
+            if analyzer is not None:
+                analyzer.add(ref_ids, hyp_ids, alignment=alignment)
+
+    def evaluate(
+        self,
+        lexicon: Union[PronunciationDictionary, InternedLexicon],
+        checkpoint_path: Optional[str] = None,
+        chunk_size: int = 1000,
+        analyzer: Optional[ErrorAnalyzer] = None,
+    ) -> Dict[str, float]:
+        """
+        Runs evaluation. Words are processed in chunks, after each chunk partial metrics are reported
+        and, if ``checkpoint_path`` is given, accumulated counters are checkpointed. If checkpoint
+        of the same evaluation (same FST and test lexicon) exists, evaluation resumes from it.
 
         Parameters
         ----------
-        lexicon: PronunciationDictionary
-            words and ground truth pronunciations to evaluate on
+        lexicon: Union[PronunciationDictionary, InternedLexicon]
+            words and ground truth pronunciations to evaluate on.
+            ``PronunciationDictionary`` is interned before evaluation.
+        checkpoint_path: Optional[str]
+            path to json file to store progress to and resume from
+        chunk_size: int
+            number of words processed between checkpoints
+        analyzer: Optional[ErrorAnalyzer]
+            if provided, accumulates confusions of generated pronunciations.
+            Should be created with the phoneme table of ``lexicon``, it is switched to a copy
+            of the table that gets phonemes of generated pronunciations.
+
+        Returns
+        -------
+        metrics: Dict[str, float]
+            WER and PER in percents, with and without taking into account stress marks
         """
-        comparator = PronunciationComparator()
-        comparator_wo_stress = PronunciationComparator(with_stress=False)
-        for ref_word in tqdm.tqdm(lexicon.get_words()):
-            hyp_word = Word(ref_word.name())
-            self._fst.phoneticize(hyp_word)
-            ref_pron = ref_word.get_pronunciations()
-            hyp_pron = hyp_word.get_pronunciation()
-            comparator.compare(ref_pron, hyp_pron)
-            comparator_wo_stress.compare(ref_pron, hyp_pron)
+        if not isinstance(lexicon, InternedLexicon):
+            lexicon = self._intern(lexicon)
+        if analyzer is not None and analyzer.table is not lexicon.table:
+            raise ValueError("Error analyzer should use phoneme table of the evaluated lexicon")
+        # generated pronunciations may contain unknown phonemes, lexicon's table may be shared and stays intact
+        table = lexicon.table.copy()
+        # accumulators are named as in checkpoint
+        accumulators = {
+            "comparator": PronunciationComparator(table=table),
+            "comparator_stressless": PronunciationComparator(with_stress=False, table=table),
+        }
+        if analyzer is not None:
+            analyzer.extend_table(table)
+            accumulators["error_analysis"] = analyzer
+        words = lexicon.get_words()
+        processed = 0
+        if checkpoint_path:
+            fingerprint = self._get_fingerprint(lexicon)
+            processed = self._load_checkpoint(checkpoint_path, fingerprint, accumulators)
+
+        progress = tqdm.tqdm(total=len(words), initial=processed)
+        # resumed words are excluded, so throughput and ETA reflect this run
+        telemetry = get_telemetry().progress("evaluation", total=len(words) - processed, unit="words")
+        for chunk_start in range(processed, len(words), chunk_size):
+            chunk = words[chunk_start:chunk_start + chunk_size]
+            self._evaluate_words(chunk, lexicon, table, accumulators)
+            processed = chunk_start + len(chunk)
+            progress.update(len(chunk))
+            telemetry.update(len(chunk))
+            if checkpoint_path:
+                self._save_checkpoint(checkpoint_path, fingerprint, processed, accumulators)
+            if processed < len(words):
+                wer, per = accumulators["comparator"].get_metrics()
+                progress.write("{}/{} words: WER,% {:.2f}; PER,% {:.2f}".format(processed, len(words), wer, per))
+        progress.close()
+        telemetry.close()
 
         logging.info("Performance taking into account stress marks:")
-        wer, per = comparator.get_metrics()
+        wer, per = accumulators["comparator"].get_metrics()
         logging.info("WER,%: {:.2f}; PER,%: {:.2f}".format(wer, per))
         logging.info(
             "Performance WITHOUT taking into account stress marks (stressless):"
         )
-        wer, per = comparator_wo_stress.get_metrics()
-        logging.info("WER,%: {:.2f}; PER,%: {:.2f}".format(wer, per))
+        wer_stressless, per_stressless = accumulators["comparator_stressless"].get_metrics()
+        logging.info("WER,%: {:.2f}; PER,%: {:.2f}".format(wer_stressless, per_stressless))
+        return {"wer": wer, "per": per, "wer_stressless": wer_stressless, "per_stressless": per_stressless}
@@ -5,38 +5,66 @@ trains FST - model to generation pronunciation or spelling
 """
 
 import argparse
+import functools
+import json
 import logging
 import os
 from importlib.machinery import SourceFileLoader
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 from balacoon_frontend import PronunciationDictionary
 
-from learn_to_pronounce.fst.fst_evaluator import FSTEvaluator
-from learn_to_pronounce.resources.provider import AbstractProvider
+from learn_to_pronounce.fst.arguments import add_fst_arguments  # noqa: F401 kept for backward compatibility
+from learn_to_pronounce.fst.arguments import create_normalizer
+from learn_to_pronounce.fst.training_session import TrainingSession
+from learn_to_pronounce.resources.interned import InternedLexicon
+from learn_to_pronounce.resources.normalization import TrainingDataNormalizer
+from learn_to_pronounce.resources.provider import AbstractProvider, get_lexicon_entries
+from learn_to_pronounce.resources.streaming import dump_training_data, get_peak_memory
+from learn_to_pronounce.telemetry import get_telemetry
+from learn_to_pronounce.work_dir import WorkDir
 
+PHONETISAURUS_TRAIN_PATH = "/usr/local/bin/phonetisaurus-train"  #: phonetisaurus training script
+PRONUNCIATION_PHONETISAURUS_ARGS = {"seq2_del": True}  #: phonetisaurus parameters of pronunciation model
 
-def add_fst_arguments(parser: argparse.ArgumentParser):
+
+@functools.lru_cache(maxsize=None)
+def load_phonetisaurus():
+    """
+    Loads phonetisaurus training script as a python module.
+    Script is executed once per process, consequent calls return the same module.
+    """
+    return SourceFileLoader("", PHONETISAURUS_TRAIN_PATH).load_module()
+
+
+def dump_training_entries(
+    entries: Iterable[Tuple[str, List[str]]], path: str, normalizer: TrainingDataNormalizer = None
+):
     """
-    Adds special arguments specific to FST training into argument parsing
+    Stores lexicon entries in format suitable for FST training.
+    Entries are sorted by word, since order of words influences result.
 
     Parameters
     ----------
-    parser: argparse.ArgumentParser
-        argument parser from recipe to add special arguments to
+    entries: Iterable[Tuple[str, List[str]]]
+        words with their pronunciations, see :func:`learn_to_pronounce.resources.provider.get_lexicon_entries`
+    path: str
+        path to store training data to
+    normalizer: TrainingDataNormalizer
+        if provided, entries are normalized and deduplicated before they are stored
     """
-    arg_group = parser.add_argument_group("fst")
-    arg_group.add_argument(
-        "--fst-order",
-        default=8,
-        type=int,
-        help="Maximum N-gram order to be used in FST",
-    )
-    arg_group.add_argument(
-        "--fst-spelling-order",
-        default=3,
-        type=int,
-        help="Maximum N-gram order to be used in spelling FST",
-    )
+    if normalizer is not None:
+        pairs = normalizer.normalize((word, x) for word, pronunciations in entries for x in pronunciations)
+        pairs = normalizer.deduplicate(sorted(pairs, key=lambda x: x[0]))
+    else:
+        pairs = ((word, x) for word, pronunciations in sorted(entries, key=lambda x: x[0]) for x in pronunciations)
+    with open(path, "w", encoding="utf-8") as fp, get_telemetry().progress(
+        "training_data/" + os.path.basename(path), unit="pronunciations"
+    ) as progress:
+        for word, pronunciation in pairs:
+            line = "{}\t{}\n".format(word, pronunciation)
+            fp.write(line)
+            progress.update(1, len(line))
 
 
 class FSTTrainer:
@@ -46,7 +74,11 @@ class FSTTrainer:
     """
 
     def __init__(
-        self, provider: AbstractProvider, work_dir: str, args: argparse.Namespace
+        self,
+        provider: AbstractProvider,
+        work_dir: str,
+        args: argparse.Namespace,
+        session: TrainingSession = None,
     ):
         """
         constructor
@@ -59,29 +91,48 @@ class FSTTrainer:
             directory where all intermediate artifacts are stored
         args: argparse.Namespace
             parsed arguments, containing arguments added in :func:`add_fst_arguments`
+        session: TrainingSession
+            session shared by all trainings within a run. New one is created if not provided
         """
         self._provider = provider
         self._work_dir = work_dir
         self._args = args
+        self._session = TrainingSession() if session is None else session
+
+    @property
+    def session(self) -> TrainingSession:
+        """
+        Training session, which contains time spent in phases of training
+        """
+        return self._session
+
+    #: minimal number of unchanged entries aligned together with new ones,
+    #: so alignment model is estimated on representative data
+    INCREMENTAL_MIN_CONTEXT = 1000
 
     @staticmethod
-    def _dump_fst_train_data(pd: PronunciationDictionary, path: str):
+    def _dump_fst_train_data(
+        lexicon: Union[PronunciationDictionary, InternedLexicon, Callable[[str], None]],
+        path: str,
+        normalizer: TrainingDataNormalizer = None,
+    ):
         """
         Helper function that stores pronunciation dictionary suitalbe for FST training
         """
-        with open(path, "w", encoding="utf-8") as fp:
-            words = pd.get_words()
-            # order of words influences result!
-            for word in sorted(words, key=lambda x: x.name()):
-                for pronunciation in word.get_pronunciations():
-                    fp.write("{}\t{}\n".format(word.name(), pronunciation.to_string()))
+        if callable(lexicon):
+            lexicon(path)
+        elif isinstance(lexicon, InternedLexicon):
+            dump_training_entries(lexicon.iterate(), path, normalizer=normalizer)
+        else:
+            dump_training_entries(get_lexicon_entries(lexicon), path, normalizer=normalizer)
 
     def _train_fst(
         self,
-        lexicon: PronunciationDictionary,
+        lexicon: Union[PronunciationDictionary, InternedLexicon, Callable[[str], None]],
         train_data_name: str,
         model_name: str,
         ngram_order: int,
+        normalizer: TrainingDataNormalizer = None,
         **phonetisaurus_args
     ) -> str:
         """
@@ -89,8 +140,8 @@ class FSTTrainer:
 
         Parameters
         ----------
-        lexicon: PronunciationDictionary
-            lexicon to train on
+        lexicon: Union[PronunciationDictionary, InternedLexicon, Callable[[str], None]]
+            lexicon to train on or function that stores training data to the given path
         train_data_name: str
             name to give to intermediate file with training data
         model_name: str
@@ -98,6 +149,9 @@ class FSTTrainer:
         ngram_order: int
             maximum n-gram order to be used in the FST training.
             Primary parameter that defines tradeoff between model size and accuracy.
+        normalizer: TrainingDataNormalizer
+            normalizer of training data, applied to lexicon given as a dictionary.
+            Function storing training data is expected to apply it itself
         **phonetisaurus_args:
             other named parameters passed directly to phonetisaurus_train.G2PModelTrainer
 
@@ -107,21 +161,138 @@ class FSTTrainer:
             path to trained FST model
         """
         train_data_path = os.path.join(self._work_dir, train_data_name)
-        self._dump_fst_train_data(lexicon, train_data_path)
-        phonetisaurus_train = SourceFileLoader(
-            "", "/usr/local/bin/phonetisaurus-train"
-        ).load_module()
-        phonetisaurus_trainer = phonetisaurus_train.G2PModelTrainer(
+        corpus_path = os.path.join(self._work_dir, model_name + ".corpus")
+        cached_alignments = None
+        if self._args.fst_incremental:
+            # artifacts of previous run could be compressed by garbage collection
+            work_dir = WorkDir(self._work_dir)
+            work_dir.restore(train_data_name)
+            work_dir.restore(model_name + ".corpus")
+            cached_alignments = self._load_cached_alignments(train_data_path, corpus_path, phonetisaurus_args)
+        self._dump_fst_train_data(lexicon, train_data_path, normalizer=normalizer)
+        phonetisaurus_trainer = self._session.create_trainer(
             train_data_path,
             dir_prefix=self._work_dir,
             model_prefix=model_name,
             ngram_order=ngram_order,
             **phonetisaurus_args
         )
-        phonetisaurus_trainer.TrainG2PModel()
+        if cached_alignments is not None and self._align_incrementally(
+            cached_alignments, train_data_path, corpus_path, model_name, phonetisaurus_args
+        ):
+            phonetisaurus_trainer.TrainNGramModel()
+            phonetisaurus_trainer.ConvertARPAModel()
+        else:
+            phonetisaurus_trainer.TrainG2PModel()
+        self._save_alignment_params(corpus_path, phonetisaurus_args)
+        peak_memory = get_peak_memory()
+        if peak_memory:
+            logging.info(
+                "Peak memory after training {}: {:.0f}MB, phonetisaurus: {:.0f}MB".format(
+                    model_name, peak_memory["self"], peak_memory["children"]
+                )
+            )
         fst_path = os.path.join(self._work_dir, model_name + ".fst")
         return fst_path
 
+    @staticmethod
+    def _read_lines(path: str) -> List[str]:
+        with open(path, "r", encoding="utf-8") as fp:
+            return [x.rstrip("\n") for x in fp]
+
+    @staticmethod
+    def _save_alignment_params(corpus_path: str, phonetisaurus_args: Dict):
+        """
+        Stores parameters that alignment was obtained with next to the aligned corpus
+        """
+        with open(corpus_path + ".params", "w", encoding="utf-8") as fp:
+            json.dump(phonetisaurus_args, fp, sort_keys=True)
+
+    def _load_cached_alignments(
+        self, train_data_path: str, corpus_path: str, phonetisaurus_args: Dict
+    ) -> Optional[Dict[str, str]]:
+        """
+        Loads alignments from the previous run in work directory.
+        Phonetisaurus aligner writes one aligned line per line of training data,
+        which allows to match training entries with their alignments.
+
+        Returns
+        -------
+        cached_alignments: Optional[Dict[str, str]]
+            mapping from training data line to its aligned version,
+            None if there is no usable previous run
+        """
+        params_path = corpus_path + ".params"
+        if not all(os.path.isfile(x) for x in [train_data_path, corpus_path, params_path]):
+            logging.info("No previous training run in [{}], training from scratch".format(self._work_dir))
+            return None
+        with open(params_path, "r", encoding="utf-8") as fp:
+            if json.load(fp) != json.loads(json.dumps(phonetisaurus_args)):
+                logging.info("Alignment parameters changed since previous run, training from scratch")
+                return None
+        train_lines = self._read_lines(train_data_path)
+        corpus_lines = self._read_lines(corpus_path)
+        if len(train_lines) != len(corpus_lines):
+            logging.info("Previous alignment doesn't match previous training data, training from scratch")
+            return None
+        return dict(zip(train_lines, corpus_lines))
+
+    def _align_incrementally(
+        self,
+        cached_alignments: Dict[str, str],
+        train_data_path: str,
+        corpus_path: str,
+        model_name: str,
+        phonetisaurus_args: Dict,
+    ) -> bool:
+        """
+        Creates aligned corpus for training data, reusing cached alignments for unchanged entries.
+        New or changed entries are aligned together with a sample of unchanged ones,
+        so alignment model is not estimated on a handful of entries only.
+
+        Returns
+        -------
+        success: bool
+            whether aligned corpus is created. If not, complete training should be executed.
+        """
+        train_lines = self._read_lines(train_data_path)
+        new_lines = sorted(set(x for x in train_lines if x not in cached_alignments))
+        change = len(new_lines) / float(max(len(train_lines), 1))
+        logging.info(
+            "{} out of {} training entries are new or changed since previous run".format(
+                len(new_lines), len(train_lines)
+            )
+        )
+        if change > self._args.fst_incremental_max_change:
+            logging.info("Too many changes for incremental training, training from scratch")
+            return False
+        if new_lines:
+            unchanged = [x for x in train_lines if x in cached_alignments]
+            context_size = min(len(unchanged), max(self.INCREMENTAL_MIN_CONTEXT, 10 * len(new_lines)))
+            step = len(unchanged) / float(max(context_size, 1))
+            context = [unchanged[int(i * step)] for i in range(context_size)]
+            delta_name = model_name + "_delta"
+            delta_path = os.path.join(self._work_dir, delta_name + "_training_data")
+            with open(delta_path, "w", encoding="utf-8") as fp:
+                for line in new_lines + context:
+                    fp.write(line + "\n")
+            delta_trainer = self._session.create_trainer(
+                delta_path,
+                dir_prefix=self._work_dir,
+                model_prefix=delta_name,
+                **phonetisaurus_args
+            )
+            delta_trainer.AlignLexicon()
+            delta_corpus = self._read_lines(os.path.join(self._work_dir, delta_name + ".corpus"))
+            if len(delta_corpus) != len(new_lines) + len(context):
+                logging.warning("Aligner skipped some of new entries, training from scratch")
+                return False
+            cached_alignments.update(zip(new_lines, delta_corpus))
+        with open(corpus_path, "w", encoding="utf-8") as fp:
+            for line in train_lines:
+                fp.write(cached_alignments[line] + "\n")
+        return True
+
     def train_pronunciation(self) -> str:
         """
         Training pronunciation FST
@@ -131,24 +302,83 @@ class FSTTrainer:
         fst_path: str
             path to trained pronunciation model
         """
-        train_lexicon = self._provider.get_lexicon(
-            words=self._provider.get_train_words()
-        )
-        logging.info(
-            "Training pronunciation FST on {} words".format(train_lexicon.size())
-        )
+        normalizer = create_normalizer(self._args)
+        if self._args.max_memory:
+            logging.info(
+                "Streaming pronunciation training data with {}MB memory budget".format(self._args.max_memory)
+            )
+            train_lexicon = functools.partial(self._stream_train_data, normalizer=normalizer)
+        else:
+            train_lexicon = self._provider.get_interned_lexicon(
+                words=self._provider.get_train_words()
+            )
+            logging.info(
+                "Training pronunciation FST on {} words".format(train_lexicon.size())
+            )
         fst_path = self._train_fst(
             train_lexicon,
             train_data_name="pronunciation_training_data",
             model_name="pronunciation",
             ngram_order=self._args.fst_order,
-            seq2_del=True,
+            normalizer=normalizer,
+            **PRONUNCIATION_PHONETISAURUS_ARGS
+        )
+        self._report_normalization(normalizer, "pronunciation")
+        WorkDir(self._work_dir).register_fst_training(
+            "pronunciation", "pronunciation", consumers=["evaluation", "oov", "addon"]
         )
         return fst_path
 
-    def evaluate_pronunciation(self):
+    def _stream_train_data(self, path: str, normalizer: TrainingDataNormalizer = None):
+        """
+        Helper function that stores training data streaming lexicon from the provider,
+        without loading it into memory
+        """
+        num_words, num_pronunciations = dump_training_data(
+            ((word, phonemes) for word, _, phonemes in self._provider.iterate_entries()),
+            path,
+            self._args.max_memory << 20,
+            words=self._provider.iterate_train_words(),
+            temp_dir=self._work_dir,
+            normalizer=normalizer,
+        )
+        logging.info(
+            "Training pronunciation FST on {} words ({} pronunciations)".format(num_words, num_pronunciations)
+        )
+
+    def _report_normalization(self, normalizer: TrainingDataNormalizer, model_name: str):
+        """
+        Helper function that logs and stores how many training rows normalization removed.
+        Saved training time is estimated from time spent in training phases, assuming it is linear in rows.
+        """
+        report = normalizer.get_report()
+        phases = self._session.get_summary().get(model_name, {})
+        seconds = sum(phases.values())
+        report["estimated_saved_seconds"] = seconds * report["removed"] / float(max(report["output"], 1))
+        logging.info(
+            "Normalization removed {} of {} training rows ({} duplicates, {} above variants cap), "
+            "{} words modified. Estimated saving of training time: {:.1f}s".format(
+                report["removed"],
+                report["input"],
+                report["duplicates"],
+                report["capped"],
+                report["normalized_words"],
+                report["estimated_saved_seconds"],
+            )
+        )
+        name = "{}_normalization.json".format(model_name)
+        with open(os.path.join(self._work_dir, name), "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+        WorkDir(self._work_dir).register(name, model_name)
+
+    def evaluate_pronunciation(self) -> Optional[Dict[str, float]]:
         """
         Evaluates trained model using test_words from resources. Prints results in terms of WER/PER to console.
+
+        Returns
+        -------
+        metrics: Optional[Dict[str, float]]
+            metrics returned by :func:`FSTEvaluator.evaluate` or None if there are no test words
         """
         fst_path = os.path.join(self._work_dir, "pronunciation.fst")
         if not os.path.isfile(fst_path):
@@ -158,15 +388,32 @@ class FSTTrainer:
             logging.warning(
                 "FST evaluation is enabled, but there is no test words in resource directory"
             )
-            return
-        test_lexicon = self._provider.get_lexicon(words=test_words)
+            return None
+        test_lexicon = self._provider.get_interned_lexicon(words=test_words)
         logging.info(
             "Evaluating pronunciation FST on {} words".format(
                 test_lexicon.size()
             )
         )
+        from learn_to_pronounce.fst.error_analysis import ErrorAnalyzer, read_stress_classes
+        from learn_to_pronounce.fst.fst_evaluator import FSTEvaluator
+
         evaluator = FSTEvaluator(fst_path)
-        evaluator.evaluate(test_lexicon)
+        analyzer = ErrorAnalyzer(test_lexicon.table, read_stress_classes(self._args.fst_stress_classes))
+        checkpoint_path = os.path.join(self._work_dir, "evaluation_checkpoint.json")
+        metrics = evaluator.evaluate(
+            test_lexicon,
+            checkpoint_path=checkpoint_path,
+            chunk_size=self._args.fst_eval_chunk_size,
+            analyzer=analyzer,
+        )
+        logging.info("Most frequent errors of pronunciation FST:")
+        analyzer.log_top_confusions()
+        analyzer.save(os.path.join(self._work_dir, "error_analysis"))
+        work_dir = WorkDir(self._work_dir)
+        work_dir.register(os.path.basename(checkpoint_path), "evaluation", consumers=["evaluation"])
+        work_dir.register("error_analysis", "evaluation")
+        return metrics
 
     def train_spelling(self) -> str:
         """
@@ -189,4 +436,5 @@ class FSTTrainer:
             seq2_del=True,
             seq2_max=10,
         )
+        WorkDir(self._work_dir).register_fst_training("spelling", "spelling", consumers=["addon"])
         return fst_path
@@ -0,0 +1,162 @@
+"""
+Copyright 2022 Balacoon
+
+Pre-computes pronunciations of frequent out-of-vocabulary words,
+so at runtime they are looked up in lexicon instead of FST decoding.
+"""
+
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Set, Tuple
+
+from balacoon_frontend import PronunciationDictionary
+
+from learn_to_pronounce.fst.parallel import phoneticize_parallel
+
+GENERATED_TAG = "generated"  #: tag of pronunciations added to lexicon from FST
+
+
+def read_word_frequencies(path: str) -> List[Tuple[str, int]]:
+    """
+    Reads word-frequency file. Each line contains a word and its count
+    separated by tab or space. Counts of repeated words are summed up.
+
+    Parameters
+    ----------
+    path: str
+        path to word-frequency file, for ex. obtained from serving logs
+
+    Returns
+    -------
+    frequencies: List[Tuple[str, int]]
+        words with counts, most frequent first. Ties are resolved by word, so order is deterministic.
+    """
+    counts = {}
+    with open(path, "r", encoding="utf-8") as fp:
+        for line in fp:
+            parts = line.split()
+            if not parts:
+                continue
+            if len(parts) != 2:
+                raise RuntimeError("Failed to parse word-frequency line [{}]".format(line.strip()))
+            counts[parts[0]] = counts.get(parts[0], 0) + int(parts[1])
+    return sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+
+
+class OOVTable:
+    """
+    Selects top-N out-of-vocabulary words by frequency, generates their pronunciations
+    with FST and adds them to lexicon tagged as ``generated``.
+    """
+
+    def __init__(self, frequencies: List[Tuple[str, int]], lexicon_words: Set[str], graphemes: Iterable[str]):
+        """
+        constructor of OOV table
+
+        Parameters
+        ----------
+        frequencies: List[Tuple[str, int]]
+            words with counts, as returned by :func:`read_word_frequencies`
+        lexicon_words: Set[str]
+            words that are already in lexicon
+        graphemes: Iterable[str]
+            valid graphemes. Words with other characters can't be phoneticized and are skipped
+        """
+        self._frequencies = frequencies
+        self._lexicon_words = lexicon_words
+        self._graphemes = set(graphemes)
+        self._pronunciations = []
+
+    def _is_supported(self, word: str) -> bool:
+        return all(x in self._graphemes for x in word)
+
+    def generate(self, fst_path: str, top_n: int, num_workers: int = 1) -> List[Tuple[str, str]]:
+        """
+        Generates pronunciations for top-N OOV words
+
+        Parameters
+        ----------
+        fst_path: str
+            path to trained pronunciation FST
+        top_n: int
+            number of most frequent OOV words to pre-compute
+        num_workers: int
+            number of processes to run FST decoding in
+
+        Returns
+        -------
+        pronunciations: List[Tuple[str, str]]
+            OOV words with generated pronunciations, most frequent first
+        """
+        oov_words = []
+        for word, _ in self._frequencies:
+            if len(oov_words) == top_n:
+                break
+            if word not in self._lexicon_words and self._is_supported(word):
+                oov_words.append(word)
+        self._pronunciations = list(phoneticize_parallel(fst_path, oov_words, num_workers=num_workers))
+        return self._pronunciations
+
+    def add_to_lexicon(self, pd: PronunciationDictionary):
+        """
+        Adds generated pronunciations to lexicon, tagged as ``generated``
+        """
+        for word, pronunciation in self._pronunciations:
+            pd.add_word(word, pronunciation, tag=GENERATED_TAG)
+
+    def get_report(self) -> Dict[str, float]:
+        """
+        Estimates how much of FST traffic is eliminated by generated pronunciations,
+        assuming traffic distribution follows word-frequency file.
+
+        Returns
+        -------
+        report: Dict[str, float]
+            counts of words and traffic shares
+        """
+        generated = set(x for x, _ in self._pronunciations)
+        total = in_lexicon = precomputed = unsupported = 0
+        for word, count in self._frequencies:
+            total += count
+            if word in self._lexicon_words:
+                in_lexicon += count
+            elif word in generated:
+                precomputed += count
+            elif not self._is_supported(word):
+                unsupported += count
+        oov = total - in_lexicon
+        return {
+            "vocabulary_words": len(self._frequencies),
+            "precomputed_words": len(generated),
+            "total_traffic": total,
+            "lexicon_traffic": in_lexicon,
+            "oov_traffic": oov,
+            "precomputed_traffic": precomputed,
+            "unsupported_traffic": unsupported,
+            "fst_traffic_eliminated": precomputed / float(oov) if oov else 0.0,
+            "total_traffic_eliminated": precomputed / float(total) if total else 0.0,
+        }
+
+    def save(self, work_dir: str):
+        """
+        Stores generated pronunciations and report to work directory
+
+        Parameters
+        ----------
+        work_dir: str
+            directory to put ``oov_pronunciations`` and ``oov_report.json`` to
+        """
+        with open(os.path.join(work_dir, "oov_pronunciations"), "w", encoding="utf-8") as fp:
+            for word, pronunciation in self._pronunciations:
+                fp.write("{}\t{}\t{}\n".format(word, GENERATED_TAG, pronunciation))
+        report = self.get_report()
+        with open(os.path.join(work_dir, "oov_report.json"), "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+        logging.info(
+            "Pre-computed {} OOV words. They cover {:.2f}% of FST traffic ({:.2f}% of total traffic)".format(
+                report["precomputed_words"],
+                100.0 * report["fst_traffic_eliminated"],
+                100.0 * report["total_traffic_eliminated"],
+            )
+        )
@@ -0,0 +1,78 @@
+"""
+Copyright 2022 Balacoon
+
+Parallel pronunciation generation with trained FST.
+Each worker process loads FST once and phoneticizes chunks of words.
+"""
+
+import multiprocessing
+from typing import Iterable, Iterator, List, Tuple
+
+_generator = None  # FST loaded in a worker process
+
+
+def _init_worker(fst_path: str):
+    global _generator
+    from balacoon_frontend import FSTPronunciationGenerator
+
+    _generator = FSTPronunciationGenerator(fst_path)
+
+
+def _phoneticize_chunk(words: List[str]) -> List[Tuple[str, str]]:
+    from balacoon_frontend import Word
+
+    results = []
+    for word_str in words:
+        word = Word(word_str)
+        _generator.phoneticize(word)
+        results.append((word_str, word.get_pronunciation().to_string()))
+    return results
+
+
+def chunks(words: Iterable[str], chunk_size: int) -> Iterator[List[str]]:
+    """
+    Splits words into lists of ``chunk_size`` words, the last one may be shorter.
+    Words are consumed lazily, so iterable may be a stream.
+    """
+    chunk = []
+    for word in words:
+        chunk.append(word)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def phoneticize_parallel(
+    fst_path: str, words: Iterable[str], num_workers: int = 1, chunk_size: int = 1000
+) -> Iterator[Tuple[str, str]]:
+    """
+    Generates pronunciations for words with FST in a pool of processes.
+    Results are returned in the order of input words, regardless of number of workers.
+
+    Parameters
+    ----------
+    fst_path: str
+        path to FST model
+    words: Iterable[str]
+        words to generate pronunciations for. Are consumed lazily,
+        so it can be a stream of arbitrary size.
+    num_workers: int
+        number of worker processes. If 1, words are processed in current process
+    chunk_size: int
+        number of words sent to worker at once
+
+    Returns
+    -------
+    pronunciations: Iterator[Tuple[str, str]]
+        words with generated pronunciations (phonemes separated by space)
+    """
+    if num_workers <= 1:
+        _init_worker(fst_path)
+        for chunk in chunks(words, chunk_size):
+            yield from _phoneticize_chunk(chunk)
+        return
+    with multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(fst_path,)) as pool:
+        for chunk_result in pool.imap(_phoneticize_chunk, chunks(words, chunk_size)):
+            yield from chunk_result
@@ -0,0 +1,258 @@
+"""
+Copyright 2022 Balacoon
+
+Regression gate: compares newly trained pronunciation FST with the one shipped in the previous addon
+on the same test words. Each worker process loads both models and decodes the same chunks of words
+with both of them, so accuracy and decoding throughput are compared under the same conditions.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from learn_to_pronounce.fst.fst_evaluator import PronunciationComparator
+from learn_to_pronounce.fst.parallel import chunks
+from learn_to_pronounce.resources.interned import InternedLexicon
+from learn_to_pronounce.resources.provider import AbstractProvider
+from learn_to_pronounce.work_dir import REMOVE, WorkDir
+
+MODELS = ["baseline", "candidate"]
+BASELINE_FST_NAME = "baseline_pronunciation.fst"
+
+_generators = None  # baseline and candidate FSTs loaded in a worker process
+
+
+def _init_worker(baseline_path: str, candidate_path: str):
+    global _generators
+    from balacoon_frontend import FSTPronunciationGenerator
+
+    _generators = [FSTPronunciationGenerator(baseline_path), FSTPronunciationGenerator(candidate_path)]
+
+
+def _decode_chunk(words: List[str]) -> Tuple[List[Tuple[str, str]], List[float]]:
+    """
+    Helper function that decodes words with both models, measuring time spent by each
+    """
+    from balacoon_frontend import Word
+
+    pronunciations = []
+    seconds = []
+    for generator in _generators:
+        result = []
+        start = time.perf_counter()
+        for word_str in words:
+            word = Word(word_str)
+            generator.phoneticize(word)
+            result.append(word.get_pronunciation().to_string(delimiter=" "))
+        seconds.append(time.perf_counter() - start)
+        pronunciations.append(result)
+    return list(zip(*pronunciations)), seconds
+
+
+def compare_models(
+    baseline_path: str,
+    candidate_path: str,
+    lexicon: InternedLexicon,
+    num_workers: int = 1,
+    chunk_size: int = 100,
+) -> Dict[str, Any]:
+    """
+    Evaluates baseline and candidate FSTs on the same test lexicon
+
+    Parameters
+    ----------
+    baseline_path: str
+        path to FST that is currently shipped
+    candidate_path: str
+        path to newly trained FST
+    lexicon: InternedLexicon
+        test words with ground truth pronunciations
+    num_workers: int
+        number of processes decoding words
+    chunk_size: int
+        number of words decoded by both models at once
+
+    Returns
+    -------
+    report: Dict[str, Any]
+        metrics and throughput of both models ("baseline", "candidate"), their difference ("delta"),
+        words that became incorrect ("regressions") or correct ("fixes") with the candidate model
+    """
+    # generated pronunciations may contain unknown phonemes, lexicon's table may be shared and stays intact
+    table = lexicon.table.copy()
+    comparators = {x: PronunciationComparator(table=table) for x in MODELS}
+    comparators_wo_stress = {x: PronunciationComparator(with_stress=False, table=table) for x in MODELS}
+    seconds = [0.0] * len(MODELS)
+    flips = {"regressions": [], "fixes": []}
+    word_chunks = list(chunks(lexicon.get_words(), chunk_size))
+
+    def process(words: List[str], result: Tuple[List[Tuple[str, str]], List[float]]):
+        pronunciations, chunk_seconds = result
+        for i, value in enumerate(chunk_seconds):
+            seconds[i] += value
+        for word, hypotheses in zip(words, pronunciations):
+            ref_ids = lexicon.get_pronunciations(word)
+            correct = []
+            for name, hypothesis in zip(MODELS, hypotheses):
+                hyp_ids = table.encode(hypothesis)
+                comparators[name].compare_ids(ref_ids, hyp_ids)
+                comparators_wo_stress[name].compare_ids(ref_ids, hyp_ids)
+                correct.append(any(hyp_ids == x for x in ref_ids))
+            if correct[0] != correct[1]:
+                flip = {
+                    "word": word,
+                    "reference": table.decode(ref_ids[0]),
+                    "baseline": hypotheses[0],
+                    "candidate": hypotheses[1],
+                }
+                flips["regressions" if correct[0] else "fixes"].append(flip)
+
+    if num_workers <= 1:
+        _init_worker(baseline_path, candidate_path)
+        for words in word_chunks:
+            process(words, _decode_chunk(words))
+    else:
+        initargs = (baseline_path, candidate_path)
+        with multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=initargs) as pool:
+            for words, result in zip(word_chunks, pool.imap(_decode_chunk, word_chunks)):
+                process(words, result)
+
+    report = {"words": lexicon.size()}
+    for i, name in enumerate(MODELS):
+        wer, per = comparators[name].get_metrics()
+        wer_stressless, per_stressless = comparators_wo_stress[name].get_metrics()
+        report[name] = {
+            "wer": wer,
+            "per": per,
+            "wer_stressless": wer_stressless,
+            "per_stressless": per_stressless,
+            # words per second of decoding time in a single process
+            "words_per_second": lexicon.size() / max(seconds[i], 1e-9),
+        }
+    report["delta"] = {k: report["candidate"][k] - report["baseline"][k] for k in report["baseline"]}
+    report["slowdown"] = 1.0 - report["candidate"]["words_per_second"] / report["baseline"]["words_per_second"]
+    report.update(flips)
+    return report
+
+
+def check_thresholds(
+    report: Dict[str, Any],
+    max_wer_increase: Optional[float] = None,
+    max_per_increase: Optional[float] = None,
+    max_regressions: Optional[int] = None,
+    max_slowdown: Optional[float] = None,
+) -> List[str]:
+    """
+    Checks report of :func:`compare_models` against thresholds, ``None`` disables a threshold
+
+    Parameters
+    ----------
+    report: Dict[str, Any]
+        comparison of baseline and candidate models
+    max_wer_increase: Optional[float]
+        allowed increase of WER, absolute percents
+    max_per_increase: Optional[float]
+        allowed increase of PER, absolute percents
+    max_regressions: Optional[int]
+        allowed number of words that are correct with baseline and incorrect with candidate model
+    max_slowdown: Optional[float]
+        allowed relative decrease of decoding throughput, for ex. 0.1 for 10%
+
+    Returns
+    -------
+    violations: List[str]
+        descriptions of breached thresholds, empty if candidate passes the gate
+    """
+    violations = []
+    delta = report["delta"]
+    if max_wer_increase is not None and delta["wer"] > max_wer_increase:
+        violations.append("WER increased by {:.2f} (allowed {:.2f})".format(delta["wer"], max_wer_increase))
+    if max_per_increase is not None and delta["per"] > max_per_increase:
+        violations.append("PER increased by {:.2f} (allowed {:.2f})".format(delta["per"], max_per_increase))
+    if max_regressions is not None and len(report["regressions"]) > max_regressions:
+        violations.append(
+            "{} words regressed (allowed {})".format(len(report["regressions"]), max_regressions)
+        )
+    if max_slowdown is not None and report["slowdown"] > max_slowdown:
+        violations.append(
+            "Decoding is {:.1f}% slower (allowed {:.1f}%)".format(100.0 * report["slowdown"], 100.0 * max_slowdown)
+        )
+    return violations
+
+
+def regression_gate(
+    provider: AbstractProvider,
+    work_dir: str,
+    baseline_addon: str,
+    num_workers: int,
+    **thresholds
+) -> List[str]:
+    """
+    Compares pronunciation FST in work dir with the one from previous addon on test words.
+    Stores ``regression_report.json`` and ``regression_flips.tsv`` to work dir.
+
+    Parameters
+    ----------
+    provider: AbstractProvider
+        resources provider to get test words from
+    work_dir: str
+        working directory with trained ``pronunciation.fst``
+    baseline_addon: str
+        previous version of the addon
+    num_workers: int
+        number of processes decoding words
+    **thresholds:
+        thresholds passed to :func:`check_thresholds`
+
+    Returns
+    -------
+    violations: List[str]
+        breached thresholds, empty if new model passes the gate
+    """
+    from learn_to_pronounce.addon.addon_manager import AddonManager
+
+    candidate_path = os.path.join(work_dir, "pronunciation.fst")
+    if not os.path.isfile(candidate_path):
+        raise FileNotFoundError("Can't run regression gate, missing [{}]. Run training first.".format(candidate_path))
+    test_words = provider.get_test_words()
+    if not test_words:
+        raise RuntimeError("Regression gate requires test words in resource directory")
+    baseline_path = os.path.join(work_dir, BASELINE_FST_NAME)
+    AddonManager.extract_pronunciation_fst(baseline_addon, baseline_path)
+    lexicon = provider.get_interned_lexicon(words=test_words)
+    logging.info("Comparing pronunciation FST with one from [{}] on {} words".format(baseline_addon, lexicon.size()))
+    report = compare_models(baseline_path, candidate_path, lexicon, num_workers=num_workers)
+    report["violations"] = check_thresholds(report, **thresholds)
+
+    for name in MODELS:
+        metrics = report[name]
+        logging.info(
+            "{}: WER,% {:.2f}; PER,% {:.2f}; stressless WER,% {:.2f}; PER,% {:.2f}; {:.0f} words/s".format(
+                name,
+                metrics["wer"],
+                metrics["per"],
+                metrics["wer_stressless"],
+                metrics["per_stressless"],
+                metrics["words_per_second"],
+            )
+        )
+    logging.info(
+        "{} words regressed, {} words fixed; decoding is {:.1f}% slower".format(
+            len(report["regressions"]), len(report["fixes"]), 100.0 * report["slowdown"]
+        )
+    )
+    with open(os.path.join(work_dir, "regression_report.json"), "w", encoding="utf-8") as fp:
+        json.dump(report, fp, indent=2)
+    with open(os.path.join(work_dir, "regression_flips.tsv"), "w", encoding="utf-8") as fp:
+        fp.write("change\tword\treference\tbaseline\tcandidate\n")
+        for change in ["regressions", "fixes"]:
+            for flip in report[change]:
+                fp.write("{}\t{word}\t{reference}\t{baseline}\t{candidate}\n".format(change, **flip))
+    registry = WorkDir(work_dir)
+    registry.register(BASELINE_FST_NAME, "regression", gc=REMOVE)
+    registry.register("regression_report.json", "regression")
+    registry.register("regression_flips.tsv", "regression")
+    return report["violations"]
@@ -0,0 +1,123 @@
+"""
+Copyright 2022 Balacoon
+
+Measures how accuracy and cost of FST-based pronunciation generation
+scale with the size of training lexicon
+"""
+
+import csv
+import json
+import logging
+import os
+import random
+from typing import Any, Dict, List, Union
+
+from learn_to_pronounce.fst.experiment import TrainEvalJob, run_jobs
+from learn_to_pronounce.fst.fst_trainer import dump_training_entries
+from learn_to_pronounce.resources.normalization import TrainingDataNormalizer
+from learn_to_pronounce.resources.provider import AbstractProvider, get_lexicon_entries
+
+CSV_COLUMNS = [
+    "name",
+    "train_words",
+    "test_words",
+    "wer",
+    "per",
+    "wer_stressless",
+    "per_stressless",
+    "train_time",
+    "eval_time",
+    "peak_memory_mb",
+    "fst_size",
+]
+HELD_OUT_FRACTION = 0.1  #: fraction of training words held out for evaluation if there are no test words
+
+
+def parse_sizes(sizes: List[str]) -> List[Union[int, str]]:
+    """
+    Parses sizes of training subsets from command line: integers or "all"
+    """
+    return [x if x == "all" else int(x) for x in sizes]
+
+
+def scaling_curve(
+    provider: AbstractProvider,
+    work_dir: str,
+    ngram_order: int,
+    sizes: List[Union[int, str]],
+    num_workers: int,
+    seed: int = 42,
+    normalizer: TrainingDataNormalizer = None,
+) -> List[Dict[str, Any]]:
+    """
+    Trains FSTs on nested subsets of training words and evaluates each of them on the same test set.
+    Lexicon is parsed once and shared by all the subsets. Models are trained concurrently.
+
+    Parameters
+    ----------
+    provider: AbstractProvider
+        resources provider to get lexicon from
+    work_dir: str
+        directory to put artifacts to, each subset gets its own sub-directory
+    ngram_order: int
+        maximum N-gram order of the FST
+    sizes: List[Union[int, str]]
+        number of words in each subset, "all" for complete training lexicon
+    num_workers: int
+        maximum number of models trained at the same time
+    seed: int
+        seed for sampling subsets. Subsets are nested: smaller one is a prefix of a bigger one
+    normalizer: TrainingDataNormalizer
+        normalizer of training data of subsets, same as the one pronunciation FST is trained with.
+        Test set is kept as is
+
+    Returns
+    -------
+    results: List[Dict[str, Any]]
+        one result per subset, also stored to ``scaling.json`` and ``scaling.csv``
+    """
+    scaling_dir = os.path.join(work_dir, "scaling")
+    os.makedirs(scaling_dir, exist_ok=True)
+    train_entries = sorted(get_lexicon_entries(provider.get_lexicon(words=provider.get_train_words())))
+    random.Random(seed).shuffle(train_entries)
+    test_words = provider.get_test_words()
+    if test_words:
+        test_entries = get_lexicon_entries(provider.get_lexicon(words=test_words))
+    else:
+        held_out = max(1, int(HELD_OUT_FRACTION * len(train_entries)))
+        logging.info("There are no test words, holding out {} training words for evaluation".format(held_out))
+        test_entries, train_entries = train_entries[:held_out], train_entries[held_out:]
+
+    # sizes exceeding the lexicon collapse into complete lexicon, train each size once
+    sizes = sorted(set(len(train_entries) if x == "all" else min(x, len(train_entries)) for x in sizes))
+    jobs = []
+    for size in sizes:
+        name = "size_{}".format(size)
+        subset_dir = os.path.join(scaling_dir, name)
+        os.makedirs(subset_dir, exist_ok=True)
+        train_data_path = os.path.join(subset_dir, "pronunciation_training_data")
+        dump_training_entries(train_entries[:size], train_data_path, normalizer=normalizer)
+        jobs.append(TrainEvalJob(name, subset_dir, train_data_path, test_entries, ngram_order))
+    logging.info("Training {} models on subsets of {} training words".format(len(jobs), len(train_entries)))
+    results = run_jobs(jobs, num_workers)
+    for result, size in zip(results, sizes):
+        result["train_words"] = size
+
+    with open(os.path.join(scaling_dir, "scaling.json"), "w", encoding="utf-8") as fp:
+        json.dump(results, fp, indent=2)
+    with open(os.path.join(scaling_dir, "scaling.csv"), "w", encoding="utf-8", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+    for result in results:
+        logging.info(
+            "{} words: WER,% {:.2f}; PER,% {:.2f}; training {:.1f}s; {:.0f}MB peak; FST {} bytes".format(
+                result["train_words"],
+                result["wer"],
+                result["per"],
+                result["train_time"],
+                result["peak_memory_mb"],
+                result["fst_size"],
+            )
+        )
+    return results
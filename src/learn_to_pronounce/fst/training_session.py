@@ -0,0 +1,111 @@
+"""
+Copyright 2022 Balacoon
+
+Training session: state shared by all FST trainings within a run.
+Phonetisaurus training module is loaded once and time spent
+in each phase of phonetisaurus training is accumulated per model
+and reported to telemetry when phase starts and ends.
+"""
+
+import functools
+import json
+import logging
+import time
+from typing import Dict
+
+from learn_to_pronounce.telemetry import get_telemetry
+
+#: phases of phonetisaurus G2PModelTrainer. TrainG2PModel executes all of them
+PHASES = ["AlignLexicon", "TrainNGramModel", "ConvertARPAModel"]
+
+
+class TrainingSession:
+    """
+    Creates phonetisaurus trainers from a single instance of the backend module
+    and measures time spent in their phases
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._timings = {}  # model -> phase -> seconds
+
+    @property
+    def backend(self):
+        """
+        Phonetisaurus training module, loaded on first access
+        """
+        if self._backend is None:
+            # imported here to avoid circular import, fst_trainer creates sessions
+            from learn_to_pronounce.fst.fst_trainer import load_phonetisaurus
+
+            start = time.perf_counter()
+            self._backend = load_phonetisaurus()
+            logging.info("Loaded phonetisaurus in {:.2f}s".format(time.perf_counter() - start))
+        return self._backend
+
+    def _timed(self, model: str, phase: str, method):
+        """
+        Helper function that wraps trainer method, accumulating its execution time
+        """
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with get_telemetry().phase("fst_training/{}/{}".format(model, phase)):
+                    return method(*args, **kwargs)
+            finally:
+                phases = self._timings.setdefault(model, {})
+                phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - start
+
+        return wrapper
+
+    def create_trainer(self, train_data_path: str, model_prefix: str, **kwargs):
+        """
+        Creates phonetisaurus G2PModelTrainer with timed phases
+
+        Parameters
+        ----------
+        train_data_path: str
+            path to training data
+        model_prefix: str
+            name of the model, also used as a key in summary
+        **kwargs:
+            other named parameters passed directly to phonetisaurus_train.G2PModelTrainer
+
+        Returns
+        -------
+        trainer: phonetisaurus_train.G2PModelTrainer
+            trainer, phases of which are accounted in :func:`.get_summary`
+        """
+        trainer = self.backend.G2PModelTrainer(train_data_path, model_prefix=model_prefix, **kwargs)
+        # phases are replaced on the instance, so calls from TrainG2PModel are timed too
+        for phase in PHASES:
+            setattr(trainer, phase, self._timed(model_prefix, phase, getattr(trainer, phase)))
+        return trainer
+
+    def get_summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns time in seconds spent in each phase of phonetisaurus training, per model
+        """
+        return {model: dict(phases) for model, phases in self._timings.items()}
+
+    def log_summary(self):
+        """
+        Prints time spent in phases of phonetisaurus training to console
+        """
+        for model, phases in self._timings.items():
+            logging.info(
+                "{}: {}; total {:.1f}s".format(
+                    model,
+                    ", ".join("{} {:.1f}s".format(phase, seconds) for phase, seconds in phases.items()),
+                    sum(phases.values()),
+                )
+            )
+
+    def save_summary(self, path: str):
+        """
+        Stores summary returned by :func:`.get_summary` as json
+        """
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(self.get_summary(), fp, indent=2)
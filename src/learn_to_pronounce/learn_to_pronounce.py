@@ -2,18 +2,23 @@
 Copyright 2022 Balacoon
 
 Recipe to build an addon for balacoon_frontend.
+Heavy modules are imported within stages that need them,
+so start-up of the script stays fast.
 """
 
 import argparse
 import logging
 import os
+from typing import List
 
-from learn_to_pronounce.addon.addon_manager import AddonManager
-from learn_to_pronounce.fst.fst_trainer import FSTTrainer, add_fst_arguments
-from learn_to_pronounce.resources import get_provider
+from learn_to_pronounce.fst.arguments import add_fst_arguments
+from learn_to_pronounce.telemetry import SINKS
 
+#: stages executed by "all", in the order of execution
+ALL_STAGES = ["lexicon", "spelling", "pronunciation", "oov", "evaluation", "regression"]
 
-def parse_args():
+
+def parse_args(argv: List[str] = None):
     ap = argparse.ArgumentParser(
         description="Learns how to pronounce words, creates artifacts for balacoon_frontend package.",
         formatter_class=argparse.RawTextHelpFormatter,
@@ -39,57 +44,411 @@ def parse_args():
     )
     ap.add_argument(
         "--stage",
-        choices=["lexicon", "spelling", "pronunciation", "evaluation", "all"],
+        choices=[
+            "statistics",
+            "lexicon",
+            "spelling",
+            "pronunciation",
+            "oov",
+            "evaluation",
+            "all",
+            "cross_validation",
+            "scaling",
+            "regression",
+            "none",
+        ],
         default="all",
         help="Which stage of pronunciation learning to execute:\n"
+        "> statistics - compute lexicon statistics to work_dir/statistics.json and check inventories.\n"
+        "  Is not part of \"all\"\n"
         "> lexicon - just pack dictionary for pronunciation look up\n"
         "> spelling - train small FST model to spell words\n"
         "> pronunciation - train FST-based pronunciation generation\n"
+        "> oov - add pronunciations of frequent OOV words (--oov-vocabulary) to lexicon\n"
         "> evaluation - evaluate FST-based pronunciation generation\n"
-        "> all - all of the above",
+        "> all - all of the above, oov only if --oov-vocabulary is specified\n"
+        "> cross_validation - K-fold cross-validation of FST-based pronunciation generation,\n"
+        "  doesn't modify addon. Is not part of \"all\"\n"
+        "> scaling - train and evaluate FSTs on nested subsets of training words (--scaling-sizes),\n"
+        "  reports accuracy and cost vs lexicon size. Doesn't modify addon. Is not part of \"all\"\n"
+        "> regression - compare pronunciation FST with the one from --baseline-addon on test words,\n"
+        "  fail if thresholds are breached. Part of \"all\" if --baseline-addon is specified\n"
+        "> none - don't execute any stage, for ex. to only collect garbage with --gc",
+    )
+    ap.add_argument(
+        "--num-workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes to use in parallelized stages",
+    )
+    ap.add_argument(
+        "--cv-folds",
+        type=int,
+        default=5,
+        help="Number of folds in cross-validation. Up to --num-workers models are trained concurrently",
+    )
+    ap.add_argument(
+        "--cv-seed",
+        type=int,
+        default=42,
+        help="Seed for splitting words into cross-validation folds and sampling subsets in scaling stage",
+    )
+    ap.add_argument(
+        "--scaling-sizes",
+        nargs="+",
+        default=["1000", "5000", "20000", "all"],
+        help="Sizes of training subsets for scaling stage, \"all\" stands for complete training lexicon",
+    )
+    ap.add_argument(
+        "--oov-vocabulary",
+        help="File with word frequencies (<word> <count> per line), for ex. from serving logs. "
+        "Most frequent words missing from lexicon get pronunciations generated with FST",
+    )
+    ap.add_argument(
+        "--oov-top-n",
+        type=int,
+        default=100000,
+        help="Number of most frequent OOV words to add to lexicon",
+    )
+    ap.add_argument(
+        "--packed-lexicon",
+        action="store_true",
+        help="Additionally store lexicon in a flat format that can be queried from memory-mapped addon. "
+        "Keep it uncompressed (--uncompressed-sections packed_lexicon) for memory-mapping to work",
+    )
+    ap.add_argument(
+        "--compression",
+        choices=["none", "gzip", "zstd", "lz4"],
+        default="none",
+        help="Codec to compress addon sections with when it is saved to --out. "
+        "Compressed addon should be decompressed with decompress_addon before use with balacoon_frontend",
+    )
+    ap.add_argument(
+        "--uncompressed-sections",
+        nargs="*",
+        default=[],
+        help="Addon sections to leave uncompressed, for ex. ones accessed on start-up",
+    )
+    ap.add_argument(
+        "--delta-base",
+        help="Previous version of the addon (uncompressed). If specified together with --out, "
+        "delta that turns it into the new addon is stored to <out>.delta",
+    )
+    ap.add_argument(
+        "--baseline-addon",
+        help="Addon that is currently shipped. Regression stage compares its pronunciation FST with the new one",
+    )
+    ap.add_argument(
+        "--max-wer-increase",
+        type=float,
+        default=0.5,
+        help="Regression stage fails if WER increases by more than given absolute percents",
+    )
+    ap.add_argument(
+        "--max-per-increase",
+        type=float,
+        default=0.2,
+        help="Regression stage fails if PER increases by more than given absolute percents",
+    )
+    ap.add_argument(
+        "--max-regressions",
+        type=int,
+        help="Regression stage fails if more words become incorrect than given number. Not checked by default",
+    )
+    ap.add_argument(
+        "--max-slowdown",
+        type=float,
+        help="Regression stage fails if decoding throughput drops by more than given fraction, for ex. 0.1. "
+        "Not checked by default",
+    )
+    ap.add_argument(
+        "--gc",
+        action="store_true",
+        help="After stages are executed, remove intermediate artifacts in --work-dir that are not needed "
+        "to resume (ARPA models, cross-validation and scaling models) and compress ones needed only "
+        "for incremental training. Sizes of artifacts are reported before and after",
+    )
+    ap.add_argument(
+        "--telemetry",
+        nargs="*",
+        choices=SINKS,
+        default=[],
+        help="Where to report progress and throughput of long-running stages (lexicon parsing, "
+        "dumping of training data, phases of FST training, evaluation, addon writing):\n"
+        "> console - log progress with rate and ETA\n"
+        "> jsonl - append events to work_dir/telemetry.jsonl\n"
+        "> prometheus - keep latest state of stages in Prometheus text format in work_dir/telemetry.prom",
+    )
+    ap.add_argument(
+        "--telemetry-interval",
+        type=float,
+        default=10.0,
+        help="Minimal number of seconds between progress reports of a stage",
+    )
+    ap.add_argument(
+        "--telemetry-prometheus-file",
+        help="Path to Prometheus text-format file, for ex. in node_exporter textfile directory. "
+        "By default it is stored to work_dir/telemetry.prom",
     )
     add_fst_arguments(ap)
-    args = ap.parse_args()
+    args = ap.parse_args(argv)
+    if args.stage == "oov" and not args.oov_vocabulary:
+        ap.error("--oov-vocabulary is required for oov stage")
+    if args.stage == "regression" and not args.baseline_addon:
+        ap.error("--baseline-addon is required for regression stage")
     return args
 
 
-def main():
-    logging.basicConfig(level=logging.INFO)
-    args = parse_args()
+def add_oov_pronunciations(args: argparse.Namespace, provider, addon_manager):
+    """
+    Generates pronunciations for frequent OOV words and adds them to lexicon in addon
+    """
+    from learn_to_pronounce.fst.oov_table import OOVTable, read_word_frequencies
 
-    os.makedirs(args.work_dir, exist_ok=True)
-    addon_manager = AddonManager(args.work_dir, args.locale)
-    provider = get_provider(args.resources)
-
-    if args.stage == "lexicon" or args.stage == "all":
-        logging.info("Packing pronunciation dictionary")
-        pd = provider.get_lexicon()
-        graphemes = provider.get_graphemes()
-        phonemes = provider.get_phonemes()
-        pd.validate(set(graphemes), set(phonemes))
-        addon_manager.add_lexicon(pd, graphemes, phonemes)
-        logging.info(
-            "Packed lexicon with {} words. Consists of {} graphemes and {} phonemes".format(
-                pd.size(), len(graphemes), len(phonemes)
-            )
+    fst_path = os.path.join(args.work_dir, "pronunciation.fst")
+    if not os.path.isfile(fst_path):
+        raise FileNotFoundError(
+            "Can't generate OOV pronunciations, missing [{}]. Run training first.".format(fst_path)
+        )
+    pd = provider.get_lexicon()
+    graphemes = provider.get_graphemes()
+    phonemes = provider.get_phonemes()
+    lexicon_words = set(x.name() for x in pd.get_words())
+    oov_table = OOVTable(read_word_frequencies(args.oov_vocabulary), lexicon_words, graphemes)
+    oov_table.generate(fst_path, args.oov_top_n, num_workers=args.num_workers)
+    oov_table.add_to_lexicon(pd)
+    pd.validate(set(graphemes), set(phonemes))
+    addon_manager.add_lexicon(pd, graphemes, phonemes, packed=args.packed_lexicon)
+    oov_table.save(args.work_dir)
+
+
+def compute_statistics(provider, work_dir: str):
+    """
+    Computes statistics of the lexicon, stores them to work_dir/statistics.json
+    and warns about mismatches between lexicon and grapheme/phoneme inventories
+    """
+    from learn_to_pronounce.resources.statistics import check_inventory, get_statistics, save_statistics
+
+    statistics = get_statistics(provider.get_interned_lexicon())
+    save_statistics(statistics, os.path.join(work_dir, "statistics.json"))
+    logging.info(
+        "Lexicon has {} words, {} pronunciations, {} graphemes and {} phonemes".format(
+            statistics["words"],
+            statistics["pronunciations"],
+            len(statistics["graphemes"]),
+            len(statistics["phonemes"]),
+        )
+    )
+    issues = check_inventory("graphemes", provider.get_graphemes(), statistics["graphemes"])
+    issues += check_inventory("phonemes", provider.get_phonemes(), statistics["phonemes"])
+    for issue in issues:
+        logging.warning(issue)
+
+
+def _is_selected(args: argparse.Namespace, stage: str) -> bool:
+    """
+    Helper function that checks whether stage is requested directly or as a part of "all".
+    oov and regression stages are a part of "all" only if their inputs are provided.
+    """
+    if args.stage == stage:
+        return True
+    if args.stage != "all" or stage not in ALL_STAGES:
+        return False
+    if stage == "oov":
+        return bool(args.oov_vocabulary)
+    if stage == "regression":
+        return bool(args.baseline_addon)
+    return True
+
+
+def _run_statistics(args: argparse.Namespace, provider, work_dir):
+    logging.info("Computing lexicon statistics")
+    compute_statistics(provider, args.work_dir)
+    work_dir.register("statistics.json", "statistics")
+
+
+def _run_lexicon(args: argparse.Namespace, provider, addon_manager):
+    logging.info("Packing pronunciation dictionary")
+    pd = provider.get_lexicon()
+    graphemes = provider.get_graphemes()
+    phonemes = provider.get_phonemes()
+    pd.validate(set(graphemes), set(phonemes))
+    addon_manager.add_lexicon(pd, graphemes, phonemes, packed=args.packed_lexicon)
+    logging.info(
+        "Packed lexicon with {} words. Consists of {} graphemes and {} phonemes".format(
+            pd.size(), len(graphemes), len(phonemes)
         )
+    )
+
+
+def _run_fst_stages(args: argparse.Namespace, provider, addon_manager, work_dir):
+    """
+    Runs stages that train and use FST models: spelling, pronunciation, oov and evaluation
+    """
+    fst_trainer = None
+    if args.stage in ["spelling", "pronunciation", "evaluation", "all"]:
+        from learn_to_pronounce.fst.fst_trainer import FSTTrainer
 
-    if args.stage == "spelling" or args.stage == "all":
+        # single trainer, so phonetisaurus is loaded once per run
         fst_trainer = FSTTrainer(provider, args.work_dir, args)
+
+    if _is_selected(args, "spelling"):
         logging.info("Training small FST-based spelling model")
-        path = fst_trainer.train_spelling()
-        addon_manager.add_spelling_fst(path)
+        addon_manager.add_spelling_fst(fst_trainer.train_spelling())
 
-    if args.stage == "pronunciation" or args.stage == "all":
-        fst_trainer = FSTTrainer(provider, args.work_dir, args)
+    if _is_selected(args, "pronunciation"):
         logging.info("Training FST-based pronunciation model")
-        path = fst_trainer.train_pronunciation()
-        addon_manager.add_pronunciation_fst(path)
+        addon_manager.add_pronunciation_fst(fst_trainer.train_pronunciation())
 
-    if args.stage == "evaluation" or args.stage == "all":
-        fst_trainer = FSTTrainer(provider, args.work_dir, args)
+    if _is_selected(args, "oov"):
+        logging.info("Pre-computing pronunciations for frequent OOV words")
+        add_oov_pronunciations(args, provider, addon_manager)
+        work_dir.register("oov_pronunciations", "oov")
+        work_dir.register("oov_report.json", "oov")
+
+    if _is_selected(args, "evaluation"):
         logging.info("Evaluating FST-based pronunciation model")
         fst_trainer.evaluate_pronunciation()
 
+    if fst_trainer is not None and fst_trainer.session.get_summary():
+        logging.info("Time spent in phases of FST training:")
+        fst_trainer.session.log_summary()
+        fst_trainer.session.save_summary(os.path.join(args.work_dir, "training_session.json"))
+        work_dir.register("training_session.json", args.stage)
+
+
+def _run_cross_validation(args: argparse.Namespace, provider, work_dir):
+    from learn_to_pronounce.fst.arguments import create_normalizer
+    from learn_to_pronounce.fst.cross_validation import cross_validate
+    from learn_to_pronounce.work_dir import REMOVE
+
+    logging.info("Cross-validating FST-based pronunciation model")
+    cross_validate(
+        provider,
+        args.work_dir,
+        args.fst_order,
+        args.cv_folds,
+        args.num_workers,
+        seed=args.cv_seed,
+        normalizer=create_normalizer(args),
+    )
+    # models of folds are not needed once results are summarized
+    work_dir.register("cross_validation/fold_*", "cross_validation", gc=REMOVE)
+    work_dir.register("cross_validation/cross_validation.json", "cross_validation")
+
+
+def _run_scaling(args: argparse.Namespace, provider, work_dir):
+    from learn_to_pronounce.fst.arguments import create_normalizer
+    from learn_to_pronounce.fst.scaling import parse_sizes, scaling_curve
+    from learn_to_pronounce.work_dir import REMOVE
+
+    logging.info("Measuring accuracy and cost vs training lexicon size")
+    scaling_curve(
+        provider,
+        args.work_dir,
+        args.fst_order,
+        parse_sizes(args.scaling_sizes),
+        args.num_workers,
+        seed=args.cv_seed,
+        normalizer=create_normalizer(args),
+    )
+    work_dir.register("scaling/*/", "scaling", gc=REMOVE)
+    work_dir.register("scaling/scaling.*", "scaling")
+
+
+def _run_regression(args: argparse.Namespace, provider):
+    """
+    Compares trained pronunciation FST with the one from baseline addon.
+    Exits with error if any of regression thresholds is violated, so addon is not stored.
+    """
+    from learn_to_pronounce.fst.regression import regression_gate
+
+    logging.info("Comparing pronunciation FST with the one from baseline addon")
+    violations = regression_gate(
+        provider,
+        args.work_dir,
+        args.baseline_addon,
+        args.num_workers,
+        max_wer_increase=args.max_wer_increase,
+        max_per_increase=args.max_per_increase,
+        max_regressions=args.max_regressions,
+        max_slowdown=args.max_slowdown,
+    )
+    if violations:
+        for violation in violations:
+            logging.error("Regression gate failed: {}".format(violation))
+        # addon is not stored to --out, so it is not rolled out
+        raise SystemExit(1)
+    logging.info("Regression gate passed")
+
+
+def _save_addon(args: argparse.Namespace, addon_manager):
+    """
+    Stores addon to --out and, if requested, delta from previous version of the addon
+    """
+    codec = None if args.compression == "none" else args.compression
+    addon_manager.save(args.out, codec=codec, uncompressed=args.uncompressed_sections)
+    if args.delta_base:
+        addon_manager.save_delta(args.delta_base, args.out + ".delta", target_path=args.out)
+        logging.info("Stored delta from [{}] to [{}]".format(args.delta_base, args.out + ".delta"))
+
+
+def _run_gc(work_dir):
+    from learn_to_pronounce.work_dir import format_size
+
+    logging.info("Artifacts in working directory:")
+    work_dir.log_report()
+    freed = work_dir.collect_garbage()
+    logging.info("Garbage collection freed {}:".format(format_size(freed)))
+    work_dir.log_report()
+
+
+def _run_stages(args: argparse.Namespace, work_dir):
+    """
+    Runs selected stages, adding their artifacts into addon, and stores addon to --out
+    """
+    from learn_to_pronounce.addon.addon_manager import AddonManager
+    from learn_to_pronounce.resources import get_provider
+    from learn_to_pronounce.resources.provider import CachingProvider
+
+    addon_manager = AddonManager(args.work_dir, args.locale)
+    # stages share word lists, inventories and parsed lexicons
+    provider = CachingProvider(get_provider(args.resources, num_workers=args.num_workers))
+
+    if args.stage == "statistics":
+        _run_statistics(args, provider, work_dir)
+    if _is_selected(args, "lexicon"):
+        _run_lexicon(args, provider, addon_manager)
+    _run_fst_stages(args, provider, addon_manager, work_dir)
+    if args.stage == "cross_validation":
+        _run_cross_validation(args, provider, work_dir)
+    if args.stage == "scaling":
+        _run_scaling(args, provider, work_dir)
+    if _is_selected(args, "regression"):
+        _run_regression(args, provider)
+
     if args.out:
-        addon_manager.save(args.out)
+        _save_addon(args, addon_manager)
+    work_dir.register(AddonManager.ADDON_FILE_NAME, args.stage, consumers=["addon"])
+
+
+def main(argv: List[str] = None):
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args(argv)
+
+    from learn_to_pronounce.telemetry import telemetry_session
+    from learn_to_pronounce.work_dir import WorkDir
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    work_dir = WorkDir(args.work_dir)
+    with telemetry_session(
+        args.telemetry,
+        args.work_dir,
+        interval=args.telemetry_interval,
+        prometheus_path=args.telemetry_prometheus_file,
+    ) as telemetry_files:
+        _run_stages(args, work_dir)
+    for name in telemetry_files:
+        work_dir.register(name, "telemetry")
+    if args.gc:
+        _run_gc(work_dir)
@@ -0,0 +1,84 @@
+"""
+Copyright 2022 Balacoon
+
+Generates load for ``serve_pronounce``, reports throughput and latency
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import List
+
+
+def parse_args():
+    ap = argparse.ArgumentParser("Sends requests to serve_pronounce, reports throughput and tail latency.")
+    ap.add_argument("--words", required=True, help="File with words to send, one per line")
+    ap.add_argument("--host", default="127.0.0.1", help="Host serve_pronounce listens on")
+    ap.add_argument("--port", type=int, default=8765, help="TCP port serve_pronounce listens on")
+    ap.add_argument("--unix-socket", help="If specified, connect to Unix socket instead of TCP")
+    ap.add_argument("--connections", type=int, default=8, help="Number of concurrent connections")
+    ap.add_argument("--requests", type=int, default=10000, help="Total number of requests to send")
+    ap.add_argument("--spelling", action="store_true", help="Request spelling instead of pronunciation")
+    ap.add_argument("--seed", type=int, default=42, help="Seed for sampling of words")
+    args = ap.parse_args()
+    return args
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Returns q-th percentile (0..100) of values using nearest-rank method
+    """
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, int(round(q / 100.0 * len(values))) - 1))
+    return values[index]
+
+
+async def _run_connection(args: argparse.Namespace, words: List[str], latencies: List[float]):
+    """
+    Sends words one by one over a single connection, recording latency of each request
+    """
+    if args.unix_socket:
+        reader, writer = await asyncio.open_unix_connection(args.unix_socket)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    errors = 0
+    for word in words:
+        start = time.perf_counter()
+        writer.write(json.dumps({"word": word, "spelling": args.spelling}).encode("utf-8") + b"\n")
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        if "error" in response:
+            errors += 1
+    writer.close()
+    return errors
+
+
+async def run_load(args: argparse.Namespace, words: List[str]):
+    rng = random.Random(args.seed)
+    requests = [rng.choice(words) for _ in range(args.requests)]
+    chunks = [requests[i::args.connections] for i in range(args.connections)]
+    latencies = []
+    start = time.perf_counter()
+    errors = await asyncio.gather(*[_run_connection(args, chunk, latencies) for chunk in chunks])
+    elapsed = time.perf_counter() - start
+    logging.info("Sent {} requests over {} connections in {:.2f}s".format(len(requests), args.connections, elapsed))
+    logging.info("Throughput: {:.1f} requests/s, errors: {}".format(len(latencies) / elapsed, sum(errors)))
+    logging.info(
+        "Latency, ms: p50 {:.2f}; p90 {:.2f}; p99 {:.2f}; p99.9 {:.2f}; max {:.2f}".format(
+            *[1000 * percentile(latencies, q) for q in [50, 90, 99, 99.9, 100]]
+        )
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    with open(args.words, "r", encoding="utf-8") as fp:
+        words = [x.strip() for x in fp if x.strip()]
+    asyncio.run(run_load(args, words))
@@ -24,6 +24,32 @@ Basic implementation of resource provider:
 
     DefaultProvider
 
+Provider that auto-detects format of lexicon (tsv, CMUDict-style, json, optionally compressed
+with gzip or xz) and parses large lexicons in parallel. It is used if there is no custom provider:
+
+.. autosummary::
+    :toctree: generated/
+    :nosignatures:
+    :template: class.rst
+
+    AutoProvider
+
+Internally lexicon is processed in compact form, with phonemes interned into integer ids:
+
+.. autosummary::
+    :toctree: generated/
+    :nosignatures:
+    :template: class.rst
+
+    PhonemeTable
+    InternedLexicon
+
+Training data of FST is normalized and deduplicated with
+:class:`learn_to_pronounce.resources.normalization.TrainingDataNormalizer`.
+
+Statistics of the lexicon (inventories, n-gram frequencies, histograms) are computed
+with :func:`learn_to_pronounce.resources.statistics.get_statistics`.
+
 If custom resource directory is used, one can implement their own provider
 and put it to resource directory. if custom_provider.py with CustomProvider
 class is available in resource directory, it will be used to access the data.
@@ -31,12 +57,30 @@ Check https://github.com/balacoon/learn_to_pronounce/blob/main/tests/dummy_data/
 for reference.
 """
 
+import importlib
 import importlib.util
 import logging
 import os
 import types
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from learn_to_pronounce.resources.provider import AbstractProvider
+
+_LAZY_ATTRIBUTES = {
+    "AbstractProvider": "learn_to_pronounce.resources.provider",
+    "DefaultProvider": "learn_to_pronounce.resources.provider",
+    "AutoProvider": "learn_to_pronounce.resources.provider",
+    "PhonemeTable": "learn_to_pronounce.resources.interned",
+    "InternedLexicon": "learn_to_pronounce.resources.interned",
+}
 
-from learn_to_pronounce.resources.provider import AbstractProvider, DefaultProvider
+
+def __getattr__(name: str):
+    # provider module imports balacoon_frontend, so it is loaded only when a class is requested
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 def _get_module_from_file(
@@ -63,17 +107,38 @@ def _get_module_from_file(
     return module
 
 
-def get_provider(resources_dir: str) -> AbstractProvider:
+def _is_plain_tsv(path: str) -> bool:
+    """
+    Helper function that checks whether lexicon is an uncompressed tab-separated file,
+    which can be read by "DefaultProvider"
+    """
+    from learn_to_pronounce.resources.formats import detect_format, get_compression
+
+    if get_compression(path) is not None:
+        return False
+    try:
+        return detect_format(path) == "tsv"
+    except RuntimeError:
+        # there are no entries, default provider reads empty lexicon as well
+        return True
+
+
+def get_provider(resources_dir: str, num_workers: int = None) -> "AbstractProvider":
     """
     Creates a resource provider for the given resource directory.
     If resource directory contains file `custom_provider.py` with class "CustomProvider"
-    defined inside, it will be used to load the data. Otherwise "DefaultProvider" will be used.
+    defined inside, it will be used to load the data. Otherwise "DefaultProvider" is used
+    if resource directory contains uncompressed tab-separated `lexicon` file, and "AutoProvider",
+    which detects format of lexicon automatically, if lexicon is stored in another way
+    (including other formats or compressed files stored under the name `lexicon`).
     "CustomProvider" should implement methods from "AbstractProvider".
 
     Parameters
     ----------
     resources_dir: str
         Directory with resources: lexicon, spelling_lexicon, etc
+    num_workers: int
+        number of processes "AutoProvider" parses large lexicons with, all CPUs by default
 
     Returns
     -------
@@ -81,6 +146,8 @@ def get_provider(resources_dir: str) -> AbstractProvider:
         resource provider, object that implements methods of AbstractProvider,
         which allow to load data from resource directory for pronunciation learning.
     """
+    from learn_to_pronounce.resources.provider import AutoProvider, DefaultProvider
+
     resource_provider = None
     custom_provider_path = os.path.join(resources_dir, "custom_provider.py")
     if os.path.isfile(custom_provider_path):
@@ -97,7 +164,10 @@ def get_provider(resources_dir: str) -> AbstractProvider:
                 )
             )
 
-    if resource_provider is None:
+    lexicon_path = os.path.join(resources_dir, DefaultProvider.LEXICON_FILE_NAME)
+    if resource_provider is None and os.path.isfile(lexicon_path) and _is_plain_tsv(lexicon_path):
         resource_provider = DefaultProvider(resources_dir)
+    if resource_provider is None:
+        resource_provider = AutoProvider(resources_dir, num_workers=num_workers)
 
     return resource_provider
@@ -0,0 +1,329 @@
+"""
+Copyright 2022 Balacoon
+
+Readers of common lexicon formats with auto-detection:
+
+- tsv: ``<word>\\t<tag>\\t<pronunciation>`` with optional tag, one variant per line
+  (format of :class:`learn_to_pronounce.resources.provider.DefaultProvider`)
+- cmudict: ``<WORD>  <pronunciation>``, variants marked as ``WORD(2)``, comments start with ``;;;``
+- json: list of ``{"<word>": [<pronunciations>]}`` or a single object ``{"<word>": [<pronunciations>]}``,
+  pronunciation can also be a single string
+
+Any of the formats can be compressed with gzip or xz. Large uncompressed files in
+line-based formats are parsed in chunks by a pool of processes,
+json is parsed with a streaming decoder, without loading whole document into memory.
+"""
+
+import gzip
+import json
+import logging
+import lzma
+import multiprocessing
+import os
+import re
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+from learn_to_pronounce.telemetry import get_telemetry
+
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+FORMATS = ["tsv", "cmudict", "json"]
+CMUDICT_COMMENT = ";;;"
+PARALLEL_MIN_SIZE = 8 << 20  #: files smaller than that are parsed in a single process
+_CMUDICT_VARIANT = re.compile(r"\(\d+\)$")
+_JSON_READ_SIZE = 1 << 16
+
+Entry = Tuple[str, str, str]  #: word, tag, pronunciation
+
+
+def get_compression(path: str) -> Optional[str]:
+    """
+    Detects compression of the file by its magic bytes
+
+    Returns
+    -------
+    compression: Optional[str]
+        "gzip", "xz" or None if file is not compressed
+    """
+    with open(path, "rb") as fp:
+        magic = fp.read(len(XZ_MAGIC))
+    if magic.startswith(GZIP_MAGIC):
+        return "gzip"
+    if magic.startswith(XZ_MAGIC):
+        return "xz"
+    return None
+
+
+def open_lexicon(path: str, encoding: str = "utf-8") -> IO[str]:
+    """
+    Opens lexicon file for reading text, decompressing it on the fly if needed
+    """
+    compression = get_compression(path)
+    if compression == "gzip":
+        return gzip.open(path, "rt", encoding=encoding)
+    if compression == "xz":
+        return lzma.open(path, "rt", encoding=encoding)
+    return open(path, "r", encoding=encoding)
+
+
+def detect_format(path: str, encoding: str = "utf-8") -> str:
+    """
+    Detects format of the lexicon by its first meaningful line
+
+    Parameters
+    ----------
+    path: str
+        path to lexicon, possibly compressed
+    encoding: str
+        encoding of the lexicon
+
+    Returns
+    -------
+    format: str
+        one of :data:`FORMATS`
+    """
+    with open_lexicon(path, encoding) as fp:
+        for line in fp:
+            line = line.strip()
+            if not line or line.startswith(CMUDICT_COMMENT):
+                continue
+            if "\t" in line:
+                return "tsv"
+            if _is_json_start(line):
+                return "json"
+            return "cmudict"
+    raise RuntimeError("Can't detect format of lexicon [{}], there are no entries".format(path))
+
+
+def _is_json_start(line: str) -> bool:
+    """
+    Helper function that checks whether line starts json array of objects or json object.
+    Words of other formats can start with a bracket too, so the symbol following it is checked.
+    """
+    if line[0] not in "[{":
+        return False
+    rest = line[1:].lstrip()
+    # array contains objects, object starts with a key
+    return not rest or rest[0] in ('{]"' if line[0] == "[" else '"}')
+
+
+def parse_tsv_line(line: str) -> Entry:
+    """
+    Parses line of tsv lexicon: ``<word>\\t<tag>\\t<pronunciation>``, where tag is optional
+    """
+    parts = line.split("\t")
+    if len(parts) == 2:
+        return parts[0], "", parts[1]
+    if len(parts) == 3:
+        return parts[0], parts[1], parts[2]
+    raise RuntimeError("Failed to parse lexicon line [{}]".format(line))
+
+
+def parse_cmudict_line(line: str) -> Optional[Entry]:
+    """
+    Parses line of CMUDict-style lexicon. Returns None for comments.
+    Variant index is removed from the word, trailing comments are removed from pronunciation.
+    """
+    if line.startswith(CMUDICT_COMMENT):
+        return None
+    parts = line.split("#", 1)[0].split(maxsplit=1)
+    if len(parts) != 2:
+        raise RuntimeError("Failed to parse lexicon line [{}]".format(line))
+    word, pronunciation = parts
+    return _CMUDICT_VARIANT.sub("", word), "", " ".join(pronunciation.split())
+
+
+_LINE_PARSERS = {"tsv": parse_tsv_line, "cmudict": parse_cmudict_line}
+
+
+def _parse_lines(lines: Iterable[str], lexicon_format: str) -> Iterator[Entry]:
+    """
+    Helper function that parses lines of line-based lexicon, skipping empty lines and comments
+    """
+    parse_line = _LINE_PARSERS[lexicon_format]
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        entry = parse_line(line)
+        if entry is not None:
+            yield entry
+
+
+def _parse_range(task: Tuple[str, str, str, int, int]) -> List[Entry]:
+    """
+    Parses lines of the file that start within the byte range. Executed in a worker process.
+    """
+    path, encoding, lexicon_format, start, end = task
+    lines = []
+    with open(path, "rb") as fp:
+        if start:
+            # line that started before the range belongs to the previous chunk
+            fp.seek(start - 1)
+            fp.readline()
+        while fp.tell() < end:
+            line = fp.readline()
+            if not line:
+                break
+            lines.append(line.decode(encoding))
+    return list(_parse_lines(lines, lexicon_format))
+
+
+def _parse_parallel(path: str, encoding: str, lexicon_format: str, num_workers: int) -> Iterator[Entry]:
+    """
+    Helper function that splits uncompressed line-based lexicon into byte ranges and parses them concurrently.
+    Entries are returned in the order of the file.
+    """
+    size = os.path.getsize(path)
+    num_chunks = num_workers * 4
+    bounds = [size * i // num_chunks for i in range(num_chunks + 1)]
+    tasks = [(path, encoding, lexicon_format, bounds[i], bounds[i + 1]) for i in range(num_chunks)]
+    with multiprocessing.Pool(num_workers) as pool:
+        for entries in pool.imap(_parse_range, tasks):
+            yield from entries
+
+
+class _JsonStreamReader:
+    """
+    Decodes elements of top-level json array, or key-value pairs of
+    top-level json object, reading the document by blocks.
+    """
+
+    def __init__(self, fp: IO[str]):
+        self._fp = fp
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """
+        Reads next block of the document, dropping already decoded part of the buffer
+        """
+        block = self._fp.read(_JSON_READ_SIZE)
+        self._eof = not block
+        self._buf = self._buf[self._pos:] + block
+        self._pos = 0
+        return not self._eof
+
+    def _skip_whitespace(self) -> str:
+        """
+        Moves to the next meaningful symbol and returns it, empty string at the end of the document
+        """
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _decode(self):
+        """
+        Decodes json value starting at current position
+        """
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # value is incomplete, read more of the document
+                if not self._fill():
+                    raise
+                continue
+            if end == len(self._buf) and not self._eof and self._fill():
+                # value may continue in next block, for ex. number
+                continue
+            self._pos = end
+            return value
+
+    def _expect(self, symbols: str) -> str:
+        """
+        Consumes one of expected symbols
+        """
+        symbol = self._skip_whitespace()
+        if not symbol or symbol not in symbols:
+            raise RuntimeError("Failed to parse json lexicon: expected one of [{}], got [{}]".format(symbols, symbol))
+        self._pos += 1
+        return symbol
+
+    def iterate(self) -> Iterator:
+        """
+        Iterates over elements of array or over key-value pairs of object, latter as single-key dicts
+        """
+        opening = self._expect("[{")
+        closing = "]" if opening == "[" else "}"
+        if self._skip_whitespace() == closing:
+            return
+        while True:
+            if opening == "[":
+                yield self._decode()
+            else:
+                key = self._decode()
+                self._expect(":")
+                yield {key: self._decode()}
+            if self._expect("," + closing) == closing:
+                return
+
+
+def _parse_json(fp: IO[str]) -> Iterator[Entry]:
+    """
+    Helper function that converts json lexicon into entries
+    """
+    for item in _JsonStreamReader(fp).iterate():
+        if not isinstance(item, dict):
+            raise RuntimeError("Failed to parse json lexicon: expected object, got [{}]".format(item))
+        for word, pronunciations in item.items():
+            if isinstance(pronunciations, str):
+                pronunciations = [pronunciations]
+            for pronunciation in pronunciations:
+                yield word, "", pronunciation
+
+
+def read_lexicon(
+    path: str, encoding: str = "utf-8", lexicon_format: Optional[str] = None, num_workers: int = 1
+) -> Iterator[Entry]:
+    """
+    Reads lexicon in any of supported formats
+
+    Parameters
+    ----------
+    path: str
+        path to lexicon, possibly compressed
+    encoding: str
+        encoding of the lexicon
+    lexicon_format: Optional[str]
+        one of :data:`FORMATS`, detected automatically if not specified
+    num_workers: int
+        number of processes to parse large uncompressed line-based lexicons with
+
+    Returns
+    -------
+    entries: Iterator[Entry]
+        word, tag and pronunciation (phonemes separated by space) in the order of the file
+    """
+    if lexicon_format is None:
+        lexicon_format = detect_format(path, encoding)
+        logging.info("Detected [{}] format of lexicon [{}]".format(lexicon_format, path))
+    if lexicon_format not in FORMATS:
+        raise ValueError("Unsupported lexicon format [{}], expected one of {}".format(lexicon_format, FORMATS))
+    with get_telemetry().progress("lexicon_parsing/" + os.path.basename(path), unit="entries") as progress:
+        for entry in _read_entries(path, encoding, lexicon_format, num_workers):
+            yield entry
+            progress.update()
+        progress.update(0, os.path.getsize(path))
+
+
+def _read_entries(path: str, encoding: str, lexicon_format: str, num_workers: int) -> Iterator[Entry]:
+    """
+    Helper function that dispatches parsing of the lexicon by format
+    """
+    if lexicon_format == "json":
+        with open_lexicon(path, encoding) as fp:
+            yield from _parse_json(fp)
+    elif num_workers > 1 and get_compression(path) is None and os.path.getsize(path) >= PARALLEL_MIN_SIZE:
+        yield from _parse_parallel(path, encoding, lexicon_format, num_workers)
+    else:
+        # compressed stream can't be split, decompression is sequential anyway
+        with open_lexicon(path, encoding) as fp:
+            yield from _parse_lines(fp, lexicon_format)
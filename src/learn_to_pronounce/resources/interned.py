@@ -0,0 +1,277 @@
+"""
+Copyright 2022 Balacoon
+
+Compact in-package representation of the lexicon.
+Phonemes are interned into integer ids via :class:`PhonemeTable`,
+pronunciations are stored as slices of a single ``array('H')`` pool.
+It takes several times less memory than lists of strings and
+allows to compare pronunciations without splitting strings again and again.
+"""
+
+import array
+import os
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+#: stress and tone marks shipped with the package, ``<mark>\t<id>`` per line
+STRESS_AND_TONE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "stress_and_tone.txt")
+
+
+def _read_marks(path: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Helper function that reads stress marks, which prefix phonemes,
+    and tone marks, which are their suffixes and start with "_"
+    """
+    with open(path, "r", encoding="utf-8") as fp:
+        marks = [x.split("\t")[0] for x in fp if x.strip()]
+    marks = [x for x in marks if x != "<no_stress>"]
+    return tuple(x for x in marks if not x.startswith("_")), tuple(x for x in marks if x.startswith("_"))
+
+
+# stressless comparison drops both, as Pronunciation.to_string(with_stress=False) of balacoon_frontend does
+STRESS_MARKS, TONE_MARKS = _read_marks(STRESS_AND_TONE_PATH)
+_TONES_BY_LENGTH = sorted(TONE_MARKS, key=len, reverse=True)
+
+
+def strip_marks(symbol: str) -> str:
+    """
+    Removes stress and tone marks from phoneme symbol
+    """
+    symbol = symbol.lstrip("".join(STRESS_MARKS))
+    for tone in _TONES_BY_LENGTH:
+        if symbol.endswith(tone) and len(symbol) > len(tone):
+            return symbol[:-len(tone)]
+    return symbol
+
+
+class PhonemeTable:
+    """
+    Bidirectional mapping between phoneme symbols and integer ids.
+    Unknown symbols are added on the fly.
+    """
+
+    MAX_SIZE = 1 << 16  #: ids are stored as uint16
+
+    def __init__(self, symbols: Iterable[str] = ()):
+        """
+        constructor of phoneme table
+
+        Parameters
+        ----------
+        symbols: Iterable[str]
+            initial symbols, id of symbol is its index
+        """
+        self._symbols = []
+        self._ids = {}
+        self._stressless = array.array("H")
+        for symbol in symbols:
+            self.add(symbol)
+
+    @classmethod
+    def from_file(cls, path: str, encoding: str = "utf-8") -> "PhonemeTable":
+        """
+        Reads phoneme table from a file. Supports both list of phonemes (one per line,
+        as ``phonemes`` in resources) and phoneme set with ids (``<symbol>\\t<id>``,
+        as ``data/phonemeset.txt``).
+        """
+        with open(path, encoding=encoding) as fp:
+            lines = [x.strip() for x in fp if x.strip()]
+        pairs = [x.split("\t") for x in lines]
+        if all(len(x) == 2 and x[1].isdigit() for x in pairs):
+            return cls(x[0] for x in sorted(pairs, key=lambda x: int(x[1])))
+        return cls(lines)
+
+    def add(self, symbol: str) -> int:
+        """
+        Adds symbol to the table if it is not there yet
+
+        Returns
+        -------
+        id: int
+            id of the symbol
+        """
+        symbol_id = self._ids.get(symbol)
+        if symbol_id is not None:
+            return symbol_id
+        stressless = strip_marks(symbol)
+        # stressless counterpart is interned first, so it always has an id
+        stressless_id = self.add(stressless) if stressless and stressless != symbol else None
+        symbol_id = len(self._symbols)
+        if symbol_id >= self.MAX_SIZE:
+            raise RuntimeError("Phoneme table can't hold more than {} symbols".format(self.MAX_SIZE))
+        self._symbols.append(symbol)
+        self._ids[symbol] = symbol_id
+        self._stressless.append(symbol_id if stressless_id is None else stressless_id)
+        return symbol_id
+
+    def copy(self) -> "PhonemeTable":
+        """
+        Returns independent copy of the table, symbols keep their ids. Allows to encode
+        pronunciations with unknown symbols without modifying a table shared with other consumers.
+        """
+        table = PhonemeTable()
+        table._symbols = list(self._symbols)
+        table._ids = dict(self._ids)
+        table._stressless = array.array("H", self._stressless)
+        return table
+
+    def encode(self, pronunciation: str) -> array.array:
+        """
+        Converts pronunciation (phonemes separated by space) into array of ids
+        """
+        ids = self._ids
+        result = array.array("H")
+        for phoneme in pronunciation.split():
+            symbol_id = ids.get(phoneme)
+            result.append(self.add(phoneme) if symbol_id is None else symbol_id)
+        return result
+
+    def decode(self, ids: Sequence[int]) -> str:
+        """
+        Converts sequence of ids back into pronunciation string
+        """
+        return " ".join([self._symbols[x] for x in ids])
+
+    def strip_stress(self, ids: Sequence[int]) -> array.array:
+        """
+        Maps ids of stressed or tone-marked phonemes into ids of corresponding phonemes without marks
+        """
+        stressless = self._stressless
+        return array.array("H", [stressless[x] for x in ids])
+
+    def get_symbols(self) -> List[str]:
+        """
+        Returns symbols, index of the symbol is its id
+        """
+        return list(self._symbols)
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+
+class LexiconEntry:
+    """
+    Single pronunciation variant of a word, refers to a slice of phoneme pool
+    """
+
+    __slots__ = ("word", "tag", "start", "end")
+
+    def __init__(self, word: str, tag: str, start: int, end: int):
+        self.word = word
+        self.tag = tag
+        self.start = start
+        self.end = end
+
+
+class InternedLexicon:
+    """
+    Lexicon with pronunciations stored as phoneme ids in a shared pool.
+    Keeps order in which entries were added.
+    """
+
+    def __init__(self, table: PhonemeTable = None):
+        """
+        constructor of interned lexicon
+
+        Parameters
+        ----------
+        table: PhonemeTable
+            table to intern phonemes with. New one is created if not specified
+        """
+        self.table = PhonemeTable() if table is None else table
+        self._pool = array.array("H")
+        self._offsets = array.array("L", [0])  # boundaries of pronunciations in the pool
+        self._entries = []
+        self._words = {}  # word -> indices of its entries
+
+    def add(self, word: str, pronunciation: str, tag: str = ""):
+        """
+        Adds pronunciation variant of the word
+
+        Parameters
+        ----------
+        word: str
+            word to add
+        pronunciation: str
+            phonemes separated by space
+        tag: str
+            optional tag of the pronunciation variant
+        """
+        # reuse the same string object for all the variants of the word
+        indices = self._words.setdefault(word, [])
+        if indices:
+            word = self._entries[indices[0]].word
+        start = len(self._pool)
+        self._pool.extend(self.table.encode(pronunciation))
+        indices.append(len(self._entries))
+        self._entries.append(LexiconEntry(word, tag, start, len(self._pool)))
+        self._offsets.append(len(self._pool))
+
+    def get_ids(self, entry: LexiconEntry) -> array.array:
+        """
+        Returns phoneme ids of the pronunciation variant
+        """
+        return self._pool[entry.start:entry.end]
+
+    def get_pronunciations(self, word: str) -> List[array.array]:
+        """
+        Returns phoneme ids of all pronunciation variants of the word, empty list if there is no such word
+        """
+        return [self.get_ids(self._entries[x]) for x in self._words.get(word, [])]
+
+    def get_pool(self) -> array.array:
+        """
+        Returns phoneme ids of all the pronunciations concatenated, in the order they were added
+        """
+        return self._pool
+
+    def get_offsets(self) -> array.array:
+        """
+        Returns boundaries of pronunciations in the pool: i-th pronunciation
+        occupies ``pool[offsets[i]:offsets[i + 1]]``
+        """
+        return self._offsets
+
+    def get_variant_counts(self) -> List[int]:
+        """
+        Returns number of pronunciation variants per word, in the order of :func:`.get_words`
+        """
+        return [len(x) for x in self._words.values()]
+
+    def get_words(self) -> List[str]:
+        """
+        Returns unique words in the order they were added
+        """
+        return list(self._words.keys())
+
+    def get_entries(self) -> List[LexiconEntry]:
+        """
+        Returns all pronunciation variants in the order they were added
+        """
+        return self._entries
+
+    def iterate(self) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Iterates over words with their pronunciations as strings.
+        Same format as :func:`learn_to_pronounce.resources.provider.get_lexicon_entries`.
+        """
+        for word, indices in self._words.items():
+            yield word, [self.table.decode(self.get_ids(self._entries[x])) for x in indices]
+
+    def get_used_symbols(self) -> List[str]:
+        """
+        Returns phoneme symbols that occur in pronunciations, sorted
+        """
+        symbols = self.table.get_symbols()
+        return sorted(symbols[x] for x in set(self._pool))
+
+    def size(self) -> int:
+        """
+        Returns number of unique words
+        """
+        return len(self._words)
+
+    def get_memory_stats(self) -> Dict[str, int]:
+        """
+        Returns number of entries and size of phoneme pool in bytes
+        """
+        return {"entries": len(self._entries), "pool_bytes": self._pool.itemsize * len(self._pool)}
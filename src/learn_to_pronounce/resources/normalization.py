@@ -0,0 +1,114 @@
+"""
+Copyright 2022 Balacoon
+
+Normalization of FST training data. Words are optionally normalized to a Unicode form and case-folded,
+identical (word, pronunciation) pairs are removed and number of pronunciation
+variants per word can be capped. Pairs are processed in a single pass over data sorted by word,
+so memory is bounded by the number of variants of a single word.
+"""
+
+import unicodedata
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+UNICODE_FORMS = ["NFC", "NFD", "NFKC", "NFKD"]
+
+
+class TrainingDataNormalizer:
+    """
+    Normalizes and deduplicates (word, pronunciation) pairs before FST training,
+    accumulating how many rows were removed
+    """
+
+    def __init__(self, unicode_form: Optional[str] = None, casefold: bool = False, max_variants: int = None):
+        """
+        constructor of training data normalizer
+
+        Parameters
+        ----------
+        unicode_form: Optional[str]
+            Unicode normalization form of words, one of :data:`UNICODE_FORMS`. Words are kept as is if not specified
+        casefold: bool
+            whether to case-fold words, so case variants of a word are merged
+        max_variants: int
+            maximum number of pronunciation variants per word, first ones are kept. Not limited by default
+        """
+        if unicode_form is not None and unicode_form not in UNICODE_FORMS:
+            raise ValueError(
+                "Unknown unicode normalization [{}], expected one of {}".format(unicode_form, UNICODE_FORMS)
+            )
+        self._unicode_form = unicode_form
+        self._casefold = casefold
+        self._max_variants = max_variants
+        self._counts = {"input": 0, "output": 0, "duplicates": 0, "capped": 0, "normalized_words": 0}
+
+    def is_identity(self) -> bool:
+        """
+        Returns True if words are not modified, so data doesn't need to be re-sorted after normalization
+        """
+        return self._unicode_form is None and not self._casefold
+
+    def normalize_word(self, word: str) -> str:
+        """
+        Applies Unicode normalization and case folding to the word
+        """
+        if self._unicode_form is not None:
+            word = unicodedata.normalize(self._unicode_form, word)
+        if self._casefold:
+            word = word.casefold()
+        return word
+
+    def normalize(self, pairs: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        """
+        Normalizes words and whitespace in pronunciations. Order of pairs is kept,
+        but pairs may need to be re-sorted by word afterwards, see :func:`.is_identity`.
+        """
+        counts = self._counts
+        for word, pronunciation in pairs:
+            counts["input"] += 1
+            normalized = self.normalize_word(word)
+            if normalized != word:
+                counts["normalized_words"] += 1
+            yield normalized, " ".join(pronunciation.split())
+
+    def deduplicate(self, pairs: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        """
+        Removes identical pairs and caps number of variants per word
+
+        Parameters
+        ----------
+        pairs: Iterable[Tuple[str, str]]
+            normalized pairs, sorted by word
+
+        Returns
+        -------
+        pairs: Iterator[Tuple[str, str]]
+            unique pairs in the same order
+        """
+        counts = self._counts
+        previous = None
+        # pairs are sorted by word, so only pronunciations of the current word are kept
+        seen = set()
+        for word, pronunciation in pairs:
+            if word != previous:
+                seen.clear()
+                previous = word
+            if pronunciation in seen:
+                counts["duplicates"] += 1
+                continue
+            if self._max_variants is not None and len(seen) >= self._max_variants:
+                counts["capped"] += 1
+                continue
+            seen.add(pronunciation)
+            counts["output"] += 1
+            yield word, pronunciation
+
+    def get_report(self) -> Dict[str, float]:
+        """
+        Returns number of input and output rows, rows removed as duplicates or above the variants cap,
+        number of rows with modified words and fraction of removed rows. Time of alignment and n-gram estimation
+        grows linearly with number of rows, so the fraction estimates saving of training time.
+        """
+        report = dict(self._counts)
+        report["removed"] = report["duplicates"] + report["capped"]
+        report["removed_fraction"] = report["removed"] / float(max(report["input"], 1))
+        return report
@@ -9,10 +9,53 @@ pronunciation resources.
 import logging
 import os
 from abc import ABC, abstractmethod
-from typing import List, Optional, Tuple, Iterable
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 from balacoon_frontend import PronunciationDictionary
 
+from learn_to_pronounce.resources.formats import read_lexicon
+from learn_to_pronounce.resources.interned import InternedLexicon, PhonemeTable
+from learn_to_pronounce.telemetry import get_telemetry
+
+
+def get_lexicon_entries(pd: PronunciationDictionary) -> List[Tuple[str, List[str]]]:
+    """
+    Converts pronunciation dictionary into plain python entries,
+    that can be sent to other processes or stored.
+
+    Parameters
+    ----------
+    pd: PronunciationDictionary
+        lexicon to convert
+
+    Returns
+    -------
+    entries: List[Tuple[str, List[str]]]
+        words with their pronunciations (phonemes separated by space)
+    """
+    return [(word.name(), [pron.to_string() for pron in word.get_pronunciations()]) for word in pd.get_words()]
+
+
+def _iterate_pronunciations(pd: PronunciationDictionary) -> Iterator[Tuple[str, str, str]]:
+    """
+    Helper function that iterates over pronunciation variants of the dictionary as
+    word, empty tag and phonemes
+    """
+    for word, pronunciations in get_lexicon_entries(pd):
+        for pronunciation in pronunciations:
+            yield word, "", pronunciation
+
+
+def lexicon_from_entries(entries: Iterable[Tuple[str, List[str]]]) -> PronunciationDictionary:
+    """
+    Creates pronunciation dictionary from entries obtained with :func:`get_lexicon_entries`
+    """
+    pd = PronunciationDictionary()
+    for word, pronunciations in entries:
+        for pronunciation in pronunciations:
+            pd.add_word(word, pronunciation, tag="")
+    return pd
+
 
 class AbstractProvider(ABC):
     """
@@ -29,6 +72,13 @@ class AbstractProvider(ABC):
         """
         self._resources_dir = resources_dir
 
+    @property
+    def resources_dir(self) -> str:
+        """
+        Directory with pronunciation resources the provider reads from
+        """
+        return self._resources_dir
+
     @abstractmethod
     def get_phonemes(self) -> List[str]:
         """
@@ -73,6 +123,53 @@ class AbstractProvider(ABC):
         """
         pass
 
+    def get_interned_lexicon(self, words: List[str] = None, table: PhonemeTable = None) -> InternedLexicon:
+        """
+        Getter for lexicon in compact in-package representation, see :class:`InternedLexicon`.
+        Default implementation converts :func:`.get_lexicon`, providers may implement faster way.
+
+        Parameters
+        ----------
+        words: List[str] = None
+            If provided, keeps only those words, same as in :func:`.get_lexicon`
+        table: PhonemeTable = None
+            phoneme table to intern phonemes with, new one is created if not provided
+
+        Returns
+        -------
+        lexicon: InternedLexicon
+            parsed lexicon with phonemes interned into ids
+        """
+        lexicon = InternedLexicon(table)
+        for word, pronunciations in get_lexicon_entries(self.get_lexicon(words=words)):
+            for pronunciation in pronunciations:
+                lexicon.add(word, pronunciation)
+        return lexicon
+
+    def iterate_entries(self) -> Iterable[Tuple[str, str, str]]:
+        """
+        Iterates over lexicon entries. Default implementation goes through :func:`.get_lexicon`,
+        providers that can read lexicon without loading it completely should override it.
+
+        Returns
+        -------
+        entries: Iterable[Tuple[str, str, str]]
+            word, tag and phonemes of each pronunciation variant
+        """
+        return _iterate_pronunciations(self.get_lexicon())
+
+    def iterate_train_words(self) -> Optional[Iterable[str]]:
+        """
+        Iterates over words used in training, see :func:`.get_train_words`.
+        Default implementation returns :func:`.get_train_words`.
+
+        Returns
+        -------
+        words: Optional[Iterable[str]]
+            words to train on or None if all the words from lexicon should be used
+        """
+        return self.get_train_words()
+
     @abstractmethod
     def get_spelling_lexicon(self) -> PronunciationDictionary:
         """
@@ -132,6 +229,7 @@ class DefaultProvider(AbstractProvider):
     )
     TRAIN_WORDS = "train_words"  #: name of the file with words to be used for training of pronunciation generation
     TEST_WORDS = "test_words"  #: name of the file with words for evaluation of pronunciation generation
+    PARSE_BATCH_SIZE = 10000  #: number of lexicon lines streamed through ``PronunciationDictionary`` at once
 
     def __init__(self, resources_dir: str, encoding: str = "utf-8"):
         super().__init__(resources_dir)
@@ -197,12 +295,35 @@ class DefaultProvider(AbstractProvider):
         pd: PronunciationDictionary
             pronunciation dictionary object from balacoon_pronunciation_generation
         """
-        if words:
-            words = set(words)
         pd = PronunciationDictionary()
+        for word, tag, phonemes in self.iterate_lexicon(path, words=words):
+            pd.add_word(word, phonemes, tag=tag)
+        return pd
+
+    def iterate_lexicon(self, path: str, words: Iterable[str] = None) -> Iterable[Tuple[str, str, str]]:
+        """
+        Helper function that reads lexicon file line by line, format is same as in :func:`.parse_lexicon`
 
-        with open(path, "r", encoding=self._encoding) as fp:
+        Parameters
+        ----------
+        path: str
+            path to read lexicon from
+        words: Iterable[str]
+            list of words to keep or None to keep all.
+
+        Returns
+        -------
+        entries: Iterable[Tuple[str, str, str]]
+            word, tag and phonemes as returned by :func:`.parse_lexicon_line`
+        """
+        if words:
+            words = set(words)
+        with open(path, "r", encoding=self._encoding) as fp, get_telemetry().progress(
+            "lexicon_parsing/" + os.path.basename(path), unit="lines"
+        ) as progress:
             for line in fp:
+                # characters of the line approximate bytes read
+                progress.update(1, len(line))
                 line = line.strip()
                 if not line:
                     continue
@@ -212,35 +333,111 @@ class DefaultProvider(AbstractProvider):
                     # skip the word, since its not in the list of requested ones
                     continue
 
-                pd.add_word(word, phonemes, tag=tag)
-
-        return pd
+                yield word, tag, phonemes
 
-    def get_lexicon(self, words: List[str] = None) -> PronunciationDictionary:
+    def _get_resource_path(self, file_name: str) -> str:
         """
-        :func:`AbstractProvider.get_lexicon`
+        Helper function that returns path to a file in resources directory, verifying it exists
         """
-        path = os.path.join(self._resources_dir, self.LEXICON_FILE_NAME)
+        path = os.path.join(self._resources_dir, file_name)
         if not os.path.isfile(path):
             raise FileNotFoundError(
                 "{} is not found in {}".format(
-                    self.LEXICON_FILE_NAME, self._resources_dir
+                    file_name, self._resources_dir
                 )
             )
-        return self.parse_lexicon(path, words=words)
+        return path
+
+    def _get_lexicon_path(self) -> str:
+        """
+        Helper function that returns path to lexicon, verifying it exists
+        """
+        return self._get_resource_path(self.LEXICON_FILE_NAME)
+
+    def get_lexicon(self, words: List[str] = None) -> PronunciationDictionary:
+        """
+        :func:`AbstractProvider.get_lexicon`
+        """
+        return self.parse_lexicon(self._get_lexicon_path(), words=words)
+
+    def _reads_lexicon_file(self) -> bool:
+        """
+        Helper function that checks whether lexicon is obtained with :func:`.iterate_lexicon`, so it can be
+        streamed. Subclasses that parse or obtain lexicon in a custom way go through :func:`.get_lexicon`.
+        """
+        cls = type(self)
+        return cls.get_lexicon is DefaultProvider.get_lexicon and cls.parse_lexicon is DefaultProvider.parse_lexicon
+
+    def _parse_batches(self, entries: Iterable[Tuple[str, str, str]]) -> Iterator[Tuple[str, str, str]]:
+        """
+        Helper function that passes entries read from lexicon file through ``PronunciationDictionary``
+        by batches, so pronunciations are validated and formatted the same way as in :func:`.get_lexicon`,
+        while only a batch is held in memory. Batches are split between words, so variants of a word
+        listed together stay together.
+
+        Returns
+        -------
+        entries: Iterator[Tuple[str, str, str]]
+            word, empty tag and phonemes, same as :func:`AbstractProvider.iterate_entries`
+        """
+        pd = PronunciationDictionary()
+        size = 0
+        previous = None
+        for word, tag, phonemes in entries:
+            if size >= self.PARSE_BATCH_SIZE and word != previous:
+                yield from _iterate_pronunciations(pd)
+                pd = PronunciationDictionary()
+                size = 0
+            pd.add_word(word, phonemes, tag=tag)
+            size += 1
+            previous = word
+        if size:
+            yield from _iterate_pronunciations(pd)
+
+    def get_interned_lexicon(self, words: List[str] = None, table: PhonemeTable = None) -> InternedLexicon:
+        """
+        :func:`AbstractProvider.get_interned_lexicon`. Streams lexicon file by batches,
+        without creating ``PronunciationDictionary`` for the whole lexicon.
+        """
+        if not self._reads_lexicon_file():
+            return super().get_interned_lexicon(words=words, table=table)
+        path = self._get_lexicon_path()
+        if table is None:
+            phonemes_path = os.path.join(self._resources_dir, self.PHONEMES_FILE_NAME)
+            table = PhonemeTable.from_file(phonemes_path, self._encoding) if os.path.isfile(phonemes_path) else None
+        lexicon = InternedLexicon(table)
+        for word, _, phonemes in self._parse_batches(self.iterate_lexicon(path, words=words)):
+            lexicon.add(word, phonemes)
+        return lexicon
+
+    def iterate_entries(self) -> Iterable[Tuple[str, str, str]]:
+        """
+        :func:`AbstractProvider.iterate_entries`. Streams lexicon file by batches.
+        """
+        if not self._reads_lexicon_file():
+            return super().iterate_entries()
+        return self._parse_batches(self.iterate_lexicon(self._get_lexicon_path()))
+
+    def iterate_train_words(self) -> Optional[Iterable[str]]:
+        """
+        :func:`AbstractProvider.iterate_train_words`. Reads file with training words line by line.
+        """
+        path = os.path.join(self._resources_dir, self.TRAIN_WORDS)
+        if not os.path.isfile(path):
+            return None
+
+        def read_words() -> Iterable[str]:
+            with open(path, encoding=self._encoding) as fp:
+                for line in fp:
+                    yield line.strip()
+
+        return read_words()
 
     def get_spelling_lexicon(self) -> PronunciationDictionary:
         """
         :func:`AbstractProvider.get_spelling_lexicon`
         """
-        path = os.path.join(self._resources_dir, self.SPELLING_LEXICON_FILE_NAME)
-        if not os.path.isfile(path):
-            raise FileNotFoundError(
-                "{} is not found in {}".format(
-                    self.SPELLING_LEXICON_FILE_NAME, self._resources_dir
-                )
-            )
-        return self.parse_lexicon(path)
+        return self.parse_lexicon(self._get_resource_path(self.SPELLING_LEXICON_FILE_NAME))
 
     def get_phonemes(self) -> List[str]:
         """
@@ -252,18 +449,7 @@ class DefaultProvider(AbstractProvider):
         logging.info(
             "File with phonemes is not available, deriving unique phonemes from lexicon"
         )
-        phonemes = set()
-        pd = self.get_lexicon()
-        words = pd.get_words()
-        # iterate over words in lexicon
-        for word in words:
-            pronunciations = word.get_pronunciations()
-            # iterate over pronunciations of the given word
-            for pron in pronunciations:
-                # iterate over phonemes in the given pronunciation
-                for phone in pron.to_string(delimiter=" ").split():
-                    phonemes.add(phone)
-        return sorted(list(phonemes))
+        return self.get_interned_lexicon().get_used_symbols()
 
     def get_graphemes(self) -> List[str]:
         """
@@ -275,13 +461,9 @@ class DefaultProvider(AbstractProvider):
         logging.info(
             "File with graphemes is not available, deriving unique phonemes from lexicon"
         )
-        letters = set()
-        pd = self.get_lexicon()
-        words = pd.get_words()
-        for word in words:
-            for letter in word.name():
-                letters.add(letter)
-        return sorted(list(letters))
+        from learn_to_pronounce.resources.statistics import count_graphemes
+
+        return sorted(count_graphemes(self.get_interned_lexicon().get_words()))
 
     def get_train_words(self) -> List[str]:
         """
@@ -306,3 +488,125 @@ class DefaultProvider(AbstractProvider):
             "File with words for pronunciation generation evaluation is not available"
         )
         return None
+
+
+class AutoProvider(DefaultProvider):
+    """
+    Resource provider that reads lexicons in any of the common formats: tsv (same as
+    :class:`DefaultProvider`), CMUDict-style or json, possibly compressed with gzip or xz.
+    Format is detected automatically, see :mod:`learn_to_pronounce.resources.formats`.
+    Lexicon file can have an extension, for ex. ``lexicon.json.gz``.
+    """
+
+    EXTENSIONS = ["", ".tsv", ".dict", ".txt", ".json"]  #: extensions of lexicon files that are looked up
+    COMPRESSIONS = ["", ".gz", ".xz"]  #: extensions of compressed lexicon files that are looked up
+
+    def __init__(self, resources_dir: str, encoding: str = "utf-8", num_workers: int = None):
+        """
+        constructor of auto provider
+
+        Parameters
+        ----------
+        resources_dir: str
+            Directory with resources: lexicon, spelling_lexicon, etc
+        encoding: str
+            encoding of resource files
+        num_workers: int
+            number of processes to parse large lexicons with. By default all CPUs are used
+        """
+        super().__init__(resources_dir, encoding=encoding)
+        self._num_workers = os.cpu_count() if num_workers is None else num_workers
+
+    def _get_resource_path(self, file_name: str) -> str:
+        """
+        Helper function that looks up resource file with any of known extensions
+        """
+        for extension in self.EXTENSIONS:
+            for compression in self.COMPRESSIONS:
+                path = os.path.join(self._resources_dir, file_name + extension + compression)
+                if os.path.isfile(path):
+                    return path
+        return super()._get_resource_path(file_name)
+
+    def iterate_lexicon(self, path: str, words: Iterable[str] = None) -> Iterable[Tuple[str, str, str]]:
+        """
+        :func:`DefaultProvider.iterate_lexicon`, but for any of supported formats
+        """
+        if words:
+            words = set(words)
+        for word, tag, phonemes in read_lexicon(path, self._encoding, num_workers=self._num_workers):
+            if words and word not in words:
+                continue
+            yield word, tag, phonemes
+
+    def iterate_entries(self) -> Iterable[Tuple[str, str, str]]:
+        """
+        :func:`AbstractProvider.iterate_entries`. Lexicon is read sequentially, since parallel parsing
+        holds parsed chunks in memory.
+        """
+        if not self._reads_lexicon_file():
+            return super().iterate_entries()
+        return self._parse_batches(read_lexicon(self._get_lexicon_path(), self._encoding, num_workers=1))
+
+
+class CachingProvider(AbstractProvider):
+    """
+    Wraps another provider and memorizes data that is requested by several stages of a run:
+    word lists, grapheme and phoneme inventories and interned lexicons.
+    ``PronunciationDictionary`` objects are not cached, since callers are allowed to modify them.
+    Interned lexicons are shared and should be treated as read-only.
+    """
+
+    def __init__(self, provider: AbstractProvider):
+        """
+        constructor of caching provider
+
+        Parameters
+        ----------
+        provider: AbstractProvider
+            provider to get data from on first request
+        """
+        super().__init__(provider.resources_dir)
+        self._provider = provider
+        self._cache = {}
+
+    def _get_cached(self, key, getter):
+        """
+        Helper function that returns cached value or obtains it with getter
+        """
+        if key not in self._cache:
+            self._cache[key] = getter()
+        return self._cache[key]
+
+    def get_phonemes(self) -> List[str]:
+        return list(self._get_cached("phonemes", self._provider.get_phonemes))
+
+    def get_graphemes(self) -> List[str]:
+        return list(self._get_cached("graphemes", self._provider.get_graphemes))
+
+    def get_lexicon(self, words: List[str] = None) -> PronunciationDictionary:
+        return self._provider.get_lexicon(words=words)
+
+    def get_interned_lexicon(self, words: List[str] = None, table: PhonemeTable = None) -> InternedLexicon:
+        if table is not None:
+            # lexicon interned with a custom table can't be shared
+            return self._provider.get_interned_lexicon(words=words, table=table)
+        key = ("interned_lexicon", frozenset(words) if words else None)
+        return self._get_cached(key, lambda: self._provider.get_interned_lexicon(words=words))
+
+    def iterate_entries(self) -> Iterable[Tuple[str, str, str]]:
+        return self._provider.iterate_entries()
+
+    def iterate_train_words(self) -> Optional[Iterable[str]]:
+        # streaming is used to save memory, so words are not cached
+        return self._provider.iterate_train_words()
+
+    def get_spelling_lexicon(self) -> PronunciationDictionary:
+        return self._provider.get_spelling_lexicon()
+
+    def get_train_words(self) -> List[str]:
+        return list(self._get_cached("train_words", self._provider.get_train_words))
+
+    def get_test_words(self) -> Optional[List[str]]:
+        words = self._get_cached("test_words", self._provider.get_test_words)
+        return None if words is None else list(words)
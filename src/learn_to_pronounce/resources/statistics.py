@@ -0,0 +1,189 @@
+"""
+Copyright 2022 Balacoon
+
+Computes statistics of the lexicon: grapheme and phoneme inventories,
+unigram and bigram frequencies, number of pronunciation variants
+and length histograms. Everything is computed with numpy over
+interned phoneme ids and codepoints of words, without per-symbol python loops.
+Statistics are useful to sanity-check new resources before training.
+"""
+
+import json
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from learn_to_pronounce.resources.interned import InternedLexicon
+
+_WORD_SEPARATOR = "\n"  #: joins words into a single string, never part of a word
+
+
+def _count(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Helper function that returns unique values and their counts, most frequent first
+    """
+    unique, counts = np.unique(values, return_counts=True)
+    order = np.argsort(-counts, kind="stable")
+    return unique[order], counts[order]
+
+
+def _get_codepoints(words: List[str]) -> np.ndarray:
+    """
+    Helper function that converts words into a single array of unicode codepoints,
+    words are separated by ``_WORD_SEPARATOR``
+    """
+    text = _WORD_SEPARATOR.join(words)
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+def _get_offsets(lexicon: InternedLexicon) -> np.ndarray:
+    """
+    Helper function that returns boundaries of pronunciations in the phoneme pool
+    """
+    # offsets are stored as array("L"), numpy has the same type code
+    return np.frombuffer(lexicon.get_offsets(), dtype=np.dtype("L")).astype(np.int64)
+
+
+def count_graphemes(words: List[str]) -> Dict[str, int]:
+    """
+    Counts graphemes (letters) in the words
+
+    Parameters
+    ----------
+    words: List[str]
+        words to count letters in
+
+    Returns
+    -------
+    counts: Dict[str, int]
+        grapheme counts, most frequent first
+    """
+    codepoints = _get_codepoints(words)
+    codepoints = codepoints[codepoints != ord(_WORD_SEPARATOR)]
+    unique, counts = _count(codepoints)
+    return {chr(x): int(c) for x, c in zip(unique, counts)}
+
+
+def count_grapheme_bigrams(words: List[str]) -> Dict[str, int]:
+    """
+    Counts pairs of adjacent graphemes within words
+
+    Returns
+    -------
+    counts: Dict[str, int]
+        bigram counts, most frequent first. Bigram is represented by two concatenated graphemes
+    """
+    codepoints = _get_codepoints(words).astype(np.uint64)
+    separator = ord(_WORD_SEPARATOR)
+    within_word = (codepoints[:-1] != separator) & (codepoints[1:] != separator)
+    codes = (codepoints[:-1] << np.uint64(32)) | codepoints[1:]
+    unique, counts = _count(codes[within_word])
+    return {chr(int(x >> np.uint64(32))) + chr(int(x & np.uint64(0xFFFFFFFF))): int(c) for x, c in zip(unique, counts)}
+
+
+def count_phonemes(lexicon: InternedLexicon) -> Dict[str, int]:
+    """
+    Counts phonemes in all pronunciations of the lexicon
+
+    Returns
+    -------
+    counts: Dict[str, int]
+        phoneme counts, most frequent first
+    """
+    symbols = lexicon.table.get_symbols()
+    pool = np.frombuffer(lexicon.get_pool(), dtype=np.uint16)
+    unique, counts = _count(pool)
+    return {symbols[x]: int(c) for x, c in zip(unique, counts)}
+
+
+def count_phoneme_bigrams(lexicon: InternedLexicon) -> Dict[str, int]:
+    """
+    Counts pairs of adjacent phonemes within pronunciations
+
+    Returns
+    -------
+    counts: Dict[str, int]
+        bigram counts, most frequent first. Bigram is represented by two phonemes separated by space
+    """
+    symbols = lexicon.table.get_symbols()
+    pool = np.frombuffer(lexicon.get_pool(), dtype=np.uint16).astype(np.uint32)
+    if len(pool) < 2:
+        return {}
+    offsets = _get_offsets(lexicon)
+    # pair (i, i + 1) crosses boundary of pronunciations if i + 1 is a start of the next one
+    within = np.ones(len(pool) - 1, dtype=bool)
+    boundaries = offsets[(offsets > 0) & (offsets < len(pool))]
+    within[boundaries - 1] = False
+    codes = (pool[:-1] << np.uint32(16)) | pool[1:]
+    unique, counts = _count(codes[within])
+    return {"{} {}".format(symbols[x >> 16], symbols[x & 0xFFFF]): int(c) for x, c in zip(unique, counts)}
+
+
+def get_statistics(lexicon: InternedLexicon) -> Dict[str, Any]:
+    """
+    Computes statistics of the lexicon
+
+    Parameters
+    ----------
+    lexicon: InternedLexicon
+        lexicon to compute statistics for
+
+    Returns
+    -------
+    statistics: Dict[str, Any]
+        inventories with frequencies, bigram frequencies, histograms of
+        pronunciation variants per word, word lengths (in graphemes) and
+        pronunciation lengths (in phonemes). i-th element of histogram is number of items of size i.
+    """
+    words = lexicon.get_words()
+    offsets = _get_offsets(lexicon)
+    word_lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+    variants = np.asarray(lexicon.get_variant_counts(), dtype=np.int64)
+    pronunciation_lengths = np.diff(offsets)
+    return {
+        "words": len(words),
+        "pronunciations": len(pronunciation_lengths),
+        "graphemes": count_graphemes(words),
+        "grapheme_bigrams": count_grapheme_bigrams(words),
+        "phonemes": count_phonemes(lexicon),
+        "phoneme_bigrams": count_phoneme_bigrams(lexicon),
+        "variants_histogram": np.bincount(variants).tolist(),
+        "word_length_histogram": np.bincount(word_lengths).tolist(),
+        "pronunciation_length_histogram": np.bincount(pronunciation_lengths).tolist(),
+    }
+
+
+def check_inventory(name: str, expected: List[str], observed: Dict[str, int]) -> List[str]:
+    """
+    Compares inventory of symbols declared in resources with symbols observed in the lexicon
+
+    Parameters
+    ----------
+    name: str
+        name of the inventory, used in messages
+    expected: List[str]
+        declared symbols, for ex. from ``graphemes`` file
+    observed: Dict[str, int]
+        counts of symbols observed in lexicon
+
+    Returns
+    -------
+    issues: List[str]
+        human-readable descriptions of mismatches, empty if inventories match
+    """
+    issues = []
+    unknown = sorted(set(observed) - set(expected))
+    if unknown:
+        issues.append("{} in lexicon but not in inventory: {}".format(name, " ".join(unknown)))
+    unused = sorted(set(expected) - set(observed))
+    if unused:
+        issues.append("{} in inventory but never used in lexicon: {}".format(name, " ".join(unused)))
+    return issues
+
+
+def save_statistics(statistics: Dict[str, Any], path: str):
+    """
+    Stores statistics as json
+    """
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(statistics, fp, indent=2, ensure_ascii=False)
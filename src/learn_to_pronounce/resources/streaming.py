@@ -0,0 +1,210 @@
+"""
+Copyright 2022 Balacoon
+
+Memory-bounded processing of large lexicons. Lines are sorted externally:
+runs that fit into memory budget are sorted and spilled to temporary files, which are merged.
+Training data for FST is prepared by merge-joining sorted lexicon with sorted list of training words,
+so neither lexicon nor word list is loaded into memory.
+"""
+
+import heapq
+import itertools
+import os
+import sys
+import tempfile
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from learn_to_pronounce.resources.normalization import TrainingDataNormalizer
+from learn_to_pronounce.telemetry import get_telemetry
+
+MIN_RUN_SIZE = 1000  #: minimal number of lines in a sorted run, so tiny budgets don't produce a file per line
+
+
+def _line_size(line: str) -> int:
+    # string object and a slot in the list holding the run
+    return sys.getsizeof(line) + 8
+
+
+def _read_run(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as fp:
+        for line in fp:
+            yield line[:-1]
+
+
+def external_sort(
+    lines: Iterable[str], max_memory: int, key: Callable[[str], str] = None, temp_dir: str = None
+) -> Iterator[str]:
+    """
+    Sorts lines, spilling sorted runs to disk when they exceed memory budget.
+    Sorting is stable: lines with equal keys keep their input order.
+
+    Parameters
+    ----------
+    lines: Iterable[str]
+        lines to sort, without line breaks
+    max_memory: int
+        approximate number of bytes that lines of a single run can occupy in memory
+    key: Callable[[str], str]
+        function extracting comparison key from a line, line itself is compared by default
+    temp_dir: str
+        directory to create temporary files in, system default if not specified
+
+    Returns
+    -------
+    lines: Iterator[str]
+        sorted lines
+    """
+    with tempfile.TemporaryDirectory(dir=temp_dir) as runs_dir:
+        run_paths = []
+        run = []
+        run_size = 0
+
+        def spill():
+            run.sort(key=key)
+            path = os.path.join(runs_dir, "run_{}".format(len(run_paths)))
+            with open(path, "w", encoding="utf-8") as fp:
+                fp.writelines(x + "\n" for x in run)
+            run_paths.append(path)
+            run.clear()
+
+        for line in lines:
+            run.append(line)
+            run_size += _line_size(line)
+            if run_size >= max_memory and len(run) >= MIN_RUN_SIZE:
+                spill()
+                run_size = 0
+        if not run_paths:
+            # everything fits into memory
+            run.sort(key=key)
+            yield from run
+            return
+        if run:
+            spill()
+        # ties are resolved by order of runs, which keeps sorting stable
+        yield from heapq.merge(*[_read_run(x) for x in run_paths], key=key)
+
+
+def _word_key(line: str) -> str:
+    return line.split("\t", 1)[0]
+
+
+def _unique(lines: Iterator[str]) -> Iterator[str]:
+    previous = None
+    for line in lines:
+        if line != previous:
+            yield line
+        previous = line
+
+
+def merge_join(lines: Iterator[str], words: Iterator[str]) -> Iterator[str]:
+    """
+    Keeps lexicon lines, word of which is present in the list of words
+
+    Parameters
+    ----------
+    lines: Iterator[str]
+        lexicon lines ``<word>\\t...`` sorted by word
+    words: Iterator[str]
+        unique sorted words
+
+    Returns
+    -------
+    lines: Iterator[str]
+        lines of requested words, in the original order
+    """
+    word = next(words, None)
+    for line in lines:
+        line_word = _word_key(line)
+        while word is not None and word < line_word:
+            word = next(words, None)
+        if word is None:
+            return
+        if word == line_word:
+            yield line
+
+
+def dump_training_data(
+    entries: Iterable[Tuple[str, str]],
+    path: str,
+    max_memory: int,
+    words: Optional[Iterable[str]] = None,
+    temp_dir: str = None,
+    normalizer: TrainingDataNormalizer = None,
+) -> Tuple[int, int]:
+    """
+    Stores lexicon entries in format suitable for FST training, same as
+    :func:`learn_to_pronounce.fst.fst_trainer.dump_training_entries` does, but with bounded memory.
+    Entries are sorted by word, pronunciations of a word keep their order.
+
+    Parameters
+    ----------
+    entries: Iterable[Tuple[str, str]]
+        word and pronunciation (phonemes separated by space) per pronunciation variant
+    path: str
+        path to store training data to
+    max_memory: int
+        approximate memory budget in bytes, shared by sorting of entries and words
+    words: Optional[Iterable[str]]
+        words to keep, all entries are stored if not provided or empty
+    temp_dir: str
+        directory for temporary files
+    normalizer: TrainingDataNormalizer
+        if provided, entries are normalized and deduplicated after they are filtered by words
+
+    Returns
+    -------
+    num_words: int
+        number of unique words stored
+    num_pronunciations: int
+        number of stored lines
+    """
+    # each of the sorts holds at most one in-memory run simultaneously
+    resort = normalizer is not None and not normalizer.is_identity()
+    budget = max_memory // (3 if resort else 2)
+    lines = ("{}\t{}".format(word, pronunciation) for word, pronunciation in entries)
+    lines = external_sort(lines, budget, key=_word_key, temp_dir=temp_dir)
+    # words may be a generator, which is truthy even if empty, so check the first word explicitly
+    words = iter(() if words is None else words)
+    first_word = next(words, None)
+    if first_word is not None:
+        words = itertools.chain([first_word], words)
+        lines = merge_join(lines, _unique(external_sort(words, budget, temp_dir=temp_dir)))
+    if normalizer is not None:
+        pairs = normalizer.normalize(tuple(x.split("\t", 1)) for x in lines)
+        lines = ("{}\t{}".format(word, pronunciation) for word, pronunciation in pairs)
+        if resort:
+            # normalized words may change their order
+            lines = external_sort(lines, budget, key=_word_key, temp_dir=temp_dir)
+        pairs = normalizer.deduplicate(tuple(x.split("\t", 1)) for x in lines)
+        lines = ("{}\t{}".format(word, pronunciation) for word, pronunciation in pairs)
+    num_words = 0
+    num_pronunciations = 0
+    previous = None
+    with open(path, "w", encoding="utf-8") as fp, get_telemetry().progress(
+        "training_data/" + os.path.basename(path), unit="pronunciations"
+    ) as progress:
+        for line in lines:
+            fp.write(line + "\n")
+            progress.update(1, len(line) + 1)
+            word = _word_key(line)
+            num_words += word != previous
+            num_pronunciations += 1
+            previous = word
+    return num_words, num_pronunciations
+
+
+def get_peak_memory() -> Dict[str, float]:
+    """
+    Returns peak resident memory of current process and of its finished children
+    (for ex. phonetisaurus binaries) in megabytes. Empty on platforms without ``resource`` module.
+    """
+    try:
+        import resource
+    except ImportError:
+        return {}
+    # ru_maxrss is in kilobytes on linux, bytes on macOS
+    scale = 1.0 / (1 << 20) if sys.platform == "darwin" else 1.0 / (1 << 10)
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
@@ -0,0 +1,90 @@
+"""
+Copyright 2022 Balacoon
+
+Serves pronunciation generation with created addon.
+Protocol is json lines over TCP or Unix socket:
+request ``{"word": "hello", "spelling": false}`` is answered with
+``{"word": "hello", "pronunciation": "h @ l \"o U"}``.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+
+from balacoon_frontend import PronunciationManager
+
+from learn_to_pronounce.serving.cache import PronunciationCache
+from learn_to_pronounce.serving.service import PronunciationService
+
+
+def parse_args():
+    ap = argparse.ArgumentParser("Serves pronunciation generation with addon over json-lines protocol.")
+    ap.add_argument(
+        "--addon",
+        required=True,
+        help="Path to pronunciation addon (work_dir/pronunciation.addon",
+    )
+    ap.add_argument(
+        "--locale",
+        default="",
+        help="If addon has multiple pronunciation fields sections, disambiguate one to use, by providing locale",
+    )
+    ap.add_argument("--host", default="127.0.0.1", help="Host to listen on")
+    ap.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+    ap.add_argument("--unix-socket", help="If specified, listen on Unix socket instead of TCP")
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="Number of worker threads generating pronunciations. Each thread loads its own copy of the addon, "
+        "so memory grows linearly with number of workers",
+    )
+    ap.add_argument("--batch-size", type=int, default=32, help="Maximum number of words in a batch")
+    ap.add_argument(
+        "--batch-delay", type=float, default=0.002, help="Maximum time in seconds to wait for batch to fill up"
+    )
+    ap.add_argument("--cache-size", type=int, default=100000, help="Number of results to cache, 0 disables cache")
+    ap.add_argument(
+        "--cache-path",
+        help="If specified, cached pronunciations are restored from this file on start and stored on stop",
+    )
+    args = ap.parse_args()
+    return args
+
+
+async def serve(args: argparse.Namespace):
+    cache = PronunciationCache(capacity=args.cache_size, locale=args.locale)
+    if args.cache_path and os.path.isfile(args.cache_path):
+        cache.load(args.cache_path)
+    service = PronunciationService(
+        lambda: PronunciationManager(args.addon, args.locale),
+        workers=args.workers,
+        batch_size=args.batch_size,
+        batch_delay=args.batch_delay,
+        cache=cache,
+    )
+    await service.start()
+    if args.unix_socket:
+        server = await asyncio.start_unix_server(service.handle_connection, path=args.unix_socket)
+        logging.info("Serving [{}] on [{}]".format(args.addon, args.unix_socket))
+    else:
+        server = await asyncio.start_server(service.handle_connection, host=args.host, port=args.port)
+        logging.info("Serving [{}] on {}:{}".format(args.addon, args.host, args.port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+        cache.log_stats()
+        if args.cache_path:
+            cache.save(args.cache_path)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        logging.info("Stopped")
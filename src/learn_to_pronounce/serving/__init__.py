@@ -0,0 +1,23 @@
+"""
+Serving
+=======
+Utilities to serve pronunciation generation with a built addon.
+``serve_pronounce`` script exposes addon via asyncio-based json-lines protocol
+over TCP or Unix socket, ``load_pronounce`` generates load for it and
+reports throughput and latency. ``benchmark_spelling`` compares bulk spelling
+with :class:`BatchSpeller` against spelling tokens one by one.
+
+.. autosummary::
+    :toctree: generated/
+    :nosignatures:
+    :template: class.rst
+
+    PronunciationService
+    PronunciationCache
+    BatchSpeller
+
+"""
+
+from learn_to_pronounce.serving.cache import PronunciationCache
+from learn_to_pronounce.serving.service import PronunciationService
+from learn_to_pronounce.serving.spelling import BatchSpeller
@@ -0,0 +1,195 @@
+"""
+Copyright 2022 Balacoon
+
+LRU cache in front of pronunciation generation
+"""
+
+import json
+import logging
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+
+class PronunciationCache:
+    """
+    Bounded LRU cache of generated pronunciations. Real traffic is highly repetitive,
+    so caching saves lexicon look ups and, more importantly, FST decoding of out-of-vocabulary words.
+    Entries are keyed by locale, kind of generation (pronunciation or spelling) and normalized word.
+    Cache tracks hits, misses and evictions, hot set can be persisted to disk for warm restarts.
+    """
+
+    def __init__(self, capacity: int = 100000, locale: str = "", casefold: bool = False):
+        """
+        constructor of pronunciation cache
+
+        Parameters
+        ----------
+        capacity: int
+            maximum number of entries in cache, 0 disables caching
+        locale: str
+            default locale of the cached pronunciations
+        casefold: bool
+            whether words differing only by case share an entry. Disabled by default,
+            since case can affect pronunciation (acronyms).
+        """
+        self._capacity = capacity
+        self._locale = locale
+        self._casefold = casefold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _key(self, word: str, kind: str, locale: Optional[str]) -> Tuple[str, str, str]:
+        word = unicodedata.normalize("NFC", word.strip())
+        if self._casefold:
+            word = word.casefold()
+        return self._locale if locale is None else locale, kind, word
+
+    def lookup(self, word: str, kind: str = "pronunciation", locale: str = None) -> Optional[str]:
+        """
+        Looks up pronunciation in cache, updates hit/miss counters
+
+        Parameters
+        ----------
+        word: str
+            word to look up
+        kind: str
+            kind of generation: "pronunciation" or "spelling"
+        locale: str
+            locale of the pronunciation, default locale of cache if not specified
+
+        Returns
+        -------
+        pronunciation: Optional[str]
+            cached pronunciation or None
+        """
+        key = self._key(word, kind, locale)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, word: str, pronunciation: str, kind: str = "pronunciation", locale: str = None):
+        """
+        Puts pronunciation to cache, evicting least recently used entry if cache is full.
+        Arguments are same as in :func:`lookup`.
+        """
+        if not self._capacity:
+            return
+        key = self._key(word, kind, locale)
+        with self._lock:
+            self._entries[key] = pronunciation
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._capacity:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def get(
+        self, word: str, generate: Callable[[str], str], kind: str = "pronunciation", locale: str = None
+    ) -> str:
+        """
+        Returns cached pronunciation or generates and caches it
+
+        Parameters
+        ----------
+        word: str
+            word to get pronunciation for
+        generate: Callable[[str], str]
+            pronunciation generation, for ex. addon look up with FST fallback
+        kind: str
+            kind of generation: "pronunciation" or "spelling"
+        locale: str
+            locale of the pronunciation, default locale of cache if not specified
+
+        Returns
+        -------
+        pronunciation: str
+            pronunciation of the word
+        """
+        pronunciation = self.lookup(word, kind=kind, locale=locale)
+        if pronunciation is None:
+            pronunciation = generate(word)
+            self.put(word, pronunciation, kind=kind, locale=locale)
+        return pronunciation
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Returns cache counters
+
+        Returns
+        -------
+        stats: Dict[str, float]
+            hits, misses, evictions, current size, capacity and hit rate
+        """
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "size": len(self._entries),
+                "capacity": self._capacity,
+                "hit_rate": self._hits / float(requests) if requests else 0.0,
+            }
+
+    def log_stats(self):
+        """
+        Logs cache counters
+        """
+        logging.info(
+            "Pronunciation cache: {hits} hits, {misses} misses, {evictions} evictions, "
+            "{size}/{capacity} entries, hit rate {hit_rate:.3f}".format(**self.get_stats())
+        )
+
+    def save(self, path: str):
+        """
+        Stores cached entries to disk in LRU order, so hot set can be restored on restart.
+        File is replaced atomically.
+
+        Parameters
+        ----------
+        path: str
+            path to json file to store entries to
+        """
+        with self._lock:
+            entries = [[locale, kind, word, value] for (locale, kind, word), value in self._entries.items()]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(entries, fp, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        """
+        Restores cached entries stored with :func:`save`.
+        If capacity is smaller than number of stored entries, most recently used ones are kept.
+        Counters are not affected.
+
+        Parameters
+        ----------
+        path: str
+            path to json file with stored entries
+        """
+        with open(path, "r", encoding="utf-8") as fp:
+            entries = json.load(fp)
+        if not self._capacity:
+            return
+        with self._lock:
+            for locale, kind, word, value in entries[-self._capacity:]:
+                key = (locale, kind, word)
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self._capacity:
+                self._entries.popitem(last=False)
+        logging.info("Restored {} cached pronunciations from [{}]".format(len(self._entries), path))
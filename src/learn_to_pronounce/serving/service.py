@@ -0,0 +1,265 @@
+"""
+Copyright 2022 Balacoon
+
+Asyncio service that generates pronunciations with an addon.
+Requests are batched and executed in a pool of worker threads,
+so event loop is never blocked by pronunciation generation.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from learn_to_pronounce.serving.cache import PronunciationCache
+
+
+def pronunciation_to_string(result: Any) -> str:
+    """
+    Converts result of ``PronunciationManager`` into a string
+
+    Parameters
+    ----------
+    result: Any
+        pronunciation, list of pronunciations or string
+
+    Returns
+    -------
+    pronunciation: str
+        phonemes separated by space
+    """
+    if isinstance(result, (list, tuple)):
+        return " ".join(pronunciation_to_string(x) for x in result)
+    if hasattr(result, "to_string"):
+        return result.to_string()
+    return str(result)
+
+
+class PronunciationService:
+    """
+    Generates pronunciations for incoming requests.
+    Requests are accumulated into batches (up to ``batch_size`` or
+    until ``batch_delay`` elapses) which are processed in a thread pool.
+    Each worker thread creates its own pronunciation manager, so C++ objects
+    are never shared between threads. Thread-safety of ``PronunciationManager`` is not
+    guaranteed, so addon is loaded once per worker and memory grows linearly with ``workers``.
+    Results are kept in :class:`PronunciationCache`.
+    """
+
+    def __init__(
+        self,
+        manager_factory: Callable[[], Any],
+        workers: int = 2,
+        batch_size: int = 32,
+        batch_delay: float = 0.002,
+        cache: PronunciationCache = None,
+    ):
+        """
+        constructor of pronunciation service
+
+        Parameters
+        ----------
+        manager_factory: Callable[[], Any]
+            creates an object with ``get_pronunciation`` and ``get_spelling``
+            methods, i.e. ``PronunciationManager`` with loaded addon.
+            Called once per worker thread, so addon is loaded ``workers`` times.
+        workers: int
+            number of worker threads
+        batch_size: int
+            maximum number of words processed in one batch
+        batch_delay: float
+            maximum time in seconds to wait for the batch to fill up
+        cache: PronunciationCache
+            cache for generated pronunciations, no caching if not specified
+        """
+        self._manager_factory = manager_factory
+        self._workers = workers
+        self._batch_size = batch_size
+        self._batch_delay = batch_delay
+        self._cache = cache
+        self._local = threading.local()
+        self._executor = None
+        self._queue = None
+        self._batchers = []
+
+    async def start(self):
+        """
+        Starts worker pool and batching tasks. Should be called from running event loop.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="pronounce")
+        self._queue = asyncio.Queue()
+        self._batchers = [asyncio.ensure_future(self._batch_loop()) for _ in range(self._workers)]
+
+    async def stop(self):
+        """
+        Stops batching tasks and worker pool
+        """
+        for batcher in self._batchers:
+            batcher.cancel()
+        await asyncio.gather(*self._batchers, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+
+    def _get_manager(self) -> Any:
+        """
+        Returns pronunciation manager of the current worker thread
+        """
+        if not hasattr(self._local, "manager"):
+            self._local.manager = self._manager_factory()
+        return self._local.manager
+
+    def _process_batch(self, batch: List[Tuple[str, bool]]) -> List[Any]:
+        """
+        Generates pronunciations for the batch of words. Executed in a worker thread.
+        Failure of a single word doesn't affect other words in the batch:
+        exception is returned in place of its pronunciation.
+        """
+        manager = self._get_manager()
+        results = []
+        for word, spelling in batch:
+            try:
+                if spelling:
+                    results.append(pronunciation_to_string(manager.get_spelling(word)))
+                else:
+                    results.append(pronunciation_to_string(manager.get_pronunciation(word)))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def _collect_batch(self) -> List[Tuple[str, bool, asyncio.Future]]:
+        """
+        Waits for a request and collects more of them until batch is full or ``batch_delay`` elapses
+        """
+        loop = asyncio.get_event_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self._batch_delay
+        while len(batch) < self._batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _dispatch(self, batch: List[Tuple[str, bool, asyncio.Future]], results: List[Any]):
+        """
+        Resolves futures of requests with generated pronunciations or exceptions
+        """
+        for (word, spelling, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                self._fill_cache(word, spelling, result)
+                future.set_result(result)
+
+    async def _batch_loop(self):
+        """
+        Collects requests from the queue into batches and sends them to worker pool
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self._collect_batch()
+            requests = [(word, spelling) for word, spelling, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self._process_batch, requests)
+            except Exception as e:
+                results = [e] * len(batch)
+            self._dispatch(batch, results)
+
+    @staticmethod
+    def _kind(spelling: bool) -> str:
+        return "spelling" if spelling else "pronunciation"
+
+    def _lookup_cache(self, word: str, spelling: bool) -> Optional[str]:
+        """
+        Returns cached pronunciation of the word or None
+        """
+        if self._cache is None:
+            return None
+        return self._cache.lookup(word, kind=self._kind(spelling))
+
+    def _fill_cache(self, word: str, spelling: bool, pronunciation: str):
+        """
+        Stores generated pronunciation in cache, if there is one
+        """
+        if self._cache is not None:
+            self._cache.put(word, pronunciation, kind=self._kind(spelling))
+
+    async def pronounce(self, word: str, spelling: bool = False) -> str:
+        """
+        Generates pronunciation of the word
+
+        Parameters
+        ----------
+        word: str
+            word to get pronunciation for
+        spelling: bool
+            whether to spell the word letter by letter instead
+
+        Returns
+        -------
+        pronunciation: str
+            phonemes separated by space
+        """
+        cached = self._lookup_cache(word, spelling)
+        if cached is not None:
+            return cached
+        future = asyncio.get_event_loop().create_future()
+        await self._queue.put((word, spelling, future))
+        return await future
+
+    async def _handle_request(self, line: bytes) -> dict:
+        """
+        Processes single line of the protocol: json with "word" and optional "spelling".
+        Request ``{"stats": true}`` returns cache counters instead.
+        """
+        try:
+            request = json.loads(line)
+            if isinstance(request, dict) and request.get("stats"):
+                return {"cache": self._cache.get_stats() if self._cache is not None else None}
+            word = request["word"]
+            spelling = bool(request.get("spelling", False))
+        except (ValueError, KeyError, TypeError):
+            return {"error": "expected json with \"word\" field"}
+        if not word:
+            return {"word": word, "error": "no pronunciation for empty string"}
+        try:
+            return {"word": word, "pronunciation": await self.pronounce(word, spelling)}
+        except Exception as e:
+            logging.exception("Failed to generate pronunciation for [{}]".format(word))
+            return {"word": word, "error": str(e)}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves a client connection. Protocol is json lines: each request line is answered
+        with a response line, responses come in the order of requests.
+        Requests from a single connection are processed concurrently.
+        """
+        pending = asyncio.Queue()
+
+        async def respond():
+            while True:
+                task = await pending.get()
+                if task is None:
+                    break
+                writer.write(json.dumps(await task, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+
+        responder = asyncio.ensure_future(respond())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    await pending.put(asyncio.ensure_future(self._handle_request(line)))
+            await pending.put(None)
+            await responder
+        finally:
+            responder.cancel()
+            writer.close()
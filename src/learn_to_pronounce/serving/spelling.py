@@ -0,0 +1,138 @@
+"""
+Copyright 2022 Balacoon
+
+Bulk spelling of tokens (acronyms, codes). Pronunciation of each letter is generated
+once with ``PronunciationManager.get_spelling`` (spelling lexicon, falling back to spelling FST)
+and cached, so spelling a token is a concatenation of cached pronunciations of its letters.
+Running as a script benchmarks bulk spelling against spelling word by word.
+"""
+
+import argparse
+import logging
+import time
+from typing import Any, Dict, Iterable, List
+
+from learn_to_pronounce.serving.service import pronunciation_to_string
+
+
+class BatchSpeller:
+    """
+    Spells batches of tokens letter by letter with cached pronunciations of letters.
+    Letters are added to the cache on first occurrence.
+    """
+
+    def __init__(self, manager: Any, letters: Iterable[str] = ()):
+        """
+        constructor of batch speller
+
+        Parameters
+        ----------
+        manager: Any
+            object with ``get_spelling`` method, i.e. ``PronunciationManager`` with loaded addon
+        letters: Iterable[str]
+            letters to pre-compute pronunciations for, for ex. graphemes of the locale
+        """
+        self._manager = manager
+        self._letters = {}
+        self.add_letters(letters)
+
+    def add_letters(self, letters: Iterable[str]):
+        """
+        Pre-computes pronunciations of letters that are not cached yet
+        """
+        for letter in letters:
+            if letter not in self._letters:
+                self._letters[letter] = pronunciation_to_string(self._manager.get_spelling(letter))
+
+    def get_letters(self) -> Dict[str, str]:
+        """
+        Returns cached pronunciations of letters
+        """
+        return dict(self._letters)
+
+    def spell(self, token: str) -> str:
+        """
+        Spells a single token
+
+        Parameters
+        ----------
+        token: str
+            token to spell
+
+        Returns
+        -------
+        pronunciation: str
+            pronunciations of the letters separated by space
+        """
+        letters = self._letters
+        try:
+            return " ".join([letters[x] for x in token])
+        except KeyError:
+            self.add_letters(token)
+            return " ".join([letters[x] for x in token])
+
+    def spell_batch(self, tokens: List[str]) -> List[str]:
+        """
+        Spells batch of tokens. Letters of the whole batch are pre-computed at once,
+        then tokens are spelled with cached pronunciations only.
+
+        Parameters
+        ----------
+        tokens: List[str]
+            tokens to spell
+
+        Returns
+        -------
+        pronunciations: List[str]
+            spelling of each token
+        """
+        self.add_letters(set("".join(tokens)))
+        letters = self._letters
+        return [" ".join([letters[x] for x in token]) for token in tokens]
+
+
+def parse_args():
+    ap = argparse.ArgumentParser("Benchmarks bulk spelling of tokens against spelling them one by one.")
+    ap.add_argument("--addon", required=True, help="Path to pronunciation addon (work_dir/pronunciation.addon)")
+    ap.add_argument("--locale", default="", help="Locale to disambiguate pronunciation section of the addon")
+    ap.add_argument("--tokens", required=True, help="File with tokens to spell, one per line")
+    ap.add_argument("--batch-size", type=int, default=1024, help="Number of tokens spelled in one batch")
+    args = ap.parse_args()
+    return args
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+
+    from balacoon_frontend import PronunciationManager
+
+    with open(args.tokens, "r", encoding="utf-8") as fp:
+        tokens = [x.strip() for x in fp if x.strip()]
+    pm = PronunciationManager(args.addon, args.locale)
+
+    start = time.perf_counter()
+    reference = [pronunciation_to_string(pm.get_spelling(x)) for x in tokens]
+    per_word_time = time.perf_counter() - start
+
+    speller = BatchSpeller(pm)
+    start = time.perf_counter()
+    spelled = []
+    for i in range(0, len(tokens), args.batch_size):
+        spelled.extend(speller.spell_batch(tokens[i:i + args.batch_size]))
+    batch_time = time.perf_counter() - start
+
+    # bulk spelling matches per-word spelling only if spelling model spells letter by letter
+    mismatches = [(x, r, s) for x, r, s in zip(tokens, reference, spelled) if r != s]
+    for token, ref, hyp in mismatches[:10]:
+        logging.warning("Spelling of [{}] differs: [{}] vs [{}]".format(token, ref, hyp))
+    logging.info(
+        "{} tokens, {} letters. Per word: {:.0f} tokens/s; bulk: {:.0f} tokens/s ({:.1f}x). Agreement,% {:.2f}".format(
+            len(tokens),
+            len(speller.get_letters()),
+            len(tokens) / max(per_word_time, 1e-9),
+            len(tokens) / max(batch_time, 1e-9),
+            per_word_time / max(batch_time, 1e-9),
+            100.0 * (len(tokens) - len(mismatches)) / max(len(tokens), 1),
+        )
+    )
@@ -0,0 +1,411 @@
+"""
+Copyright 2022 Balacoon
+
+Progress and throughput telemetry of long-running stages. Stages report progress
+(processed units, bytes) to :class:`Telemetry`, which periodically emits events with rate and ETA
+to pluggable sinks: console, JSON-lines file and Prometheus text-format file
+(suitable for node_exporter textfile collector). Without sinks reporting is a no-op.
+Worker processes don't write to sinks inherited from the parent, they forward events
+to the parent process, see :func:`forward_from_workers`.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SINKS = ["console", "jsonl", "prometheus"]  #: names of sinks that can be configured from command line
+METRIC_PREFIX = "learn_to_pronounce_"
+
+
+class ConsoleSink:
+    """
+    Prints events to console
+    """
+
+    def emit(self, event: Dict[str, Any]):
+        message = "[{}] {} {}".format(event["stage"], event["done"], event["unit"])
+        if event["total"]:
+            message += "/{} ({:.1f}%)".format(event["total"], 100.0 * event["done"] / event["total"])
+        if event["bytes"]:
+            message += ", {:.1f}MB".format(event["bytes"] / float(1 << 20))
+        message += ", {:.1f} {}/s, elapsed {:.0f}s".format(event["rate"], event["unit"], event["elapsed"])
+        if event["eta"] is not None and not event["finished"]:
+            message += ", ETA {:.0f}s".format(event["eta"])
+        if event["finished"]:
+            message += ", finished"
+        logging.info(message)
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    """
+    Appends events to a JSON-lines file, one event per line
+    """
+
+    def __init__(self, path: str):
+        self._fp = open(path, "a", encoding="utf-8")
+
+    def emit(self, event: Dict[str, Any]):
+        self._fp.write(json.dumps(event) + "\n")
+        self._fp.flush()
+
+    def close(self):
+        self._fp.close()
+
+
+class PrometheusSink:
+    """
+    Keeps the latest state of each stage in a Prometheus text-format file.
+    File is replaced atomically, so scrapers never read a partial file.
+    """
+
+    #: event field -> (metric name, help)
+    METRICS = {
+        "done": ("progress_done", "Units processed by the stage"),
+        "total": ("progress_total", "Units to process by the stage, 0 if unknown"),
+        "bytes": ("progress_bytes", "Bytes processed by the stage"),
+        "rate": ("progress_rate", "Units processed per second"),
+        "eta": ("progress_eta_seconds", "Estimated time till the end of the stage, -1 if unknown"),
+        "elapsed": ("progress_elapsed_seconds", "Time since the stage started"),
+        "finished": ("progress_finished", "Whether the stage is finished"),
+        "time": ("progress_last_update_timestamp_seconds", "Time of the last progress update"),
+    }
+
+    def __init__(self, path: str):
+        self._path = path
+        self._stages = {}
+
+    def emit(self, event: Dict[str, Any]):
+        self._stages[event["stage"]] = event
+        lines = []
+        for field, (name, description) in self.METRICS.items():
+            lines.append("# HELP {}{} {}".format(METRIC_PREFIX, name, description))
+            lines.append("# TYPE {}{} gauge".format(METRIC_PREFIX, name))
+            for stage, stage_event in self._stages.items():
+                value = stage_event[field]
+                if value is None:
+                    value = -1 if field == "eta" else 0
+                lines.append(
+                    '{}{}{{stage="{}",unit="{}"}} {}'.format(
+                        METRIC_PREFIX, name, stage, stage_event["unit"], float(value)
+                    )
+                )
+        # several processes may write the same file, each one uses its own temporary file
+        tmp_path = "{}.{}.tmp".format(self._path, os.getpid())
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            fp.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self._path)
+
+    def close(self):
+        pass
+
+
+class QueueSink:
+    """
+    Sends events to a queue. Used in worker processes to forward events to the parent process
+    """
+
+    def __init__(self, queue: Any):
+        self._queue = queue
+
+    def emit(self, event: Dict[str, Any]):
+        self._queue.put(event)
+
+    def close(self):
+        pass
+
+
+class Progress:
+    """
+    Progress of a single stage. Updates are cheap, events are emitted
+    to telemetry not more often than its interval and when progress is closed.
+    """
+
+    def __init__(self, telemetry: "Telemetry", stage: str, total: Optional[int] = None, unit: str = "items"):
+        self._telemetry = telemetry
+        self.stage = stage
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.bytes = 0
+        self._start = time.monotonic()
+        self._last_emit = self._start
+        self._finished = False
+
+    def update(self, count: int = 1, num_bytes: int = 0):
+        """
+        Accounts processed units and bytes
+
+        Parameters
+        ----------
+        count: int
+            number of processed units
+        num_bytes: int
+            number of processed bytes
+        """
+        self.done += count
+        self.bytes += num_bytes
+        now = time.monotonic()
+        if now - self._last_emit >= self._telemetry.interval:
+            self._last_emit = now
+            self._telemetry.emit(self.get_event(now))
+
+    def get_event(self, now: float = None) -> Dict[str, Any]:
+        """
+        Returns current state of the progress
+        """
+        elapsed = (time.monotonic() if now is None else now) - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total and rate > 0:
+            eta = max(self.total - self.done, 0) / rate
+        return {
+            "time": time.time(),
+            "stage": self.stage,
+            "unit": self.unit,
+            "done": self.done,
+            "total": self.total or 0,
+            "bytes": self.bytes,
+            "rate": rate,
+            "eta": eta,
+            "elapsed": elapsed,
+            "finished": self._finished,
+        }
+
+    def close(self):
+        """
+        Marks the stage finished and emits the final event
+        """
+        if not self._finished:
+            self._finished = True
+            self._telemetry.emit(self.get_event())
+
+    def __enter__(self) -> "Progress":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Telemetry:
+    """
+    Dispatches progress events of stages to sinks
+    """
+
+    def __init__(self, sinks: Iterable[Any] = (), interval: float = 10.0):
+        """
+        constructor of telemetry
+
+        Parameters
+        ----------
+        sinks: Iterable[Any]
+            objects with ``emit(event)`` and ``close()`` methods
+        interval: float
+            minimal number of seconds between events of a stage
+        """
+        self._sinks = list(sinks)
+        self.interval = interval
+        self.prefix = ""
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether there are sinks that receive events
+        """
+        return bool(self._sinks)
+
+    def add_sink(self, sink: Any):
+        """
+        Adds sink that receives events
+        """
+        self._sinks.append(sink)
+
+    def emit(self, event: Dict[str, Any]):
+        """
+        Sends event to all sinks. Failure of a sink doesn't interrupt the pipeline.
+        """
+        if not self._sinks:
+            return
+        with self._lock:
+            for sink in self._sinks:
+                try:
+                    sink.emit(event)
+                except OSError as e:
+                    logging.warning("Failed to emit telemetry to {}: {}".format(type(sink).__name__, e))
+
+    def progress(self, stage: str, total: Optional[int] = None, unit: str = "items") -> Progress:
+        """
+        Starts progress of a stage, which can be used as context manager
+
+        Parameters
+        ----------
+        stage: str
+            name of the stage
+        total: Optional[int]
+            number of units to process, if known. Used to estimate ETA
+        unit: str
+            name of processed units, for ex. "words"
+        """
+        return Progress(self, self.prefix + stage, total=total, unit=unit)
+
+    def track(self, items: Iterable, stage: str, total: Optional[int] = None, unit: str = "items") -> Iterator:
+        """
+        Wraps iterable, accounting each item as a processed unit
+        """
+        with self.progress(stage, total=total, unit=unit) as progress:
+            for item in items:
+                yield item
+                progress.update()
+
+    @contextmanager
+    def phase(self, stage: str):
+        """
+        Context manager for stages without measurable progress, emits start and end of the stage
+        """
+        with self.progress(stage, total=1, unit="phases") as progress:
+            self.emit(progress.get_event())
+            yield progress
+            progress.update()
+
+    @contextmanager
+    def scope(self, name: str):
+        """
+        Context manager that prefixes names of stages started within it with ``<name>/``,
+        for ex. to distinguish stages of concurrent jobs
+        """
+        prefix = self.prefix
+        self.prefix = prefix + name + "/"
+        try:
+            yield
+        finally:
+            self.prefix = prefix
+
+    def close(self):
+        """
+        Closes sinks
+        """
+        for sink in self._sinks:
+            sink.close()
+        self._sinks = []
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    """
+    Returns telemetry of the process, stages report progress to it
+    """
+    return _telemetry
+
+
+def _init_worker_telemetry(queue: Any, interval: float):
+    """
+    Initializer of worker process. Sinks inherited from the parent share its files,
+    so they are dropped and events are sent to the parent instead.
+    """
+    global _telemetry
+    _telemetry = Telemetry([] if queue is None else [QueueSink(queue)], interval=interval)
+
+
+@contextmanager
+def forward_from_workers() -> Iterator[Tuple[Callable, Tuple]]:
+    """
+    Collects telemetry of pool workers in the current process: events are sent by workers
+    through a queue and emitted to sinks of the current process by a listener thread.
+
+    Yields
+    ------
+    initializer: Callable
+        initializer of worker processes, for ex. ``initializer`` of ``multiprocessing.Pool``
+    initargs: Tuple
+        arguments of the initializer
+    """
+    telemetry = get_telemetry()
+    if not telemetry.enabled:
+        yield _init_worker_telemetry, (None, telemetry.interval)
+        return
+    # puts of simple queue are synchronous, so events are not lost when pool terminates workers
+    queue = multiprocessing.SimpleQueue()
+
+    def listen():
+        for event in iter(queue.get, None):
+            telemetry.emit(event)
+
+    listener = threading.Thread(target=listen, daemon=True)
+    listener.start()
+    try:
+        yield _init_worker_telemetry, (queue, telemetry.interval)
+    finally:
+        queue.put(None)
+        listener.join()
+
+
+def configure_telemetry(
+    sinks: List[str], work_dir: str, interval: float = 10.0, prometheus_path: str = None
+) -> Telemetry:
+    """
+    Configures telemetry of the process
+
+    Parameters
+    ----------
+    sinks: List[str]
+        names of sinks from :data:`SINKS`
+    work_dir: str
+        directory to store ``telemetry.jsonl`` and ``telemetry.prom`` to
+    interval: float
+        minimal number of seconds between events of a stage
+    prometheus_path: str
+        path to Prometheus text-format file, ``work_dir/telemetry.prom`` by default
+
+    Returns
+    -------
+    telemetry: Telemetry
+        configured telemetry, same as returned by :func:`get_telemetry`
+    """
+    _telemetry.close()
+    _telemetry.interval = interval
+    for name in sinks:
+        if name == "console":
+            _telemetry.add_sink(ConsoleSink())
+        elif name == "jsonl":
+            _telemetry.add_sink(JsonLinesSink(os.path.join(work_dir, "telemetry.jsonl")))
+        elif name == "prometheus":
+            path = os.path.join(work_dir, "telemetry.prom") if prometheus_path is None else prometheus_path
+            _telemetry.add_sink(PrometheusSink(path))
+        else:
+            raise ValueError("Unknown telemetry sink [{}], expected one of {}".format(name, SINKS))
+    return _telemetry
+
+
+@contextmanager
+def telemetry_session(
+    sinks: List[str], work_dir: str, interval: float = 10.0, prometheus_path: str = None
+) -> Iterator[List[str]]:
+    """
+    Configures telemetry with :func:`configure_telemetry` for the duration of the block,
+    sinks are closed when the block exits, also on error
+
+    Yields
+    ------
+    files: List[str]
+        files written by sinks, relative to ``work_dir``. Custom ``prometheus_path`` is not included
+    """
+    telemetry = configure_telemetry(sinks, work_dir, interval=interval, prometheus_path=prometheus_path)
+    files = []
+    if "jsonl" in sinks:
+        files.append("telemetry.jsonl")
+    if "prometheus" in sinks and prometheus_path is None:
+        files.append("telemetry.prom")
+    try:
+        yield files
+    finally:
+        telemetry.close()
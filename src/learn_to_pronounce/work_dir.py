@@ -0,0 +1,248 @@
+"""
+Copyright 2022 Balacoon
+
+Accounting of artifacts in working directory. Stages register files they produce
+together with stages that consume them later, registry is stored in ``work_dir/artifacts.json``.
+Garbage collection removes intermediate artifacts that are not needed to resume
+pipeline and compresses ones that are rarely needed, for ex. alignments reused by incremental training.
+"""
+
+import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+from typing import Any, Dict, Iterable, List, Optional
+
+REGISTRY_NAME = "artifacts.json"
+
+#: actions applied to artifacts on garbage collection
+KEEP = "keep"
+COMPRESS = "compress"
+REMOVE = "remove"
+GC_ACTIONS = [KEEP, COMPRESS, REMOVE]
+COMPRESSED_SUFFIX = ".gz"
+
+
+def get_size(path: str) -> int:
+    """
+    Returns size of the file or total size of files in directory, 0 if path doesn't exist
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, x)) for x in files)
+    return total
+
+
+def format_size(size: int) -> str:
+    """
+    Returns human-readable size
+    """
+    if size < 1024:
+        return "{}B".format(size)
+    for unit in ["KB", "MB", "GB"]:
+        size /= 1024.0
+        if size < 1024 or unit == "GB":
+            return "{:.1f}{}".format(size, unit)
+
+
+class WorkDir:
+    """
+    Registry of artifacts in working directory. Registry is re-read on each modification,
+    so artifacts can be registered from different places of the pipeline.
+    """
+
+    def __init__(self, path: str):
+        """
+        constructor of work dir registry
+
+        Parameters
+        ----------
+        path: str
+            working directory
+        """
+        self._path = path
+        self._registry_path = os.path.join(path, REGISTRY_NAME)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.isfile(self._registry_path):
+            return {}
+        with open(self._registry_path, "r", encoding="utf-8") as fp:
+            return json.load(fp)
+
+    def _save(self, registry: Dict[str, Dict[str, Any]]):
+        os.makedirs(self._path, exist_ok=True)
+        tmp_path = self._registry_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(registry, fp, indent=2)
+        os.replace(tmp_path, self._registry_path)
+
+    def register(self, name: str, stage: str, consumers: Iterable[str] = (), gc: str = KEEP):
+        """
+        Registers artifact produced by a stage. Patterns are expanded,
+        non-existing artifacts are ignored.
+
+        Parameters
+        ----------
+        name: str
+            path to artifact (file or directory) relative to working directory, can be a glob pattern
+        stage: str
+            stage that produced the artifact
+        consumers: Iterable[str]
+            stages that read the artifact later
+        gc: str
+            what to do with artifact on garbage collection, one of :data:`GC_ACTIONS`
+        """
+        if gc not in GC_ACTIONS:
+            raise ValueError("Unknown garbage collection action [{}], expected one of {}".format(gc, GC_ACTIONS))
+        paths = sorted(glob.glob(os.path.join(self._path, name)))
+        if not paths:
+            return
+        registry = self._load()
+        for path in paths:
+            if os.path.isfile(path + COMPRESSED_SUFFIX):
+                # artifact is produced anew, copy compressed on garbage collection is outdated
+                os.remove(path + COMPRESSED_SUFFIX)
+            registry[os.path.relpath(path, self._path)] = {
+                "stage": stage,
+                "consumers": list(consumers),
+                "gc": gc,
+                "size": get_size(path),
+                "compressed": False,
+            }
+        self._save(registry)
+
+    def register_fst_training(self, model_name: str, stage: str, consumers: Iterable[str] = ()):
+        """
+        Registers artifacts of phonetisaurus training of a model, see
+        :func:`learn_to_pronounce.fst.fst_trainer.FSTTrainer._train_fst`.
+        Training data and alignments are compressed on garbage collection, since they are only
+        needed for incremental training. Language model in ARPA format is removed, it is
+        converted to FST within training. Artifacts of incremental alignment are removed.
+        """
+        self.register(model_name + "_training_data", stage, consumers=["incremental training"], gc=COMPRESS)
+        self.register(model_name + ".corpus", stage, consumers=["incremental training"], gc=COMPRESS)
+        self.register(model_name + ".corpus.params", stage, consumers=["incremental training"])
+        self.register(model_name + ".o*.arpa", stage, gc=REMOVE)
+        self.register(model_name + "_delta_training_data", stage, gc=REMOVE)
+        self.register(model_name + "_delta.corpus", stage, gc=REMOVE)
+        self.register(model_name + ".fst", stage, consumers=consumers)
+
+    def restore(self, name: str) -> bool:
+        """
+        Decompresses artifact compressed on garbage collection, so stage can read it as usual
+
+        Parameters
+        ----------
+        name: str
+            path to artifact relative to working directory
+
+        Returns
+        -------
+        exists: bool
+            whether artifact exists after restoring
+        """
+        path = os.path.join(self._path, name)
+        compressed_path = path + COMPRESSED_SUFFIX
+        if os.path.exists(path) or not os.path.isfile(compressed_path):
+            return os.path.exists(path)
+        with gzip.open(compressed_path, "rb") as in_fp, open(path, "wb") as out_fp:
+            shutil.copyfileobj(in_fp, out_fp)
+        os.remove(compressed_path)
+        registry = self._load()
+        if name in registry:
+            registry[name]["compressed"] = False
+            registry[name]["size"] = get_size(path)
+            self._save(registry)
+        return True
+
+    def _current_path(self, name: str, info: Dict[str, Any]) -> str:
+        path = os.path.join(self._path, name)
+        return path + COMPRESSED_SUFFIX if info["compressed"] else path
+
+    def get_report(self) -> List[Dict[str, Any]]:
+        """
+        Returns current sizes of registered artifacts and size of files that are not registered
+
+        Returns
+        -------
+        report: List[Dict[str, Any]]
+            registered artifacts sorted by size, each one with "name", "stage", "consumers", "gc",
+            "compressed" and "size". Unregistered files are accounted in the last row named "<untracked>".
+        """
+        registry = self._load()
+        rows = []
+        tracked = {os.path.join(self._path, REGISTRY_NAME)}
+        for name, info in registry.items():
+            path = self._current_path(name, info)
+            if not os.path.exists(path):
+                continue
+            tracked.add(path)
+            row = dict(info, name=name, size=get_size(path))
+            rows.append(row)
+        rows.sort(key=lambda x: -x["size"])
+        untracked = 0
+        for root, dirs, files in os.walk(self._path):
+            # registered directories are accounted completely
+            dirs[:] = [x for x in dirs if os.path.join(root, x) not in tracked]
+            untracked += sum(get_size(os.path.join(root, x)) for x in files if os.path.join(root, x) not in tracked)
+        rows.append(
+            {"name": "<untracked>", "stage": "", "consumers": [], "gc": KEEP, "compressed": False, "size": untracked}
+        )
+        return rows
+
+    def log_report(self, report: Optional[List[Dict[str, Any]]] = None):
+        """
+        Prints sizes of artifacts to console
+        """
+        report = self.get_report() if report is None else report
+        for row in report:
+            logging.info(
+                "{:>10} {}{} [{}] -> [{}], gc: {}".format(
+                    format_size(row["size"]),
+                    row["name"],
+                    COMPRESSED_SUFFIX if row["compressed"] else "",
+                    row["stage"],
+                    ", ".join(row["consumers"]),
+                    row["gc"],
+                )
+            )
+        logging.info("{:>10} total in [{}]".format(format_size(sum(x["size"] for x in report)), self._path))
+
+    def collect_garbage(self) -> int:
+        """
+        Removes or compresses registered artifacts according to their garbage collection action
+
+        Returns
+        -------
+        freed: int
+            number of bytes freed
+        """
+        registry = self._load()
+        freed = 0
+        for name in list(registry):
+            info = registry[name]
+            path = self._current_path(name, info)
+            if not os.path.exists(path):
+                del registry[name]
+                continue
+            size = get_size(path)
+            if info["gc"] == REMOVE:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                del registry[name]
+                freed += size
+            elif info["gc"] == COMPRESS and not info["compressed"] and os.path.isfile(path):
+                with open(path, "rb") as in_fp, gzip.open(path + COMPRESSED_SUFFIX, "wb") as out_fp:
+                    shutil.copyfileobj(in_fp, out_fp)
+                os.remove(path)
+                info["compressed"] = True
+                info["size"] = get_size(path + COMPRESSED_SUFFIX)
+                freed += size - info["size"]
+        self._save(registry)
+        return freed
@@ -7,8 +7,11 @@ import pywrapfst as fst
 
 from pronunciation_generation import PronunciationDictionary
 from pronunciation_generation import PronunciationManager as pm
+from pronunciation_generation import PronunciationManager
 
 from learn_to_pronounce.addon.addon_manager import AddonManager
+from learn_to_pronounce.addon.delta import apply_delta, describe_delta
+from learn_to_pronounce.addon.manifest import MANIFEST_FIELD
 
 
 def _load_addon(addon_path):
@@ -57,3 +60,52 @@ def test_addon_manager():
     assert spel_fst_field in addon
 
     temp_dir.cleanup()
+
+
+def _lexicon(words):
+    pd = PronunciationDictionary()
+    for word in words:
+        pd.add_word(word, "w 3` d", tag="")
+    return pd
+
+
+def test_addon_delta():
+    temp_dir = tempfile.TemporaryDirectory()
+    base_path = os.path.join(temp_dir.name, "base.addon")
+    delta_path = os.path.join(temp_dir.name, "addon.delta")
+    words = ["word{}".format(i) for i in range(2000)]
+    am = AddonManager(temp_dir.name, "en_us")
+    am.add_lexicon(_lexicon(words), [], ["w", "3`", "d"])
+    am.save(base_path, manifest=False)
+    am.add_lexicon(_lexicon(words[:10] + ["new"] + words[11:]), [], ["w", "3`", "d"])
+    am.save_delta(base_path, delta_path)
+
+    with open(base_path, "rb") as fp:
+        base = fp.read()
+    with open(os.path.join(temp_dir.name, am.ADDON_FILE_NAME), "rb") as fp:
+        target = fp.read()
+    with open(delta_path, "rb") as fp:
+        delta = fp.read()
+    lexicon_field = pm.addon_field_to_string(pm.AddonFields.LEXICON)
+    assert describe_delta(delta) == {lexicon_field: "bytes"}
+    assert len(delta) < len(target) / 2
+    assert apply_delta(base, delta) == target
+
+    temp_dir.cleanup()
+
+
+def test_addon_save():
+    temp_dir = tempfile.TemporaryDirectory()
+    out_path = os.path.join(temp_dir.name, "out.addon")
+    am = AddonManager(temp_dir.name, "en_us")
+    am.add_lexicon(_lexicon(["word"]), ["w", "o", "r", "d"], ["w", "3`", "d"])
+    am.save(out_path)
+
+    # manifest is appended as the last section, other sections are intact
+    work_dir_addon = _load_addon(os.path.join(temp_dir.name, am.ADDON_FILE_NAME))
+    addon = _load_addon(out_path)
+    assert list(addon) == list(work_dir_addon) + [MANIFEST_FIELD]
+    assert {k: v for k, v in addon.items() if k != MANIFEST_FIELD} == work_dir_addon
+    PronunciationManager(out_path, "en_us")
+
+    temp_dir.cleanup()
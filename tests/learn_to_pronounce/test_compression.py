@@ -0,0 +1,63 @@
+# Copyright 2022 Balacoon
+
+import gzip
+import os
+import tempfile
+
+import msgpack
+import pytest
+
+from learn_to_pronounce.addon.compression import (
+    COMPRESSION_FIELD,
+    Codec,
+    compress_addon_dict,
+    decompress_addon,
+    decompress_addon_dict,
+)
+
+
+def _dummy_addon():
+    return {
+        "id": "pronunciation",
+        "locale": "en_us",
+        "phonemes": ["h", "@", "l", "\"o", "U"],
+        "lexicon": b"\x00" * 1000,
+    }
+
+
+def test_compression_roundtrip():
+    addon = _dummy_addon()
+    compressed = compress_addon_dict(addon, Codec("gzip"), uncompressed=["id", "locale"])
+    assert compressed[COMPRESSION_FIELD] == {"phonemes": "gzip", "lexicon": "gzip"}
+    assert compressed["locale"] == "en_us"
+    assert len(compressed["lexicon"]) < len(addon["lexicon"])
+    assert decompress_addon_dict(compressed) == addon
+    assert decompress_addon_dict(compressed, sections=["phonemes"]) == {"phonemes": addon["phonemes"]}
+    # plain addon is returned as is
+    assert decompress_addon_dict(addon) is addon
+    with pytest.raises(RuntimeError):
+        compress_addon_dict(compressed, Codec("gzip"))
+
+
+def test_compression_is_deterministic():
+    codec = Codec("gzip")
+    data = msgpack.packb(_dummy_addon())
+    assert codec.compress(data) == codec.compress(data)
+    assert gzip.decompress(codec.compress(data)) == data
+
+
+def test_decompress_addon():
+    temp_dir = tempfile.TemporaryDirectory()
+    path = os.path.join(temp_dir.name, "compressed.addon")
+    out_path = os.path.join(temp_dir.name, "plain.addon")
+    with open(path, "wb") as fp:
+        msgpack.dump([compress_addon_dict(_dummy_addon(), Codec("gzip"))], fp)
+    decompress_addon(path, out_path)
+    with open(out_path, "rb") as fp:
+        assert msgpack.load(fp) == [_dummy_addon()]
+    temp_dir.cleanup()
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        Codec("rar")
@@ -0,0 +1,26 @@
+# Copyright 2022 Balacoon
+
+import math
+import os
+import tempfile
+
+from learn_to_pronounce.fst.confidence import COLUMNS, write_sorted
+
+
+def test_write_sorted():
+    scores = [
+        ("sure", 1.0, 5.0, "S U r", "S 3`"),
+        ("unique", 2.0, math.inf, "j u n i k", ""),
+        ("either", 3.0, 0.1, "i D 3`", "aI D 3`"),
+        ("tomato", 4.0, 0.1, "t @ m eI t oU", "t @ m A t oU"),
+    ]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "scores.tsv")
+        # runs of 2 scores are merged
+        assert write_sorted(scores, path, run_size=2) == 4
+        with open(path) as fp:
+            lines = [x.rstrip("\n").split("\t") for x in fp]
+    assert lines[0] == COLUMNS
+    # least confident first: smallest margin, ties resolved by highest cost
+    assert [x[0] for x in lines[1:]] == ["tomato", "either", "sure", "unique"]
+    assert lines[-1][2] == "inf"
@@ -0,0 +1,33 @@
+# Copyright 2022 Balacoon
+
+import msgpack
+import pytest
+
+from learn_to_pronounce.addon.delta import apply_delta, create_delta, describe_delta
+
+
+def test_delta():
+    lexicon = [["word{}".format(i), "w 3` d {}".format(i)] for i in range(1000)]
+    base_dict = {"id": "addon", "locale": "en_us", "lexicon": lexicon, "fst": b"\x00" * 100, "obsolete": 1}
+    new_lexicon = lexicon[:10] + [["new", "n u"]] + lexicon[11:500] + lexicon[501:]
+    target_dict = {"id": "addon", "locale": "en_us", "lexicon": new_lexicon, "fst": b"\x01" * 100, "spelling": {}}
+    base = msgpack.packb([base_dict])
+    target = msgpack.packb([target_dict])
+    delta = create_delta(base, target)
+    assert describe_delta(delta) == {"lexicon": "list", "fst": "replace", "spelling": "replace"}
+    assert len(delta) < len(target) / 10
+    assert apply_delta(base, delta) == target
+    with pytest.raises(RuntimeError):
+        apply_delta(target, delta)
+
+
+def test_delta_bytes():
+    # lexicon section is stored as serialized bytes in addons
+    lexicon = [["word{}".format(i), "w 3` d {}".format(i)] for i in range(2000)]
+    new_lexicon = lexicon[:10] + [["new", "n u"]] + lexicon[11:1500] + lexicon[1501:]
+    base = msgpack.packb([{"id": "addon", "lexicon": msgpack.packb(lexicon)}])
+    target = msgpack.packb([{"id": "addon", "lexicon": msgpack.packb(new_lexicon)}])
+    delta = create_delta(base, target)
+    assert describe_delta(delta) == {"lexicon": "bytes"}
+    assert len(delta) < len(target) / 10
+    assert apply_delta(base, delta) == target
@@ -0,0 +1,54 @@
+# Copyright 2022 Balacoon
+
+import numpy as np
+
+from learn_to_pronounce.fst.error_analysis import ErrorAnalyzer, align_closest, get_stress_class, read_stress_classes
+from learn_to_pronounce.resources.interned import PhonemeTable
+
+
+def test_get_stress_class():
+    classes = ["<no_stress>", '"', "%", "_B", "_B_L", "_L"]
+    assert get_stress_class('"a', classes) == 1
+    assert get_stress_class("a", classes) == 0
+    assert get_stress_class("a_B_L", classes) == 4
+
+
+def test_error_analyzer():
+    table = PhonemeTable()
+    encode = table.encode
+    analyzer = ErrorAnalyzer(table, read_stress_classes(), batch_size=2)
+    analyzer.add([encode('k "a t')], encode('k "a t'))  # correct
+    analyzer.add([encode('k "a t'), encode("d O g")], encode('k %a t'))  # stress error
+    analyzer.add([encode('d "O g')], encode('d "O g z'))  # insertion
+    analyzer.add([encode('d "O g')], encode('t "O'))  # substitution and deletion
+    analyzer.add([encode("a")], encode(""))  # deletion of the whole pronunciation
+    assert analyzer.get_summary() == {"substitution": 2, "insertion": 1, "deletion": 2}
+
+    top = analyzer.get_top_confusions()
+    top = {(x["type"], x["reference"], x["hypothesis"], x["stress"]): x["count"] for x in top}
+    assert top[("substitution", "a", "a", '"')] == 1
+    assert top[("substitution", "d", "t", "<no_stress>")] == 1
+    assert top[("insertion", "<eps>", "z", "<no_stress>")] == 1
+    assert top[("deletion", "g", "<eps>", "<no_stress>")] == 1
+
+    stress = analyzer.get_stress_confusions()
+    assert stress[1, 1] == 3 and stress[1, 2] == 1
+
+    restored = ErrorAnalyzer(PhonemeTable())
+    restored.load_state_dict(analyzer.state_dict())
+    assert restored.get_summary() == analyzer.get_summary()
+    assert np.array_equal(restored.get_stress_confusions(), stress)
+
+
+def test_error_analyzer_tones():
+    table = PhonemeTable()
+    encode = table.encode
+    analyzer = ErrorAnalyzer(table)
+    reference, hypothesis = [encode("m a_H")], encode("m a_L")
+    analyzer.add(reference, hypothesis, alignment=align_closest(reference, hypothesis))
+    # wrong tone on the correct phoneme is a substitution of the base phoneme
+    top = analyzer.get_top_confusions()
+    assert [(x["reference"], x["hypothesis"], x["stress"]) for x in top] == [("a", "a", "_H")]
+    classes = read_stress_classes()
+    stress = analyzer.get_stress_confusions()
+    assert stress[classes.index("_H"), classes.index("_L")] == 1
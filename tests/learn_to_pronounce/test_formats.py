@@ -0,0 +1,64 @@
+# Copyright 2022 Balacoon
+
+import gzip
+import json
+import lzma
+import os
+import tempfile
+
+from learn_to_pronounce.resources import formats
+from learn_to_pronounce.resources.formats import detect_format, read_lexicon
+
+ENTRIES = [("hello", "", "h @ l \"o U"), ("hello", "", "h E l \"o U"), ("world", "", "w \"3` l d")]
+
+
+def _write(path: str, text: str, compression: str = ""):
+    opener = {"": open, "gz": gzip.open, "xz": lzma.open}[compression]
+    with opener(path, "wt", encoding="utf-8") as fp:
+        fp.write(text)
+
+
+def test_formats():
+    tsv = "hello\th @ l \"o U\nhello\th E l \"o U\n\nworld\tw \"3` l d\n"
+    cmudict = ";;; comment\nhello  h @ l \"o U\nhello(2)  h E l \"o U # variant\nworld  w \"3` l d\n"
+    as_list = json.dumps([{"hello": ["h @ l \"o U", "h E l \"o U"]}, {"world": ["w \"3` l d"]}])
+    as_object = json.dumps({"hello": ["h @ l \"o U", "h E l \"o U"], "world": "w \"3` l d"}, indent=2)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, text, expected_format in [
+            ("tsv", tsv, "tsv"),
+            ("cmudict", cmudict, "cmudict"),
+            ("list", as_list, "json"),
+            ("object", as_object, "json"),
+        ]:
+            for compression in ["", "gz", "xz"]:
+                path = os.path.join(temp_dir, name + compression)
+                _write(path, text, compression)
+                assert detect_format(path) == expected_format
+                assert list(read_lexicon(path)) == ENTRIES
+        # words starting with brackets don't make lexicon json
+        for text, expected_format in [("{brace\tb r eI s\n", "tsv"), ("[bracket  b r a k @ t\n", "cmudict")]:
+            path = os.path.join(temp_dir, "brackets")
+            _write(path, text)
+            assert detect_format(path) == expected_format
+
+
+def test_streaming_json(monkeypatch):
+    # blocks are smaller than values, so values are assembled from several reads
+    monkeypatch.setattr(formats, "_JSON_READ_SIZE", 3)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "lexicon")
+        _write(path, json.dumps({"hello": ["h @ l \"o U", "h E l \"o U"], "world": ["w \"3` l d"]}))
+        assert list(read_lexicon(path)) == ENTRIES
+        _write(path, "[ ]")
+        assert list(read_lexicon(path, lexicon_format="json")) == []
+
+
+def test_parallel_parsing(monkeypatch):
+    monkeypatch.setattr(formats, "PARALLEL_MIN_SIZE", 0)
+    words = ["word{}".format(i) for i in range(1000)]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "lexicon")
+        _write(path, "".join("{}\ttag\tw 3` d\n".format(x) for x in words))
+        entries = list(read_lexicon(path, num_workers=3))
+        assert [x[0] for x in entries] == words
+        assert entries[0] == ("word0", "tag", "w 3` d")
@@ -0,0 +1,33 @@
+# Copyright 2022 Balacoon
+
+from learn_to_pronounce.resources.interned import STRESS_MARKS, TONE_MARKS, InternedLexicon, PhonemeTable
+
+
+def test_interned_lexicon():
+    lexicon = InternedLexicon(PhonemeTable(["h", "@", "l"]))
+    lexicon.add("hello", "h @ l \"o U")
+    lexicon.add("hello", "h E l \"o U")
+    lexicon.add("low", "l \"o U")
+    assert lexicon.size() == 2
+    assert list(lexicon.iterate()) == [("hello", ["h @ l \"o U", "h E l \"o U"]), ("low", ["l \"o U"])]
+    # stressless counterpart is interned together with stressed phoneme
+    table = lexicon.table
+    assert table.get_symbols()[:5] == ["h", "@", "l", "o", "\"o"]
+    assert table.decode(table.strip_stress(lexicon.get_pronunciations("low")[0])) == "l o U"
+    assert lexicon.get_used_symbols() == sorted(["h", "@", "l", "\"o", "U", "E"])
+    assert lexicon.get_pronunciations("missing") == []
+    assert lexicon.get_memory_stats()["pool_bytes"] == 2 * 13
+
+
+def test_phoneme_table_marks():
+    # marks are read from data/stress_and_tone.txt shipped with the package
+    assert STRESS_MARKS == ('"', "%")
+    assert "_H_T" in TONE_MARKS and len(TONE_MARKS) == 10
+
+    table = PhonemeTable(["a", "2_o"])
+    ids = table.encode("\"a_B_L %a_H 2_o")
+    assert table.decode(table.strip_stress(ids)) == "a a 2_o"
+    # copy gets new symbols, shared table stays intact
+    copy = table.copy()
+    assert list(copy.encode("a_T x")) == [copy.get_symbols().index("a_T"), len(table) + 1]
+    assert "x" not in table.get_symbols() and len(copy) == len(table) + 2
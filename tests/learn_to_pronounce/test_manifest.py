@@ -0,0 +1,43 @@
+# Copyright 2022 Balacoon
+
+import os
+import tempfile
+
+import msgpack
+import pytest
+
+from learn_to_pronounce.addon import manifest
+from learn_to_pronounce.addon.manifest import MANIFEST_FIELD, AddonVerifier, write_addon
+
+
+def test_manifest(monkeypatch):
+    # small chunks, so sections are hashed by several chunks
+    monkeypatch.setattr(manifest, "HASH_CHUNK_SIZE", 7)
+    lexicon = ["w{}".format(i) for i in range(100)]
+    addon_dict = {"id": "addon", "locale": "en_us", "lexicon": lexicon, "fst": b"x" * 100}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "pronunciation.addon")
+        write_addon(addon_dict, path)
+        with open(path, "rb") as fp:
+            loaded = msgpack.load(fp)[0]
+        # addon is readable as usual, manifest is the last section
+        assert list(loaded) == list(addon_dict) + [MANIFEST_FIELD]
+        verifier = AddonVerifier(path)
+        assert verifier.get_sections() == list(addon_dict)
+        assert verifier.load_section("lexicon") == addon_dict["lexicon"]
+        assert all(verifier.verify().values())
+
+        # corrupt FST section
+        with open(path, "r+b") as fp:
+            data = fp.read()
+            fp.seek(data.index(b"x" * 100) + 50)
+            fp.write(b"y")
+        verifier = AddonVerifier(path)
+        assert verifier.verify() == {"id": True, "locale": True, "lexicon": True, "fst": False}
+        with pytest.raises(RuntimeError):
+            verifier.load_section("fst")
+
+        with open(path, "wb") as fp:
+            msgpack.dump([addon_dict], fp)
+        with pytest.raises(RuntimeError):
+            AddonVerifier(path)
@@ -0,0 +1,38 @@
+# Copyright 2022 Balacoon
+
+import os
+import tempfile
+
+from learn_to_pronounce.resources.normalization import TrainingDataNormalizer
+from learn_to_pronounce.resources.streaming import dump_training_data
+
+
+def test_normalizer():
+    pairs = [
+        ("Read", "r i d"),
+        ("read", "r i  d"),
+        ("read", "r E d"),
+        ("résumé", "r E z u m eI"),
+        ("résumé", "r E z u m eI"),
+        ("read", "r eI d"),
+    ]
+    normalizer = TrainingDataNormalizer(unicode_form="NFC", casefold=True, max_variants=2)
+    normalized = sorted(normalizer.normalize(pairs), key=lambda x: x[0])
+    result = list(normalizer.deduplicate(normalized))
+    assert result == [("read", "r i d"), ("read", "r E d"), ("résumé", "r E z u m eI")]
+    report = normalizer.get_report()
+    assert report["input"] == 6 and report["output"] == 3
+    assert report["duplicates"] == 2 and report["capped"] == 1
+    assert report["normalized_words"] == 2
+
+
+def test_streaming_normalization():
+    entries = [("b", "b i"), ("B", "b i"), ("a", "eI"), ("a", "eI"), ("C", "s i")]
+    normalizer = TrainingDataNormalizer(casefold=True)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "training_data")
+        # "c" is requested as it is in lexicon, before normalization
+        dump_training_data(entries, path, max_memory=1, words=["a", "B", "C"], normalizer=normalizer)
+        with open(path, encoding="utf-8") as fp:
+            assert fp.read() == "a\teI\nb\tb i\nc\ts i\n"
+    assert normalizer.get_report()["duplicates"] == 1
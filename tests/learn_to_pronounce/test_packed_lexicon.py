@@ -0,0 +1,54 @@
+# Copyright 2022 Balacoon
+
+import os
+import tempfile
+
+import msgpack
+
+from learn_to_pronounce.addon.layout import get_section_ranges
+from learn_to_pronounce.addon.packed_lexicon import PACKED_LEXICON_FIELD, PackedLexicon, pack_lexicon
+
+ENTRIES = [
+    ("hello", ["h @ l \"o U", "h E l \"o U"]),
+    ("world", ["w \"3` l d"]),
+    ("über", ["\"y: b 6"]),
+]
+PHONEMES = ["h", "@", "l", "\"o", "U", "E", "w", "\"3`", "d"]
+
+
+def test_packed_lexicon():
+    lexicon = PackedLexicon(pack_lexicon(ENTRIES, PHONEMES))
+    assert len(lexicon) == 3
+    assert "hello" in lexicon
+    assert "hell" not in lexicon
+    assert lexicon.get_pronunciations("hello") == ENTRIES[0][1]
+    assert lexicon.get_pronunciations("über") == ENTRIES[2][1]
+    assert lexicon.get_pronunciations("zzz") == []
+    assert lexicon.get_phoneme_ids("world") == [(6, 7, 2, 8)]
+    # phonemes missing from the list are appended to symbol table
+    assert lexicon.get_symbols()[:len(PHONEMES)] == PHONEMES
+    assert len(lexicon.get_symbols()) == len(PHONEMES) + 3
+    assert sorted(lexicon.iterate()) == sorted(ENTRIES)
+
+
+def test_packed_lexicon_from_addon():
+    temp_dir = tempfile.TemporaryDirectory()
+    path = os.path.join(temp_dir.name, "pronunciation.addon")
+    addon = {
+        "id": "pronunciation",
+        "phonemes": PHONEMES,
+        PACKED_LEXICON_FIELD: pack_lexicon(ENTRIES, PHONEMES),
+        "fst": b"\x01" * 70000,
+    }
+    with open(path, "wb") as fp:
+        msgpack.dump([addon], fp)
+    with open(path, "rb") as fp:
+        data = fp.read()
+    ranges = get_section_ranges(data)
+    assert list(ranges.keys()) == list(addon.keys())
+    for key, (start, end) in ranges.items():
+        assert msgpack.unpackb(data[start:end]) == addon[key]
+    lexicon = PackedLexicon.from_addon(path)
+    assert lexicon.get_pronunciations("world") == ENTRIES[1][1]
+    del lexicon
+    temp_dir.cleanup()
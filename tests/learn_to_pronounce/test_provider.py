@@ -1,11 +1,12 @@
 # Copyright 2022 Balacoon
 
+import gzip
 import os
 import pytest
 import tempfile
 
 from learn_to_pronounce.resources import get_provider
-from learn_to_pronounce.resources.provider import DefaultProvider
+from learn_to_pronounce.resources.provider import AutoProvider, DefaultProvider, get_lexicon_entries
 
 
 def _create_resource_directory(with_spelling: bool = True, with_word_lists: bool = True, with_unit_lists: bool = True):
@@ -70,7 +71,8 @@ def test_provider_without_spelling():
 def test_provider_getter():
     temp_dir = _create_resource_directory()
     provider = get_provider(temp_dir.name)
-    assert isinstance(provider, DefaultProvider)
+    # existing resource directories keep using default provider
+    assert type(provider) is DefaultProvider
     assert provider.get_lexicon().size() == 1
     temp_dir.cleanup()
 
@@ -79,3 +81,43 @@ def test_custom_provider_getter():
     data_dir = os.path.join(os.path.dirname(__file__), "..", "dummy_data", "custom_provider_data")
     provider = get_provider(data_dir)
     assert provider.get_lexicon().size() == 1
+
+
+def test_auto_provider():
+    temp_dir = _create_resource_directory()
+    os.remove(os.path.join(temp_dir.name, "lexicon"))
+    with gzip.open(os.path.join(temp_dir.name, "lexicon.json.gz"), "wt") as fp:
+        fp.write("[{\"hello\": [\"h @ l \\\"o U\"]}]")
+    provider = get_provider(temp_dir.name)
+    assert isinstance(provider, AutoProvider)
+    assert provider.get_lexicon().size() == 1
+    assert provider.get_interned_lexicon().get_used_symbols() == sorted(["h", "@", "l", "\"o", "U"])
+    temp_dir.cleanup()
+
+
+def test_auto_provider_plain_name():
+    # lexicon in another format stored under the default name is detected too
+    temp_dir = _create_resource_directory()
+    with open(os.path.join(temp_dir.name, "lexicon"), "w") as fp:
+        fp.write(";;; comment\nHELLO  h @ l \"o U\n")
+    provider = get_provider(temp_dir.name)
+    assert isinstance(provider, AutoProvider)
+    assert provider.get_lexicon().size() == 1
+    temp_dir.cleanup()
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 10000])
+def test_streaming_matches_dictionary(monkeypatch, batch_size):
+    # streaming readers give the same pronunciations as going through PronunciationDictionary
+    monkeypatch.setattr(DefaultProvider, "PARSE_BATCH_SIZE", batch_size)
+    temp_dir = _create_resource_directory(with_unit_lists=False)
+    with open(os.path.join(temp_dir.name, "lexicon"), "w") as fp:
+        fp.write("hello\th @ l \"o U\nhello\tnoun\th E l \"o U\nworld\tw \"3` l d\nread\tr i d\nread\tr E d\n")
+    for provider in [DefaultProvider(temp_dir.name), AutoProvider(temp_dir.name, num_workers=1)]:
+        expected = get_lexicon_entries(provider.get_lexicon())
+        entries = {}
+        for word, _, phonemes in provider.iterate_entries():
+            entries.setdefault(word, []).append(phonemes)
+        assert sorted(entries.items()) == sorted(expected)
+        assert sorted(provider.get_interned_lexicon().iterate()) == sorted(expected)
+    temp_dir.cleanup()
@@ -0,0 +1,15 @@
+# Copyright 2022 Balacoon
+
+from learn_to_pronounce.fst.regression import check_thresholds
+
+
+def test_check_thresholds():
+    report = {
+        "delta": {"wer": 0.3, "per": 0.1},
+        "slowdown": 0.25,
+        "regressions": [{"word": "read"}] * 3,
+    }
+    assert check_thresholds(report, max_wer_increase=0.5, max_per_increase=0.2) == []
+    violations = check_thresholds(report, max_wer_increase=0.1, max_regressions=2, max_slowdown=0.2)
+    assert len(violations) == 3
+    assert violations[0].startswith("WER increased")
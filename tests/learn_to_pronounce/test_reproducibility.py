@@ -0,0 +1,127 @@
+# Copyright 2022 Balacoon
+
+"""
+Reproducibility of parallelized stages: output of the toy pipeline shouldn't depend
+on number of workers or on order of entries in the lexicon file.
+End-to-end checks require balacoon_frontend and phonetisaurus and are skipped otherwise.
+"""
+
+import json
+import os
+import random
+import tempfile
+import time
+
+import msgpack
+import pytest
+
+from learn_to_pronounce.resources import formats
+from learn_to_pronounce.resources.formats import read_lexicon
+from learn_to_pronounce.resources.streaming import dump_training_data
+
+LETTERS = {"a": "eI", "b": "b i", "c": "s i", "d": "d i", "e": "i", "k": "k eI", "o": "oU", "t": "t i"}
+PHONEMES = {"a": "@", "b": "b", "c": "k", "d": "d", "e": "E", "k": "k", "o": "A", "t": "t"}
+WORKERS = [1, 4]
+SEEDS = [0, 1]
+
+
+def _toy_lexicon():
+    rng = random.Random(42)
+    entries = []
+    for i in range(300):
+        word = "".join(rng.choice(sorted(PHONEMES)) for _ in range(rng.randint(3, 7)))
+        pronunciation = " ".join(PHONEMES[x] for x in word)
+        # stress on the first phoneme, so stress-aware metrics are exercised
+        entries.append((word, '"' + pronunciation))
+    return sorted(set(entries))
+
+
+def _create_resources(resources_dir: str, seed: int):
+    entries = _toy_lexicon()
+    # order of lines in resources shouldn't influence result
+    random.Random(seed).shuffle(entries)
+    words = sorted(set(x for x, _ in entries))
+    with open(os.path.join(resources_dir, "lexicon"), "w", encoding="utf-8") as fp:
+        fp.writelines("{}\t{}\n".format(word, pronunciation) for word, pronunciation in entries)
+    with open(os.path.join(resources_dir, "spelling_lexicon"), "w", encoding="utf-8") as fp:
+        fp.writelines("{}\t{}\n".format(letter, pronunciation) for letter, pronunciation in LETTERS.items())
+    with open(os.path.join(resources_dir, "train_words"), "w", encoding="utf-8") as fp:
+        fp.writelines(x + "\n" for x in words[: len(words) * 4 // 5])
+    with open(os.path.join(resources_dir, "test_words"), "w", encoding="utf-8") as fp:
+        fp.writelines(x + "\n" for x in words[len(words) * 4 // 5:])
+
+
+def test_parallel_parsing_is_deterministic(monkeypatch):
+    monkeypatch.setattr(formats, "PARALLEL_MIN_SIZE", 0)
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        _create_resources(temp_dir, seed=0)
+        path = os.path.join(temp_dir, "lexicon")
+        for num_workers in WORKERS:
+            results[num_workers] = list(read_lexicon(path, num_workers=num_workers))
+    assert results[1] == results[4]
+
+
+def test_training_data_is_deterministic():
+    outputs = set()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for seed in SEEDS:
+            entries = _toy_lexicon()
+            random.Random(seed).shuffle(entries)
+            # tiny budget spills every run to disk, big one sorts in memory
+            for max_memory in [1, 1 << 30]:
+                path = os.path.join(temp_dir, "training_data")
+                dump_training_data(entries, path, max_memory=max_memory, temp_dir=temp_dir)
+                with open(path, "rb") as fp:
+                    outputs.add(fp.read())
+    assert len(outputs) == 1
+
+
+def _run_pipeline(resources_dir: str, work_dir: str, num_workers: int):
+    from learn_to_pronounce.learn_to_pronounce import main
+
+    start = time.perf_counter()
+    main(
+        [
+            "--resources", resources_dir,
+            "--locale", "en_us",
+            "--work-dir", work_dir,
+            "--num-workers", str(num_workers),
+            "--fst-order", "3",
+        ]
+    )
+    seconds = time.perf_counter() - start
+    with open(os.path.join(work_dir, "pronunciation.addon"), "rb") as fp:
+        addon = msgpack.load(fp)[0]
+    sections = {key: msgpack.packb(value) for key, value in addon.items()}
+    with open(os.path.join(work_dir, "evaluation_checkpoint.json"), "r", encoding="utf-8") as fp:
+        checkpoint = json.load(fp)
+    metrics = {key: checkpoint[key] for key in ["comparator", "comparator_stressless"]}
+    return sections, metrics, seconds
+
+
+def test_pipeline_is_reproducible():
+    pytest.importorskip("balacoon_frontend")
+    from learn_to_pronounce.fst.fst_trainer import PHONETISAURUS_TRAIN_PATH
+
+    if not os.path.isfile(PHONETISAURUS_TRAIN_PATH):
+        pytest.skip("phonetisaurus is not installed")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for seed in SEEDS:
+            resources_dir = os.path.join(temp_dir, "resources_{}".format(seed))
+            os.makedirs(resources_dir)
+            _create_resources(resources_dir, seed)
+            for num_workers in WORKERS:
+                work_dir = os.path.join(temp_dir, "work_dir_{}_{}".format(seed, num_workers))
+                results[(seed, num_workers)] = _run_pipeline(resources_dir, work_dir, num_workers)
+
+    for (seed, num_workers), (_, _, seconds) in results.items():
+        print("seed {}, {} workers: {:.2f}s".format(seed, num_workers, seconds))
+    reference_sections, reference_metrics, _ = results[(SEEDS[0], WORKERS[0])]
+    for config, (sections, metrics, _) in results.items():
+        assert sorted(sections) == sorted(reference_sections), config
+        differing = [key for key in sections if sections[key] != reference_sections[key]]
+        assert not differing, "Sections {} differ for seed {}, {} workers".format(differing, *config)
+        assert metrics == reference_metrics, config
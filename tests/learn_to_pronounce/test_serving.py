@@ -0,0 +1,111 @@
+# Copyright 2022 Balacoon
+
+import asyncio
+import json
+import os
+import tempfile
+
+from learn_to_pronounce.serving.cache import PronunciationCache
+from learn_to_pronounce.serving.service import PronunciationService
+from learn_to_pronounce.serving.spelling import BatchSpeller
+
+
+class DummyManager:
+    """
+    Stands in for PronunciationManager, "pronounces" word by splitting it into letters
+    """
+
+    calls = 0
+
+    def get_pronunciation(self, word):
+        DummyManager.calls += 1
+        if word == "fail":
+            raise RuntimeError("failed")
+        return " ".join(word)
+
+    def get_spelling(self, word):
+        return " ".join(word.upper())
+
+
+async def _query(socket_path, requests):
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    for request in requests:
+        writer.write(request.encode("utf-8") + b"\n")
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in requests]
+    writer.close()
+    return responses
+
+
+async def _run_service(socket_path):
+    service = PronunciationService(DummyManager, workers=2, batch_size=4, cache=PronunciationCache(capacity=2))
+    await service.start()
+    server = await asyncio.start_unix_server(service.handle_connection, path=socket_path)
+    try:
+        requests = [json.dumps({"word": w}) for w in ["hello", "world", "hello"]]
+        requests += [json.dumps({"word": "ab", "spelling": True}), json.dumps({"word": "fail"}), "not json"]
+        responses = await _query(socket_path, requests)
+        stats = (await _query(socket_path, [json.dumps({"stats": True})]))[0]["cache"]
+        concurrent = await asyncio.gather(*[_query(socket_path, [json.dumps({"word": "x"})]) for _ in range(5)])
+    finally:
+        server.close()
+        await server.wait_closed()
+        await service.stop()
+    return responses, stats, concurrent
+
+
+def test_service():
+    temp_dir = tempfile.TemporaryDirectory()
+    socket_path = os.path.join(temp_dir.name, "pronounce.sock")
+    responses, stats, concurrent = asyncio.run(_run_service(socket_path))
+    assert responses[0] == {"word": "hello", "pronunciation": "h e l l o"}
+    assert responses[1] == {"word": "world", "pronunciation": "w o r l d"}
+    assert responses[2] == responses[0]
+    assert responses[3] == {"word": "ab", "pronunciation": "A B"}
+    assert responses[4]["error"] == "failed"
+    assert "error" in responses[5]
+    assert stats["size"] == 2
+    assert all(x == [{"word": "x", "pronunciation": "x"}] for x in concurrent)
+    temp_dir.cleanup()
+
+
+def test_cache():
+    cache = PronunciationCache(capacity=2, locale="en_us")
+    generated = []
+
+    def generate(word):
+        generated.append(word)
+        return " ".join(word)
+
+    assert cache.get("hello", generate) == "h e l l o"
+    assert cache.get("hello ", generate) == "h e l l o"
+    assert cache.get("hello", generate, kind="spelling") == "h e l l o"
+    assert cache.get("hello", generate, locale="en_gb") == "h e l l o"
+    assert generated == ["hello", "hello", "hello"]
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (1, 3, 1, 2)
+
+    temp_dir = tempfile.TemporaryDirectory()
+    path = os.path.join(temp_dir.name, "cache.json")
+    cache.save(path)
+    restored = PronunciationCache(capacity=1, locale="en_us")
+    restored.load(path)
+    # most recently used entry is kept
+    assert restored.lookup("hello", locale="en_gb") == "h e l l o"
+    assert restored.lookup("hello", kind="spelling") is None
+    temp_dir.cleanup()
+
+
+def test_batch_speller():
+    class CountingManager(DummyManager):
+        spelled = []
+
+        def get_spelling(self, word):
+            CountingManager.spelled.append(word)
+            return super().get_spelling(word)
+
+    speller = BatchSpeller(CountingManager(), letters="ab")
+    assert speller.spell_batch(["ab", "abc", "ca"]) == ["A B", "A B C", "C A"]
+    assert speller.spell("bad") == "B A D"
+    # each letter is spelled by manager only once
+    assert sorted(CountingManager.spelled) == ["a", "b", "c", "d"]
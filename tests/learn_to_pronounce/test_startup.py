@@ -0,0 +1,48 @@
+# Copyright 2022 Balacoon
+
+import subprocess
+import sys
+
+# modules that should be loaded only by stages that need them
+HEAVY_MODULES = [
+    "balacoon_frontend",
+    "pywrapfst",
+    "msgpack",
+    "edlib",
+    "tqdm",
+    "numpy",
+    "learn_to_pronounce.fst.fst_trainer",
+    "learn_to_pronounce.fst.fst_evaluator",
+]
+IMPORT_TIME_BUDGET_US = 300000  # start-up budget of CLI module, microseconds
+
+
+def test_cli_doesnt_import_heavy_modules():
+    code = (
+        "import sys\n"
+        "import learn_to_pronounce.learn_to_pronounce as cli\n"
+        "sys.argv = ['learn_to_pronounce', '--help']\n"
+        "try:\n"
+        "    cli.parse_args()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print('loaded:' + ','.join(x for x in {} if x in sys.modules))\n".format(HEAVY_MODULES)
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().split("\n")[-1] == "loaded:"
+
+
+def test_cli_import_time():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import learn_to_pronounce.learn_to_pronounce"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = None
+    for line in result.stderr.split("\n"):
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == "learn_to_pronounce.learn_to_pronounce":
+            cumulative = int(parts[1])
+    assert cumulative is not None
+    assert cumulative < IMPORT_TIME_BUDGET_US, "CLI start-up takes {}us".format(cumulative)
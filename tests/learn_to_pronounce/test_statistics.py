@@ -0,0 +1,27 @@
+# Copyright 2022 Balacoon
+
+from learn_to_pronounce.resources.interned import InternedLexicon
+from learn_to_pronounce.resources.statistics import check_inventory, get_statistics
+
+
+def test_statistics():
+    lexicon = InternedLexicon()
+    lexicon.add("aba", "a b a")
+    lexicon.add("aba", "a b @")
+    lexicon.add("ba", "b a")
+    statistics = get_statistics(lexicon)
+    assert statistics["words"] == 2
+    assert statistics["pronunciations"] == 3
+    assert statistics["graphemes"] == {"a": 3, "b": 2}
+    # bigrams don't cross word boundaries
+    assert statistics["grapheme_bigrams"] == {"ab": 1, "ba": 2}
+    assert statistics["phonemes"] == {"a": 4, "b": 3, "@": 1}
+    # bigrams don't cross pronunciation boundaries
+    assert statistics["phoneme_bigrams"] == {"b a": 2, "a b": 2, "b @": 1}
+    assert statistics["variants_histogram"] == [0, 1, 1]
+    assert statistics["word_length_histogram"] == [0, 0, 1, 1]
+    assert statistics["pronunciation_length_histogram"] == [0, 0, 1, 2]
+    assert check_inventory("phonemes", ["a", "b", "c"], statistics["phonemes"]) == [
+        "phonemes in lexicon but not in inventory: @",
+        "phonemes in inventory but never used in lexicon: c",
+    ]
@@ -0,0 +1,35 @@
+# Copyright 2022 Balacoon
+
+import os
+import random
+import tempfile
+
+from learn_to_pronounce.resources.streaming import dump_training_data, external_sort
+
+
+def test_external_sort_is_stable():
+    rng = random.Random(0)
+    lines = ["{}\t{}".format(rng.choice("abcdefgh"), i) for i in range(5000)]
+    key = lambda x: x.split("\t")[0]  # noqa: E731
+    # tiny budget, so lines are spilled in runs of minimal size
+    assert list(external_sort(lines, max_memory=1, key=key)) == sorted(lines, key=key)
+    assert list(external_sort(lines, max_memory=1 << 30, key=key)) == sorted(lines, key=key)
+
+
+def test_dump_training_data():
+    entries = [("read", "r i d"), ("cat", "k a t"), ("read", "r E d"), ("dog", "d O g"), ("ant", "a n t")]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "training_data")
+        counts = dump_training_data(entries, path, max_memory=1, words=iter(["read", "missing", "ant", "read"]))
+        with open(path, encoding="utf-8") as fp:
+            lines = fp.read().split("\n")
+    assert counts == (2, 3)
+    assert lines == ["ant\ta n t", "read\tr i d", "read\tr E d", ""]
+
+
+def test_dump_training_data_empty_words():
+    entries = [("read", "r i d"), ("ant", "a n t")]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "training_data")
+        # empty generator of words is same as no words: all entries are stored
+        assert dump_training_data(entries, path, max_memory=1, words=(x for x in [])) == (2, 2)
@@ -0,0 +1,75 @@
+# Copyright 2022 Balacoon
+
+import json
+import multiprocessing
+import os
+import tempfile
+
+from learn_to_pronounce.resources.formats import read_lexicon
+from learn_to_pronounce.telemetry import Telemetry, forward_from_workers, get_telemetry, telemetry_session
+
+
+class ListSink:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+    def close(self):
+        pass
+
+
+def test_progress():
+    sink = ListSink()
+    telemetry = Telemetry([sink], interval=0.0)
+    with telemetry.progress("evaluation", total=4, unit="words") as progress:
+        progress.update(2, num_bytes=10)
+        progress.update(2, num_bytes=10)
+    assert [x["done"] for x in sink.events] == [2, 4, 4]
+    assert sink.events[0]["eta"] is not None
+    assert sink.events[-1]["finished"] and sink.events[-1]["bytes"] == 20
+    # events are throttled by interval
+    sink.events.clear()
+    telemetry.interval = 3600.0
+    assert list(telemetry.track(range(100), "parsing")) == list(range(100))
+    assert len(sink.events) == 1 and sink.events[0]["done"] == 100
+
+
+def test_file_sinks():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lexicon_path = os.path.join(temp_dir, "lexicon.txt")
+        with open(lexicon_path, "w", encoding="utf-8") as fp:
+            fp.write("hello\th e l o\nworld\tw o r l d\n")
+        with telemetry_session(["jsonl", "prometheus"], temp_dir, interval=0.0) as files:
+            assert len(list(read_lexicon(lexicon_path))) == 2
+        assert files == ["telemetry.jsonl", "telemetry.prom"]
+        with open(os.path.join(temp_dir, "telemetry.jsonl"), "r", encoding="utf-8") as fp:
+            events = [json.loads(x) for x in fp]
+        assert events[-1]["stage"] == "lexicon_parsing/lexicon.txt"
+        assert events[-1]["done"] == 2 and events[-1]["finished"]
+        assert events[-1]["bytes"] == os.path.getsize(lexicon_path)
+        with open(os.path.join(temp_dir, "telemetry.prom"), "r", encoding="utf-8") as fp:
+            metrics = fp.read()
+        assert 'learn_to_pronounce_progress_done{stage="lexicon_parsing/lexicon.txt",unit="entries"} 2.0' in metrics
+        assert "# TYPE learn_to_pronounce_progress_finished gauge" in metrics
+
+
+def _report_progress(stage):
+    with get_telemetry().scope("job"):
+        get_telemetry().progress(stage, total=1).close()
+    return stage
+
+
+def test_forward_from_workers():
+    sink = ListSink()
+    telemetry = get_telemetry()
+    telemetry.add_sink(sink)
+    try:
+        with forward_from_workers() as (initializer, initargs):
+            with multiprocessing.Pool(2, initializer=initializer, initargs=initargs) as pool:
+                assert pool.map(_report_progress, ["a", "b"]) == ["a", "b"]
+    finally:
+        telemetry.close()
+    # events of workers are emitted by sinks of the parent process
+    assert sorted(x["stage"] for x in sink.events) == ["job/a", "job/b"]
@@ -0,0 +1,41 @@
+# Copyright 2022 Balacoon
+
+import os
+import tempfile
+
+from learn_to_pronounce.work_dir import COMPRESS, REMOVE, WorkDir
+
+
+def _write(path: str, size: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write("a\tb c\n" * size)
+
+
+def test_work_dir_gc():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in ["pronunciation_training_data", "pronunciation.corpus", "pronunciation.o8.arpa",
+                     "pronunciation.fst", "scratch", "cross_validation/fold_0/pronunciation.fst"]:
+            _write(os.path.join(temp_dir, name), 1000)
+        work_dir = WorkDir(temp_dir)
+        work_dir.register_fst_training("pronunciation", "pronunciation", consumers=["evaluation"])
+        work_dir.register("cross_validation/fold_*", "cross_validation", gc=REMOVE)
+
+        report = {x["name"]: x for x in work_dir.get_report()}
+        assert report["pronunciation.corpus"]["gc"] == COMPRESS
+        assert report["pronunciation.fst"]["consumers"] == ["evaluation"]
+        assert report["<untracked>"]["size"] == 6000
+        assert report["cross_validation/fold_0"]["size"] == 6000
+
+        assert work_dir.collect_garbage() > 0
+        remaining = sorted(os.listdir(temp_dir))
+        assert "pronunciation.o8.arpa" not in remaining
+        assert "pronunciation.corpus.gz" in remaining and "pronunciation.corpus" not in remaining
+        assert "pronunciation.fst" in remaining and "scratch" in remaining
+        assert not os.listdir(os.path.join(temp_dir, "cross_validation"))
+
+        # compressed artifact is restored for incremental training
+        assert work_dir.restore("pronunciation.corpus")
+        with open(os.path.join(temp_dir, "pronunciation.corpus"), encoding="utf-8") as fp:
+            assert fp.read() == "a\tb c\n" * 1000
+        assert not work_dir.restore("missing")